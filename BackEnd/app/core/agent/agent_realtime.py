@@ -2,23 +2,77 @@ import json
 import logging
 import asyncio
 import re
-from handyllm import OpenAIClient, RunConfig, load_from, ChatPrompt, VM
+from typing import Optional
+from handyllm import OpenAIClient, load_from, ChatPrompt, VM
 from handyllm.types import PathType
 from pathlib import Path
 
 from app.core.agent.utils import extract_xml_tag
+from app.core.agent.routing import ModelRouter
+from app.core.debug_artifacts import DebugArtifactStore
+from app.core.mindmap_graph import MindMapGraph
 from .constants import PROMPT_ROOT_REALTIME
 
 # 加载 Prompt
 prompt_gen_mindmap = load_from(PROMPT_ROOT_REALTIME / "generate_mindmap.hprompt", cls=ChatPrompt)
 prompt_update_mindmap = load_from(PROMPT_ROOT_REALTIME / "update_mindmap.hprompt", cls=ChatPrompt)
 prompt_generate_suggestion = load_from(PROMPT_ROOT_REALTIME / "generate_suggestion.hprompt", cls=ChatPrompt)
+prompt_update_and_suggest = load_from(PROMPT_ROOT_REALTIME / "update_and_suggest.hprompt", cls=ChatPrompt)
+
+
+# =========================================================
+# 输出校验：返回问题描述，合格时返回 None
+# 快速模型的输出不合格时升级到常规模型重试
+# =========================================================
+def validate_mindmap_output(result) -> Optional[str]:
+    if not isinstance(result, dict):
+        return "输出不是 JSON 对象"
+    mindmap = result.get("problem_mindmap", result)
+    if not isinstance(mindmap, dict) or not isinstance(mindmap.get("nodes"), list) \
+            or not isinstance(mindmap.get("edges", []), list):
+        return "缺少 nodes / edges"
+    if not mindmap["nodes"]:
+        return "导图没有节点"
+    graph = MindMapGraph(mindmap)
+    if graph.duplicate_nodes or graph.dangling_edges:
+        return "; ".join(graph.validate()[:3])
+    return None
+
+
+def validate_suggestion_output(result) -> Optional[str]:
+    if not isinstance(result, dict):
+        return "输出不是 JSON 对象"
+    suggestion = result.get("suggestion")
+    if not isinstance(suggestion, dict) or not isinstance(suggestion.get("nodes", []), list):
+        return "缺少 suggestion"
+    if not isinstance(result.get("suggestion_summary"), str) or not result["suggestion_summary"].strip():
+        return "缺少 suggestion_summary"
+    return None
+
+
+def validate_fused_output(result) -> Optional[str]:
+    if not isinstance(result, dict) or "problem_mindmap" not in result:
+        return "缺少 problem_mindmap"
+    return validate_mindmap_output(result) or validate_suggestion_output(result)
+
+
+VALIDATORS = {
+    "scratch": validate_mindmap_output,
+    "update": validate_mindmap_output,
+    "suggestion": validate_suggestion_output,
+    "fused": validate_fused_output,
+}
+
 
 class AgentRealtime:
-    def __init__(self, client: OpenAIClient, base_dir: PathType):
+    def __init__(self, client: OpenAIClient, base_dir: PathType, router: Optional[ModelRouter] = None,
+                 artifacts: Optional[DebugArtifactStore] = None):
         self.client = client
         self.base_dir = Path(base_dir)
-        self.base_dir.mkdir(parents=True, exist_ok=True)
+        # 每次调用的提示词与输出由后台线程写入 base_dir（未指定时全部保存）
+        self.artifacts = artifacts or DebugArtifactStore(self.base_dir)
+        # 未指定时全部使用 .hprompt 中的模型
+        self.router = router or ModelRouter()
 
     # =========================================================
     # 方法 1: 从零生成
@@ -27,16 +81,13 @@ class AgentRealtime:
     # =========================================================
     async def generate_mindmap_scratch(self, problem_content: str, user_input: str, task_id: str) -> dict:
         """从零构建思维导图"""
-        output_path = (Path(self.base_dir) / f"{task_id}_gen.hprompt").as_posix()
-
         p_val = prompt_gen_mindmap.eval(
             var_map=VM(
                 problem_content = problem_content,
                 student_solution = user_input
-            ),
-            run_config=RunConfig(output_path=output_path)
+            )
         )
-        return await self._execute_and_parse(p_val, task_id)
+        return await self._execute_and_parse(p_val, task_id, "scratch", len(user_input))
 
     # =========================================================
     # 方法 2: 增量更新
@@ -45,8 +96,6 @@ class AgentRealtime:
     # =========================================================
     async def update_mindmap_incremental(self, problem_content: str, existing_map: dict, user_input: str, task_id: str) -> dict:
         """基于现有导图更新"""
-        output_path = (Path(self.base_dir) / f"{task_id}_update.hprompt").as_posix()
-        
         # 将现有导图转为字符串
         existing_map_str = json.dumps(existing_map, ensure_ascii=False)
         
@@ -55,10 +104,10 @@ class AgentRealtime:
                 problem_content=problem_content,    # 对应 %problem_content%
                 existing_mindmap_json=existing_map_str,                     # 对应 %existing_mindmap_json%
                 user_new_input=user_input                                   # 对应 %user_new_input%
-            ),
-            run_config=RunConfig(output_path=output_path)
+            )
         )
-        return await self._execute_and_parse(p_val, task_id)
+        # 输入规模按本次交给模型的学生文本计算（增量更新时通常只是文本差异）
+        return await self._execute_and_parse(p_val, task_id, "update", len(user_input))
 
 
     # =========================================================
@@ -77,8 +126,6 @@ class AgentRealtime:
         """
         对比用户导图与标准导图，生成增量建议与总结
         """
-        output_path = (Path(self.base_dir) / f"{task_id}_suggestion.hprompt").as_posix()
-        
         # 将传入的 JSON 对象序列化为字符串，供 Prompt 填充
         user_map_str = json.dumps(user_mindmap, ensure_ascii=False)
         std_map_str = json.dumps(standard_mindmap, ensure_ascii=False)
@@ -90,21 +137,52 @@ class AgentRealtime:
                 user_solution=user_solution,                              # 对应 %user_solution%
                 user_mindmap=user_map_str,                                # 对应 %user_mindmap%
                 standard_mindmap=std_map_str                              # 对应 %standard_mindmap%
-            ),
-            run_config=RunConfig(output_path=output_path)
+            )
         )
         
         # 执行 LLM 请求并解析 JSON 结果
-        return await self._execute_and_parse(p_val, task_id)
+        return await self._execute_and_parse(p_val, task_id, "suggestion", len(user_solution))
     
     
+    # =========================================================
+    # 方法 4: 更新导图并生成建议（单次调用）
+    # 对应 prompt: update_and_suggest.hprompt
+    # (%problem_content%, %existing_mindmap_json%, %user_new_input%, %user_solution%, %standard_mindmap%)
+    # =========================================================
+    async def update_mindmap_and_suggest(
+        self,
+        problem_content: str,
+        existing_map: dict,
+        user_input: str,
+        user_solution: str,
+        standard_mindmap: dict,
+        task_id: str
+    ) -> dict:
+        """
+        一次请求同时返回更新后的用户导图 (problem_mindmap) 与建议 (suggestion, suggestion_summary)，
+        省去先更新导图、再生成建议的第二次往返。existing_map 为空时从头构建导图
+        """
+        p_val = prompt_update_and_suggest.eval(
+            var_map=VM(
+                problem_content=problem_content,
+                existing_mindmap_json=json.dumps(existing_map or {"nodes": [], "edges": []}, ensure_ascii=False),
+                user_new_input=user_input,
+                user_solution=user_solution,
+                standard_mindmap=json.dumps(standard_mindmap, ensure_ascii=False)
+            )
+        )
+        return await self._execute_and_parse(p_val, task_id, "fused", len(user_input))
+
+
     # =========================================================
     # 辅助方法: 统一执行与解析
     # =========================================================
-    async def _execute_and_parse(self, p_val, task_id):
+    async def _execute_and_parse(self, p_val, task_id, task: str, input_chars: int):
+        decision = self.router.route(task, input_chars)
         for attempt in range(3):
+            result_prompt = None
             try:
-                result_prompt = await p_val.arun(client=self.client)
+                result_prompt = await p_val.arun(client=self.client, **decision.request_kwargs())
                 raw = result_prompt.result_str
                 
                 # 尝试提取 xml 标签
@@ -118,10 +196,24 @@ class AgentRealtime:
                 json_content = re.sub(r'^```json\s*', '', json_content, flags=re.MULTILINE)
                 json_content = re.sub(r'\s*```$', '', json_content, flags=re.MULTILINE)
                 
-                return json.loads(json_content)
+                result = json.loads(json_content)
             except Exception as e:
-                logging.error(f"[{task_id}] Mindmap Generation Error (Attempt {attempt+1}): {e}")
-                if attempt < 2: await asyncio.sleep(1)
+                logging.error(f"[{task_id}] Mindmap Generation Error (Attempt {attempt+1}, {decision.label}): {e}")
+                if result_prompt is not None:
+                    self.artifacts.record(task_id, task, result_prompt, status="parse_error")
+                if decision.can_escalate:
+                    decision = self.router.escalate(decision, "parse_error")
+                elif attempt < 2:
+                    await asyncio.sleep(1)
+                continue
+
+            problem = VALIDATORS[task](result)
+            self.artifacts.record(task_id, task, result_prompt, status="invalid" if problem else "ok")
+            if problem and decision.can_escalate:
+                logging.warning(f"[{task_id}] 快速模型 {decision.label} 的输出未通过校验（{problem}），升级重试")
+                decision = self.router.escalate(decision, "invalid")
+                continue
+            return result
         
         raise RuntimeError(f"Failed AI Mindmap Task: {task_id}")
     
@@ -0,0 +1,79 @@
+# app/core/agent/routing.py
+# 模型路由：按任务类型与输入规模选择模型 / 端点。
+# 小输入走快速模型，快速模型的输出不合格时升级到常规模型重试；路由决策记录到指标中以便调参
+from typing import Dict, List, Optional
+
+from app.core.config import Endpoint, ModelRoute, ModelRoutingConfig
+from app.core.metrics import metrics
+
+
+class RouteDecision:
+    """
+    tier:
+        default - 常规模型（未配置时即 .hprompt 中的模型）
+        fast    - 快速模型
+    """
+
+    def __init__(self, task: str, tier: str, model: Optional[str], endpoint: Optional[dict],
+                 reason: str, can_escalate: bool = False) -> None:
+        self.task = task
+        self.tier = tier
+        self.model = model
+        self.endpoint = endpoint
+        self.reason = reason
+        self.can_escalate = can_escalate
+
+    def request_kwargs(self) -> dict:
+        """覆盖 .hprompt 请求参数的部分，传给 arun()"""
+        kwargs = {}
+        if self.model:
+            kwargs["model"] = self.model
+        if self.endpoint:
+            kwargs["endpoint"] = self.endpoint
+        return kwargs
+
+    @property
+    def label(self) -> str:
+        return self.model or "prompt_default"
+
+
+class ModelRouter:
+    def __init__(self, config: Optional[ModelRoutingConfig] = None, endpoints: Optional[List[Endpoint]] = None) -> None:
+        self.config = config or ModelRoutingConfig()
+        self.endpoints: Dict[str, dict] = {ep.name: ep.model_dump() for ep in endpoints or [] if ep.name}
+        for task, route in self.config.routes.items():
+            for name in (route.endpoint, route.fast_endpoint):
+                if name and name not in self.endpoints:
+                    raise ValueError(f"模型路由 {task} 引用了不存在的端点: {name}")
+
+    def _route(self, task: str) -> ModelRoute:
+        return self.config.routes.get(task) or ModelRoute()
+
+    def _record(self, decision: RouteDecision) -> RouteDecision:
+        metrics.inc("model_routing_total",
+                    {"task": decision.task, "tier": decision.tier, "model": decision.label, "reason": decision.reason},
+                    description="模型路由决策（按任务、模型档位与原因）")
+        return decision
+
+    def route(self, task: str, input_chars: int) -> RouteDecision:
+        """为一次任务选择模型；input_chars 为交给模型的学生文本长度"""
+        route = self._route(task)
+        if route.fast_model and route.fast_max_input_chars:
+            if input_chars <= route.fast_max_input_chars:
+                return self._record(RouteDecision(
+                    task, "fast", route.fast_model, self.endpoints.get(route.fast_endpoint or ""),
+                    "small_input", can_escalate=route.escalate
+                ))
+            reason = "large_input"
+        else:
+            reason = "default"
+        return self._record(RouteDecision(task, "default", route.model, self.endpoints.get(route.endpoint or ""), reason))
+
+    def escalate(self, decision: RouteDecision, cause: str) -> RouteDecision:
+        """快速模型的输出不合格（cause 为 parse_error / invalid），改用常规模型"""
+        metrics.inc("model_escalations_total", {"task": decision.task, "cause": cause},
+                    description="快速模型输出不合格、升级到常规模型的次数")
+        route = self._route(decision.task)
+        return self._record(RouteDecision(
+            decision.task, "default", route.model, self.endpoints.get(route.endpoint or ""), "escalated"
+        ))
@@ -23,6 +23,8 @@ class Endpoint(BaseModel):
     # 防止前缀为 model_ 的配置有冲突
     model_config = ConfigDict(protected_namespaces=())
     
+    # 供模型路由按名称引用
+    name: Optional[str] = None
     api_type: Optional[str] = None
     api_key: str
     api_base: Optional[str] = None
@@ -31,6 +33,162 @@ class Endpoint(BaseModel):
     model_engine_map: Optional[Dict[str, str]] = None
 
 
+class LLMClientConfig(BaseModel):
+    # 进程内共享的 HTTP 连接池（所有模型调用共用，保留 keep-alive 连接与 TLS 会话）
+    max_connections: int = Field(default=100, gt=0)
+    max_keepalive_connections: int = Field(default=20, ge=0)
+    keepalive_expiry: float = Field(default=120, ge=0)
+    connect_timeout: float = Field(default=10, gt=0)
+    # 需要安装 h2（httpx[http2]），未安装时退回 HTTP/1.1
+    http2: bool = True
+    # 启动时向每个端点发送一次轻量请求（GET /models），预先建立连接
+    warmup: bool = True
+    warmup_timeout: float = Field(default=10, gt=0)
+
+class SocketIOConfig(BaseModel):
+    # Socket.IO 序列化方式：json 为默认文本帧；msgpack 为二进制帧
+    # 注意：使用 msgpack 时前端需以 VITE_SOCKET_SERIALIZER=msgpack 构建（启用 socket.io-msgpack-parser），否则无法连接
+    serializer: Literal["json", "msgpack"] = "json"
+    # WebSocket permessage-deflate（由 uvicorn 与浏览器协商）
+    ws_per_message_deflate: bool = True
+    # engineio 长轮询（HTTP）响应压缩，及触发压缩的最小字节数
+    http_compression: bool = True
+    compression_threshold: int = 1024
+    # 思维导图推送的序列化结果超过该字节数时，以 zlib 压缩后的二进制附件发送；<= 0 表示关闭
+    mindmap_compress_threshold: int = 0
+    # zlib 压缩等级 1-9，越高越省流量、越耗 CPU
+    mindmap_compress_level: int = Field(default=6, ge=1, le=9)
+
+
+class RateLimitRule(BaseModel):
+    # 令牌桶容量，即允许的突发请求数
+    capacity: float = Field(default=5, gt=0)
+    # 每秒补充的令牌数，例如 0.2 表示平均每 5 秒一次
+    refill_per_second: float = Field(default=0.2, gt=0)
+
+
+class RateLimitConfig(BaseModel):
+    enabled: bool = True
+    # memory: 单进程内存；redis: 多进程 / 多实例共享
+    backend: Literal["memory", "redis"] = "memory"
+    redis_url: Optional[str] = None
+    # 超限策略：coalesce 合并到该做题记录正在进行的同类任务（没有则拒绝）；reject 直接拒绝
+    over_limit: Literal["coalesce", "reject"] = "coalesce"
+    # 按接口（任务类型）配置的限额，按用户分别计数
+    rules: Dict[str, RateLimitRule] = Field(default_factory=lambda: {
+        "updateMindmap": RateLimitRule(capacity=5, refill_per_second=0.2),
+        "queryAnalysis": RateLimitRule(capacity=3, refill_per_second=0.1),
+        "updateAndSuggest": RateLimitRule(capacity=3, refill_per_second=0.1),
+        # 草稿预生成（超限时直接忽略该草稿，不返回 429）
+        "draftSnapshot": RateLimitRule(capacity=2, refill_per_second=0.1),
+    })
+
+
+class JobConfig(BaseModel):
+    # 用户最后一个连接断开后，是否取消其仍在运行的 AI 任务
+    cancel_on_disconnect: bool = True
+    # 断开后的宽限期（秒），期间重连（如刷新页面）则不取消
+    disconnect_grace_seconds: float = Field(default=30, ge=0)
+
+class IdempotencyConfig(BaseModel):
+    enabled: bool = True
+    # 未携带 Idempotency-Key 时，按 (做题记录, 输入内容哈希) 自动生成键
+    derive_keys: bool = True
+    # 最多保留的键数量（超出后淘汰最久未使用的）及有效期
+    max_entries: int = Field(default=2048, gt=0)
+    ttl_seconds: float = Field(default=600, gt=0)
+
+class SuggestionConfig(BaseModel):
+    # 先在本地对齐用户导图与标准导图：覆盖完整或只差最后一步时直接给出模板建议，
+    # 否则只把标准导图中缺失的部分交给模型
+    local_analysis: bool = True
+    # 节点对齐的相似度阈值
+    match_threshold: float = Field(default=0.45, gt=0, le=1)
+    # 覆盖率不低于该值时视为已完整覆盖
+    complete_coverage: float = Field(default=1.0, gt=0, le=1)
+    # 等待模型期间，先用题目导入时生成的节点提示推送一次启发式建议
+    two_phase: bool = True
+    # 建议结果缓存（存于数据库）：用户导图、解答文本与标准导图均未变化时直接返回上次的建议
+    cache_enabled: bool = True
+    cache_max_entries: int = Field(default=20000, gt=0)
+
+class MindMapUpdateConfig(BaseModel):
+    # 增量更新时只把相对上次生成导图时的文本差异（带上下文）交给模型
+    diff_input: bool = True
+    # 变化区域前后各保留的句子 / 行数
+    context_segments: int = Field(default=2, ge=0)
+    # 变化的字符数超过新文本的该比例，或删去的字符数超过 max_deleted_chars 时，整体重新生成导图
+    rebuild_ratio: float = Field(default=0.6, gt=0)
+    max_deleted_chars: int = Field(default=200, ge=0)
+
+class MindMapLayoutConfig(BaseModel):
+    # 在 sendAnalysisMap 推送中附带服务端计算的节点坐标（/api/refresh 由请求参数决定）
+    push_positions: bool = True
+    # 布局缓存条目数（按导图结构哈希）
+    cache_size: int = Field(default=1024, gt=0)
+    # 与前端节点尺寸保持一致
+    node_width: float = Field(default=350, gt=0)
+    node_height: float = Field(default=150, gt=0)
+    # 相邻两层 / 同层相邻节点之间的间距，须与前端 SingleMindMapGraph 的 RANK_SEP / NODE_SEP 一致
+    rank_sep: float = Field(default=80, ge=0)
+    node_sep: float = Field(default=40, ge=0)
+
+class SpeculationConfig(BaseModel):
+    # 学生编辑解答期间，客户端通过 Socket.IO 事件 draftSnapshot 发送草稿；服务端在句子或公式结束处、
+    # 且没有其他 AI 任务时预先生成导图，正式的更新请求文本一致时直接采用
+    enabled: bool = False
+    # 进行中的正式任务不超过该数量时才视为空闲；超过时取消进行中的预生成
+    idle_max_jobs: int = Field(default=0, ge=0)
+    # 同时进行的预生成任务上限（全局）
+    max_concurrent: int = Field(default=2, gt=0)
+    # 相对上次生成导图所依据的文本，变化少于该字数时不预生成
+    min_changed_chars: int = Field(default=10, ge=0)
+    # 预生成结果的保留时间
+    ttl_seconds: float = Field(default=300, gt=0)
+
+class DebugArtifactConfig(BaseModel):
+    # 模型调用的提示词与输出（.hprompt）由后台线程批量写入，不阻塞事件循环
+    enabled: bool = True
+    dir: Path = Path("logs/debug_prompts")
+    # 正常完成的调用按该比例抽样保存；输出无法解析或未通过校验的调用始终保存
+    sample_rate: float = Field(default=0.1, ge=0, le=1)
+    keep_failures: bool = True
+    compress: bool = True
+    # 超过保留天数或总大小时删除最旧的文件
+    max_age_days: float = Field(default=7, gt=0)
+    max_total_mb: float = Field(default=200, gt=0)
+    # 写入线程每批最多写入的条数 / 最长等待时间；待写入队列已满时丢弃新的记录
+    batch_size: int = Field(default=32, gt=0)
+    flush_interval_seconds: float = Field(default=2, gt=0)
+    max_pending: int = Field(default=1000, gt=0)
+
+class MetricsConfig(BaseModel):
+    # /api/metrics 默认关闭（指标包含各类请求、拒绝与模型路由的计数，不应公开）
+    enabled: bool = False
+    # 设置后请求须带 Authorization: Bearer <token>（供 Prometheus 等抓取）；为空时只要求登录
+    token: Optional[str] = None
+
+class ModelRoute(BaseModel):
+    # 模型与端点（端点为 endpoints 中的 name）；留空时使用 .hprompt 中的模型与默认端点轮询
+    model: Optional[str] = None
+    endpoint: Optional[str] = None
+    # 输入（学生文本）不超过 fast_max_input_chars 字时改用快速模型；为空或阈值为 0 时不启用
+    fast_model: Optional[str] = None
+    fast_endpoint: Optional[str] = None
+    fast_max_input_chars: int = Field(default=0, ge=0)
+    # 快速模型的输出无法解析或未通过校验时，改用上面的模型重试
+    escalate: bool = True
+
+class ModelRoutingConfig(BaseModel):
+    # 按任务类型（scratch 从零生成 / update 增量更新 / suggestion 解题建议 / fused 更新并建议）选择模型
+    routes: Dict[str, ModelRoute] = Field(default_factory=lambda: {
+        "scratch": ModelRoute(),
+        "update": ModelRoute(fast_max_input_chars=800),
+        "suggestion": ModelRoute(),
+        # 更新导图并生成建议（单次调用）
+        "fused": ModelRoute(),
+    })
+
 
 # ref: https://github.com/pydantic/pydantic/discussions/4170#discussioncomment-9668111
 class YamlBaseSettings(BaseSettings):
@@ -65,6 +223,18 @@ class YamlBaseSettings(BaseSettings):
 
 class Settings(YamlBaseSettings):    
     endpoints: List[Endpoint] = Field(..., min_length=1)
+    llm_client: LLMClientConfig = Field(default_factory=LLMClientConfig)
+    socketio: SocketIOConfig = Field(default_factory=SocketIOConfig)
+    rate_limit: RateLimitConfig = Field(default_factory=RateLimitConfig)
+    jobs: JobConfig = Field(default_factory=JobConfig)
+    idempotency: IdempotencyConfig = Field(default_factory=IdempotencyConfig)
+    suggestion: SuggestionConfig = Field(default_factory=SuggestionConfig)
+    mindmap_update: MindMapUpdateConfig = Field(default_factory=MindMapUpdateConfig)
+    mindmap_layout: MindMapLayoutConfig = Field(default_factory=MindMapLayoutConfig)
+    routing: ModelRoutingConfig = Field(default_factory=ModelRoutingConfig)
+    speculation: SpeculationConfig = Field(default_factory=SpeculationConfig)
+    debug_artifacts: DebugArtifactConfig = Field(default_factory=DebugArtifactConfig)
+    metrics: MetricsConfig = Field(default_factory=MetricsConfig)
     # openai_chat_model: str
     # shared_data_dir: Path
     
@@ -0,0 +1,211 @@
+# app/core/debug_artifacts.py
+# 模型调用的调试记录（.hprompt）：抽样后交给后台线程批量写入，按天分目录、gzip 压缩，
+# 并按保留天数与总大小轮转。文件名包含 task_id、任务类型、唯一的 run_id 与结果，
+# 可用 app/scripts/search_artifacts.py 按做题记录查找
+import gzip
+import logging
+import queue
+import random
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, List, NamedTuple, Optional
+
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# 文件名各部分之间的分隔符（task_id 中可能含有单个下划线）
+NAME_SEP = "__"
+SUFFIX = ".hprompt"
+# 两次轮转检查之间的最短间隔
+ROTATE_INTERVAL_SECONDS = 60
+
+
+class ArtifactName(NamedTuple):
+    task_id: str
+    task: str
+    run_id: str
+    status: str
+
+    @classmethod
+    def parse(cls, path: Path) -> Optional["ArtifactName"]:
+        name = path.name
+        for suffix in (SUFFIX + ".gz", SUFFIX):
+            if name.endswith(suffix):
+                parts = name[:-len(suffix)].split(NAME_SEP)
+                return cls(*parts) if len(parts) == 4 else None
+        return None
+
+    def filename(self, compress: bool) -> str:
+        return NAME_SEP.join(self) + SUFFIX + (".gz" if compress else "")
+
+
+def new_run_id() -> str:
+    return f"{datetime.now():%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+
+def iter_artifacts(base_dir: Path) -> List[Path]:
+    return [p for p in Path(base_dir).glob(f"*/*{SUFFIX}*") if p.is_file()]
+
+
+def read_artifact(path: Path) -> str:
+    if path.suffix == ".gz":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return f.read()
+    return path.read_text(encoding="utf-8")
+
+
+class _Pending(NamedTuple):
+    day: str
+    name: ArtifactName
+    prompt: Any
+
+
+class DebugArtifactStore:
+    def __init__(self, base_dir, enabled: bool = True, sample_rate: float = 1.0, keep_failures: bool = True,
+                 compress: bool = True, max_age_days: float = 7, max_total_mb: float = 200,
+                 batch_size: int = 32, flush_interval_seconds: float = 2, max_pending: int = 1000) -> None:
+        self.base_dir = Path(base_dir)
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.keep_failures = keep_failures
+        self.compress = compress
+        self.max_age_seconds = max_age_days * 86400
+        self.max_total_bytes = int(max_total_mb * 1024 * 1024)
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self.queue: "queue.Queue[Optional[_Pending]]" = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._last_rotate = 0.0
+
+    @classmethod
+    def from_config(cls, config) -> "DebugArtifactStore":
+        return cls(**config.model_dump(exclude={"dir"}), base_dir=config.dir)
+
+    def _record(self, result: str):
+        metrics.inc("debug_artifacts_total", {"result": result}, description="模型调用调试记录的处理结果")
+
+    # =========================================================
+    # 记录（在事件循环中调用，只入队）
+    # =========================================================
+    def record(self, task_id: str, task: str, prompt: Any, status: str = "ok") -> Optional[str]:
+        """
+        记录一次模型调用的结果 prompt（handyllm ChatPrompt，序列化在写入线程中进行）。
+        status 为 ok 以外的值（parse_error / invalid）视为失败。返回 run_id，未记录时返回 None
+        """
+        if not self.enabled:
+            return None
+        if random.random() >= self.sample_rate and not (self.keep_failures and status != "ok"):
+            self._record("sampled_out")
+            return None
+        self._ensure_thread()
+        name = ArtifactName(task_id, task, new_run_id(), status)
+        try:
+            self.queue.put_nowait(_Pending(f"{datetime.now():%Y-%m-%d}", name, prompt))
+        except queue.Full:
+            self._record("dropped")
+            return None
+        return name.run_id
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="debug-artifacts", daemon=True)
+                self._thread.start()
+
+    def close(self, timeout: float = 5):
+        """写完队列中的记录后停止写入线程（应用关闭时调用）"""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    # =========================================================
+    # 写入线程
+    # =========================================================
+    def _run(self):
+        while True:
+            batch: List[_Pending] = []
+            stop = False
+            try:
+                item = self.queue.get(timeout=self.flush_interval_seconds)
+                deadline = time.monotonic() + self.flush_interval_seconds
+                while item is not None:
+                    batch.append(item)
+                    if len(batch) >= self.batch_size:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self.queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                stop = item is None
+            except queue.Empty:
+                pass
+            if batch:
+                self._write_batch(batch)
+            self._maybe_rotate()
+            if stop:
+                return
+
+    def _write_batch(self, batch: List[_Pending]):
+        for pending in batch:
+            try:
+                directory = self.base_dir / pending.day
+                directory.mkdir(parents=True, exist_ok=True)
+                path = directory / pending.name.filename(self.compress)
+                text = pending.prompt.dumps()
+                if self.compress:
+                    with gzip.open(path, "wt", encoding="utf-8") as f:
+                        f.write(text)
+                else:
+                    path.write_text(text, encoding="utf-8")
+                self._record("written")
+            except Exception as e:
+                logger.warning(f"调试记录写入失败 {pending.name.task_id}: {e}")
+                self._record("error")
+
+    def _maybe_rotate(self):
+        now = time.time()
+        if now - self._last_rotate < ROTATE_INTERVAL_SECONDS:
+            return
+        self._last_rotate = now
+        try:
+            self.rotate(now)
+        except Exception as e:
+            logger.warning(f"调试记录轮转失败: {e}")
+
+    def rotate(self, now: Optional[float] = None) -> int:
+        """删除超过保留天数的文件，总大小仍超限时从最旧的开始删除；返回删除的文件数"""
+        now = time.time() if now is None else now
+        files = []
+        for path in iter_artifacts(self.base_dir):
+            stat = path.stat()
+            files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for mtime, size, path in files:
+            if now - mtime <= self.max_age_seconds and total <= self.max_total_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        for directory in self.base_dir.glob("*"):
+            if directory.is_dir() and not any(directory.iterdir()):
+                directory.rmdir()
+        if removed:
+            metrics.inc("debug_artifacts_total", {"result": "rotated"}, value=removed,
+                        description="模型调用调试记录的处理结果")
+        return removed
@@ -0,0 +1,224 @@
+# app/core/dedup.py
+# 近似重复题目检测：对规范化后的题目内容做 MinHash 签名，并用 LSH 分桶，
+# 查询只比较同桶的候选，耗时不随题库规模线性增长
+import hashlib
+import json
+import logging
+import re
+import unicodedata
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 签名长度 = BANDS * ROWS；相似度阈值约为 (1 / BANDS) ** (1 / ROWS) ≈ 0.7
+NUM_PERM = 128
+BANDS = 16
+ROWS = 8
+SHINGLE_SIZE = 3
+# 修改规范化 / 分词规则时递增，使旧索引失效
+INDEX_VERSION = 1
+# 高于此估计相似度的题目视为疑似重复
+DUPLICATE_THRESHOLD = 0.7
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# 语义相同、写法不同的 LaTeX 命令统一为一种写法
+LATEX_ALIASES = {
+    r"\leq": r"\le", r"\leqslant": r"\le", r"\geq": r"\ge", r"\geqslant": r"\ge",
+    r"\neq": r"\ne", r"\dfrac": r"\frac", r"\tfrac": r"\frac", r"\cdot": "*", r"\times": "*",
+    r"\ldots": r"\dots", r"\cdots": r"\dots", r"\to": r"\rightarrow",
+}
+# 只影响排版、不影响内容的命令直接丢弃（匹配前已统一转为小写）
+LATEX_NOISE = {
+    r"\left", r"\right", r"\displaystyle", r"\mathrm", r"\text", r"\textbf", r"\mathbf",
+    r"\quad", r"\qquad", r"\big", r"\bigg", r"\limits", r"\,", r"\;", r"\!",
+}
+_TOKEN_RE = re.compile(r"\\[A-Za-z]+|\\.|[A-Za-z]+|\d+(?:\.\d+)?|\S")
+
+
+def tokenize_problem(text: str) -> List[str]:
+    """
+    规范化并切分题目内容：
+    全角 / 半角统一，LaTeX 命令统一写法并去掉排版命令，
+    单字母变量统一为占位符（n 个球 / m 个球 视为同一写法），去掉 $ 与花括号
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    tokens = []
+    for token in _TOKEN_RE.findall(text):
+        if token.startswith("\\"):
+            if token in LATEX_NOISE:
+                continue
+            tokens.append(LATEX_ALIASES.get(token, token))
+        elif token in "${}":
+            continue
+        elif len(token) == 1 and token.isascii() and token.isalpha():
+            tokens.append("<v>")
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def _shingle_hashes(tokens: List[str]) -> Set[int]:
+    if len(tokens) < SHINGLE_SIZE:
+        tokens = tokens + [""] * (SHINGLE_SIZE - len(tokens))
+    hashes = set()
+    for i in range(len(tokens) - SHINGLE_SIZE + 1):
+        shingle = "\x1f".join(tokens[i:i + SHINGLE_SIZE]).encode("utf-8")
+        hashes.add(int.from_bytes(hashlib.blake2b(shingle, digest_size=4).digest(), "little"))
+    return hashes
+
+
+def _permutations(num_perm: int) -> List[Tuple[int, int]]:
+    """固定种子生成的哈希置换参数，保证签名可跨进程复用"""
+    params = []
+    for i in range(num_perm):
+        digest = hashlib.sha256(f"minhash-perm-{i}".encode("ascii")).digest()
+        a = int.from_bytes(digest[:8], "little") % (_MERSENNE_PRIME - 1) + 1
+        b = int.from_bytes(digest[8:16], "little") % _MERSENNE_PRIME
+        params.append((a, b))
+    return params
+
+
+_PERMS = _permutations(NUM_PERM)
+
+
+def minhash_signature(text: str) -> List[int]:
+    shingles = _shingle_hashes(tokenize_problem(text))
+    return [
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in shingles)
+        for a, b in _PERMS
+    ]
+
+
+def content_digest(problem_content: str) -> str:
+    return hashlib.sha1(problem_content.encode("utf-8")).hexdigest()
+
+
+def estimate_similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    """两个签名相同位置取值相等的比例，即 Jaccard 相似度的估计"""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+class NearDuplicateIndex:
+    """
+    MinHash + LSH 索引，problem_id -> 签名。
+    持久化为数据库旁的 JSON 文件，由导入脚本构建，服务启动时加载。
+    """
+
+    def __init__(self) -> None:
+        self.signatures: Dict[int, List[int]] = {}
+        # problem_id -> 题目内容摘要，用于判断签名是否需要重新计算
+        self.digests: Dict[int, str] = {}
+        # (band 序号, band 哈希) -> problem_id 集合
+        self.buckets: Dict[Tuple[int, str], Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def __contains__(self, problem_id: int) -> bool:
+        return problem_id in self.signatures
+
+    @staticmethod
+    def _band_keys(signature: List[int]) -> Iterable[Tuple[int, str]]:
+        for band in range(BANDS):
+            rows = signature[band * ROWS:(band + 1) * ROWS]
+            yield band, hashlib.blake2b(repr(rows).encode("ascii"), digest_size=8).hexdigest()
+
+    def add(self, problem_id: int, problem_content: str, signature: Optional[List[int]] = None,
+            digest: Optional[str] = None):
+        """加入或更新一道题；已算好的签名 / 摘要可直接传入"""
+        signature = signature or minhash_signature(problem_content)
+        self.remove(problem_id)
+        self.signatures[problem_id] = signature
+        self.digests[problem_id] = digest or content_digest(problem_content)
+        for key in self._band_keys(signature):
+            self.buckets.setdefault(key, set()).add(problem_id)
+
+    def remove(self, problem_id: int):
+        self.digests.pop(problem_id, None)
+        signature = self.signatures.pop(problem_id, None)
+        if signature is None:
+            return
+        for key in self._band_keys(signature):
+            bucket = self.buckets.get(key)
+            if bucket is not None:
+                bucket.discard(problem_id)
+                if not bucket:
+                    del self.buckets[key]
+
+    def sync(self, rows: Iterable[Tuple[int, str]]) -> int:
+        """
+        与数据库中的 (problem_id, problem_content) 对齐：
+        新增或内容变化的题目重新计算签名，数据库中已不存在的题目移出索引。
+        返回重新计算签名的数量
+        """
+        present: Set[int] = set()
+        updated = 0
+        for problem_id, problem_content in rows:
+            present.add(problem_id)
+            digest = content_digest(problem_content)
+            if self.digests.get(problem_id) != digest:
+                self.add(problem_id, problem_content, digest=digest)
+                updated += 1
+        for problem_id in set(self.signatures) - present:
+            self.remove(problem_id)
+        return updated
+
+    def query(self, signature: List[int], top_k: int = 5, threshold: float = 0.0,
+              exclude: Optional[int] = None) -> List[Tuple[int, float]]:
+        """返回与签名最相似的题目 [(problem_id, 估计相似度)]，只比较 LSH 同桶的候选"""
+        candidates: Set[int] = set()
+        for key in self._band_keys(signature):
+            candidates |= self.buckets.get(key, set())
+        candidates.discard(exclude)
+        scored = [(pid, estimate_similarity(signature, self.signatures[pid])) for pid in candidates]
+        scored = [item for item in scored if item[1] >= threshold]
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:top_k]
+
+    def query_by_id(self, problem_id: int, top_k: int = 5, threshold: float = 0.0) -> List[Tuple[int, float]]:
+        signature = self.signatures.get(problem_id)
+        if signature is None:
+            return []
+        return self.query(signature, top_k=top_k, threshold=threshold, exclude=problem_id)
+
+    # =========================================================
+    # 持久化
+    # =========================================================
+    @staticmethod
+    def params() -> dict:
+        return {"version": INDEX_VERSION, "num_perm": NUM_PERM, "bands": BANDS, "rows": ROWS, "shingle_size": SHINGLE_SIZE}
+
+    def save(self, path: Path):
+        data = {
+            "params": self.params(),
+            "signatures": {str(pid): sig for pid, sig in self.signatures.items()},
+            "digests": {str(pid): digest for pid, digest in self.digests.items()},
+        }
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "NearDuplicateIndex":
+        """读取索引文件；文件不存在、损坏或参数不一致时返回空索引"""
+        index = cls()
+        if not path.exists():
+            return index
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Broken near-duplicate index {path}: {e}")
+            return index
+        if data.get("params") != cls.params():
+            logger.warning(f"Near-duplicate index {path} was built with different parameters, ignored")
+            return index
+        digests = data.get("digests", {})
+        for pid, signature in data.get("signatures", {}).items():
+            if pid in digests:
+                index.add(int(pid), "", signature=signature, digest=digests[pid])
+        return index
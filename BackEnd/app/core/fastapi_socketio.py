@@ -1,7 +1,29 @@
-from typing import List
+import json
+import zlib
+from typing import List, Optional
 import socketio
 from fastapi import FastAPI
 
+from app.core.mindmap_graph import MindMapLayoutCache
+
+
+class Utf8Json:
+    """
+    供 Socket.IO 使用的 json 模块替身。
+    默认的 json.dumps 会把中文转义成 \\uXXXX（每个汉字 6 字节），
+    这里直接输出 UTF-8（每个汉字 3 字节），明显缩小思维导图文本帧。
+    """
+
+    @staticmethod
+    def dumps(*args, **kwargs):
+        kwargs.setdefault("ensure_ascii", False)
+        return json.dumps(*args, **kwargs)
+
+    @staticmethod
+    def loads(*args, **kwargs):
+        return json.loads(*args, **kwargs)
+
+
 # ref: https://github.com/Artucuno/fastapi-socketio/tree/master
 class SocketIOServer(socketio.AsyncServer):
     """
@@ -15,10 +37,22 @@ class SocketIOServer(socketio.AsyncServer):
             mount_location: str = "/ws",
             socketio_path: str = "socket.io",
             async_mode: str = "asgi",
+            serializer: str = "json",
+            mindmap_compress_threshold: int = 0,
+            mindmap_compress_level: int = 6,
+            mindmap_layout: Optional[MindMapLayoutCache] = None,
             **kwargs
     ) -> None:
+        # json -> socketio 默认的文本帧（UTF-8 直出）；msgpack -> 二进制帧
+        if serializer == "json":
+            kwargs.setdefault("json", Utf8Json)
+            serializer = "default"
         # disable socketio CORS handling and let fastapi CORS handle it
-        super().__init__(cors_allowed_origins=[], async_mode=async_mode, **kwargs)
+        super().__init__(cors_allowed_origins=[], async_mode=async_mode, serializer=serializer, **kwargs)
+        self.mindmap_compress_threshold = mindmap_compress_threshold
+        self.mindmap_compress_level = mindmap_compress_level
+        # 不为 None 时，sendAnalysisMap 附带服务端计算的节点坐标
+        self.mindmap_layout = mindmap_layout
         self._app = socketio.ASGIApp(
             socketio_server=self, socketio_path=socketio_path
         )
@@ -30,30 +64,50 @@ class SocketIOServer(socketio.AsyncServer):
 
     def is_asyncio_based(self):
         return True
+
+    def pack_mindmap_payload(self, data: dict) -> dict:
+        '''
+        超过阈值的思维导图负载压缩为二进制附件发送，
+        前端根据 encoding 字段解压（见 FrontEnd/src/lib/socket.ts）
+        '''
+        if self.mindmap_compress_threshold <= 0:
+            return data
+        raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if len(raw) < self.mindmap_compress_threshold:
+            return data
+        return {
+            "encoding": "zlib+json",
+            "data": zlib.compress(raw, self.mindmap_compress_level),
+        }
     
     async def sendAnalysisMap(self, sid, mindmap_data, problem_id=None, mindmap_id=None):
         '''发送思维导图数据给指定客户端'''
+        payload = {
+            "problem_id": problem_id,
+            "mindmap_id": mindmap_id,
+            "new_mindmap": mindmap_data
+        }
+        if self.mindmap_layout is not None:
+            payload["positions"] = self.mindmap_layout.layout(mindmap_data)
         await self.emit(
             event='sendAnalysisMap',
-            data={
-                "problem_id": problem_id,
-                "mindmap_id": mindmap_id,
-                "new_mindmap": mindmap_data
-            },
+            data=self.pack_mindmap_payload(payload),
             to=sid
         )
         
-    async def sendAnalysisSuggestion(self, sid, suggestion_data, problem_id=None, mindmap_id=None):
+    async def sendAnalysisSuggestion(self, sid, suggestion_data, problem_id=None, mindmap_id=None, phase="final"):
         '''发送思考建议给指定客户端'''
         # suggestion_data 应该包含 suggestion 和 suggestion_summary
+        # phase: "heuristic" 为即时的启发式建议，随后会以 "final" 推送模型给出的建议覆盖它
         await self.emit(
             event='sendAnalysisSuggestion',
-            data={
+            data=self.pack_mindmap_payload({
                 "problem_id": problem_id,
                 "mindmap_id": mindmap_id,
                 "suggestion": suggestion_data.get("suggestion", {}),
-                "suggestion_summary": suggestion_data.get("suggestion_summary", "")
-            },
+                "suggestion_summary": suggestion_data.get("suggestion_summary", ""),
+                "phase": phase
+            }),
             to=sid
         )
     
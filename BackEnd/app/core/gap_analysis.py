@@ -0,0 +1,253 @@
+# app/core/gap_analysis.py
+# 用户导图与标准导图的本地对齐：不调用模型，按规范化文本、公式记号重合度与图结构
+# 把用户节点匹配到标准节点，得出覆盖率与缺失的标准节点。
+# 覆盖完整或只差最后一步时直接给出模板建议，否则只把缺失部分交给模型；
+# 等待模型期间先用导入时预先生成的节点提示给出启发式建议
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.core.mindmap_graph import MindMapGraph, normalize_text
+
+# 高于该分数的 (标准节点, 用户节点) 才视为对应
+MATCH_THRESHOLD = 0.45
+# 前驱 / 后继已互相对应时的结构加分
+STRUCTURE_BONUS = 0.2
+# 这些类型的标准节点缺失时，视为“只差最后一步”
+FINAL_NODE_TYPES = {"最终答案"}
+# missing_subgraph 中缺失的标准节点 / 边的编号前缀（与用户导图的 N / E 编号区分）
+MISSING_NODE_PREFIX = "S"
+MISSING_EDGE_PREFIX = "SE"
+
+# 入边没有说明文字时，按节点类型给出的通用提示
+HINTS_BY_TYPE = {
+    "问题核心": "先弄清题目要求什么、已知条件有哪些",
+    "核心思路": "想一想这一步的整体策略是什么",
+    "关键结论": "试着由前面的结果推出下一个关键结论",
+    "分支/情况": "考虑是否需要分情况讨论",
+    "最终答案": "把前面的结果代回原问题，写出最终答案",
+}
+DEFAULT_HINT = "想一想接下来的关键一步是什么"
+
+_FORMULA_RE = re.compile(r"\$([^$]*)\$")
+_FORMULA_TOKEN_RE = re.compile(r"\\[A-Za-z]+|[A-Za-z]+|\d+|\S")
+
+
+class _NodeFeatures:
+    def __init__(self, node: dict) -> None:
+        text = normalize_text(node.get("node_content"))
+        formulas = _FORMULA_RE.findall(text)
+        plain = re.sub(r"\s+", "", _FORMULA_RE.sub("", text))
+        # 中文没有分词，用字符二元组近似
+        self.bigrams: Set[str] = {plain[i:i + 2] for i in range(len(plain) - 1)} or ({plain} if plain else set())
+        self.formula_tokens: Set[str] = {t for f in formulas for t in _FORMULA_TOKEN_RE.findall(f)}
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _similarity(std: _NodeFeatures, user: _NodeFeatures) -> float:
+    text = _jaccard(std.bigrams, user.bigrams)
+    if std.formula_tokens and user.formula_tokens:
+        return 0.5 * text + 0.5 * _jaccard(std.formula_tokens, user.formula_tokens)
+    return text
+
+
+def _greedy_match(scores: Dict[Tuple[str, str], float], threshold: float) -> Dict[str, Tuple[str, float]]:
+    """按分数从高到低一对一匹配，返回 标准节点 -> (用户节点, 分数)"""
+    matches: Dict[str, Tuple[str, float]] = {}
+    used: Set[str] = set()
+    for (std_id, user_id), score in sorted(scores.items(), key=lambda item: -item[1]):
+        if score < threshold:
+            break
+        if std_id in matches or user_id in used:
+            continue
+        matches[std_id] = (user_id, score)
+        used.add(user_id)
+    return matches
+
+
+class GapReport:
+    """对齐结果：matches 为 标准节点 -> (用户节点, 分数)，missing 为未覆盖的标准节点（按标准导图顺序）"""
+
+    def __init__(self, standard: MindMapGraph, user: MindMapGraph, matches: Dict[str, Tuple[str, float]]) -> None:
+        self.standard = standard
+        self.user = user
+        self.matches = matches
+        self.missing: List[str] = [node_id for node_id in standard.nodes if node_id not in matches]
+
+    @property
+    def coverage(self) -> float:
+        if not self.standard.nodes:
+            return 1.0
+        return len(self.matches) / len(self.standard.nodes)
+
+    def missing_subgraph(self) -> dict:
+        """
+        标准导图中缺失的节点及相关的边。
+        指向缺失节点的已覆盖前驱也一并给出，但改用与之对应的用户节点 ID，
+        模型可以直接把建议挂到用户导图的这些节点上。
+        两边的编号都从 N1 开始，缺失节点与其边因此改用单独的 S / SE 编号，避免与用户节点重名
+        """
+        renamed = {node_id: f"{MISSING_NODE_PREFIX}{i}" for i, node_id in enumerate(self.missing, 1)}
+        anchors: Dict[str, str] = {}
+        edges = []
+        for edge in self.standard.edges:
+            source, target = str(edge["source"]), str(edge["target"])
+            if target not in renamed:
+                continue
+            if source in self.matches:
+                anchors[source] = self.matches[source][0]
+                source = anchors[source]
+            elif source in renamed:
+                source = renamed[source]
+            else:
+                continue
+            edges.append({
+                **edge, "edge_id": f"{MISSING_EDGE_PREFIX}{len(edges) + 1}",
+                "source": source, "target": renamed[target],
+            })
+        nodes = [
+            {**self.user.nodes[user_id], "node_id": user_id}
+            for user_id in anchors.values()
+        ]
+        nodes += [{**self.standard.nodes[node_id], "node_id": renamed[node_id]} for node_id in self.missing]
+        return {"nodes": nodes, "edges": edges}
+
+
+def analyze_gap(user_mindmap: Optional[dict], standard_mindmap: Optional[dict],
+                threshold: float = MATCH_THRESHOLD) -> GapReport:
+    """把用户导图对齐到标准导图"""
+    standard = MindMapGraph(standard_mindmap)
+    user = MindMapGraph(user_mindmap)
+    std_features = {node_id: _NodeFeatures(node) for node_id, node in standard.nodes.items()}
+    user_features = {node_id: _NodeFeatures(node) for node_id, node in user.nodes.items()}
+    scores = {
+        (std_id, user_id): _similarity(std_f, user_f)
+        for std_id, std_f in std_features.items()
+        for user_id, user_f in user_features.items()
+    }
+
+    # 第一轮只看内容；第二轮对前驱或后继已互相对应的节点对加分，再重新匹配
+    matches = _greedy_match(scores, threshold)
+    mapped = {std_id: user_id for std_id, (user_id, _) in matches.items()}
+    for (std_id, user_id), score in scores.items():
+        if score <= 0:
+            continue
+        linked = any(
+            mapped.get(p) in user.predecessors[user_id] for p in standard.predecessors[std_id]
+        ) or any(
+            mapped.get(s) in user.successors[user_id] for s in standard.successors[std_id]
+        )
+        if linked:
+            scores[(std_id, user_id)] = score + STRUCTURE_BONUS
+    return GapReport(standard, user, _greedy_match(scores, threshold))
+
+
+# =========================================================
+# 模板建议
+# =========================================================
+def _next_id(prefix: str, existing: List[str]) -> str:
+    numbers = [int(i[len(prefix):]) for i in existing if i.startswith(prefix) and i[len(prefix):].isdigit()]
+    return f"{prefix}{max(numbers, default=0) + 1}"
+
+
+def local_suggestion(report: GapReport, complete_coverage: float = 1.0) -> Optional[dict]:
+    """
+    无需模型即可回答时返回建议（结构与模型输出相同），否则返回 None：
+    - 覆盖率达到 complete_coverage：不给建议节点，只给肯定的总结
+    - 只缺“最终答案”类节点且其前驱均已覆盖：提示写出最终答案
+    """
+    if report.standard.nodes and report.coverage >= complete_coverage:
+        return {
+            "suggestion": {"nodes": [], "edges": []},
+            "suggestion_summary": "你的思路已经覆盖了标准解法中的全部关键步骤，做得很好！"
+                                  "可以再检查一遍计算细节，并确认最终答案的表述是否完整。",
+        }
+
+    if not report.missing or not report.matches:
+        return None
+    anchors = []
+    for node_id in report.missing:
+        if report.standard.nodes[node_id].get("node_type") not in FINAL_NODE_TYPES:
+            return None
+        predecessors = report.standard.predecessors[node_id]
+        if not predecessors or any(p not in report.matches for p in predecessors):
+            return None
+        anchors.append(report.matches[predecessors[-1]][0])
+
+    node_id = _next_id("N", list(report.user.nodes))
+    edge_ids = [str(e.get("edge_id", "")) for e in report.user.edges]
+    edge_id = _next_id("E", edge_ids)
+    return {
+        "suggestion": {
+            "nodes": [{"node_id": node_id, "node_content": "把前面的结果代回原问题，写出最终答案", "node_type": "思路提示"}],
+            "edges": [{"edge_id": edge_id, "source": anchors[-1], "target": node_id, "edge_content": "接下来"}],
+        },
+        "suggestion_summary": "关键的推导你都已经完成了，只差最后一步：把前面得到的结果代回原问题，写出最终答案。",
+    }
+
+
+# =========================================================
+# 节点提示与启发式建议
+# =========================================================
+def build_node_hints(standard_mindmap: Optional[dict]) -> Dict[str, str]:
+    """
+    为标准导图的每个节点生成一句不含结论的提示：优先使用入边上的说明文字
+    （如“识别为星与杠模型”），否则按节点类型给出通用提示。导入题目时离线生成
+    """
+    graph = MindMapGraph(standard_mindmap)
+    incoming: Dict[str, List[str]] = {node_id: [] for node_id in graph.nodes}
+    for edge in graph.edges:
+        text = normalize_text(edge.get("edge_content"))
+        if text and text not in incoming[str(edge["target"])]:
+            incoming[str(edge["target"])].append(text)
+    return {
+        node_id: ("下一步可以考虑：" + "；".join(incoming[node_id])) if incoming[node_id]
+        else HINTS_BY_TYPE.get(node.get("node_type") or "", DEFAULT_HINT)
+        for node_id, node in graph.nodes.items()
+    }
+
+
+def heuristic_suggestion(report: GapReport, hints: Optional[Dict[str, str]], max_nodes: int = 2,
+                         pending: bool = True) -> Optional[dict]:
+    """
+    第一阶段建议：取前驱都已覆盖的缺失节点（即用户下一步可以走到的地方），
+    用预先生成的提示作为建议节点，挂到对应前驱的用户节点上。无法给出时返回 None。
+    pending 为假时用作最终结果（模型未能给出建议），总结中不再提示“正在生成”
+    """
+    hints = hints or {}
+    frontier = [
+        node_id for node_id in report.missing
+        if all(p in report.matches for p in report.standard.predecessors[node_id])
+    ][:max_nodes]
+    if not frontier:
+        return None
+
+    user_roots = [node_id for node_id in report.user.nodes if not report.user.predecessors[node_id]]
+    node_ids = list(report.user.nodes)
+    edge_ids = [str(e.get("edge_id", "")) for e in report.user.edges]
+    nodes, edges, texts = [], [], []
+    for std_id in frontier:
+        text = hints.get(std_id) or DEFAULT_HINT
+        if text in texts:
+            continue
+        texts.append(text)
+        node_id = _next_id("N", node_ids)
+        node_ids.append(node_id)
+        nodes.append({"node_id": node_id, "node_content": text, "node_type": "思路提示"})
+
+        predecessors = report.standard.predecessors[std_id]
+        anchor = report.matches[predecessors[-1]][0] if predecessors else (user_roots[0] if user_roots else None)
+        if anchor is not None:
+            edge_id = _next_id("E", edge_ids)
+            edge_ids.append(edge_id)
+            edges.append({"edge_id": edge_id, "source": anchor, "target": node_id, "edge_content": "接下来"})
+
+    return {
+        "suggestion": {"nodes": nodes, "edges": edges},
+        "suggestion_summary": ("更详细的建议正在生成，可以先想一想：" if pending else "可以先想一想：")
+                              + "\n\n" + "\n".join(f"- {text}" for text in texts),
+    }
@@ -0,0 +1,50 @@
+# app/core/idempotency.py
+# 幂等键 -> 后台任务的有界映射：重复请求（双击、客户端重试）挂到已有任务上，而不是再发起一次 LLM 调用
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from app.core.manager.job_manager import Job
+
+
+def derive_idempotency_key(kind: str, solution_id: int, *inputs: Any) -> str:
+    """由任务类型、做题记录 ID 与输入内容生成幂等键"""
+    h = hashlib.sha256()
+    for item in inputs:
+        if not isinstance(item, str):
+            item = json.dumps(item, ensure_ascii=False, sort_keys=True)
+        h.update(item.encode("utf-8"))
+        h.update(b"\0")
+    return f"derived:{kind}:{solution_id}:{h.hexdigest()}"
+
+
+class IdempotencyStore:
+    """LRU + TTL 的有界存储"""
+
+    def __init__(self, max_entries: int = 2048, ttl_seconds: float = 600) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # key -> (job, 创建时间)
+        self.entries: "OrderedDict[str, Tuple[Job, float]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Job]:
+        """返回该键对应的任务；任务已失败 / 被取消或已过期则视为不存在"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        job, created_at = entry
+        expired = time.monotonic() - created_at > self.ttl_seconds
+        failed = job.done and job.result is None
+        if expired or failed:
+            self.entries.pop(key, None)
+            return None
+        self.entries.move_to_end(key)
+        return job
+
+    def put(self, key: str, job: Job):
+        self.entries[key] = (job, time.monotonic())
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
@@ -0,0 +1,92 @@
+# app/core/llm_clients.py
+# 进程内共享的 OpenAIClient：所有模型调用共用同一个 httpx 连接池（可配置连接上限、keep-alive 与 HTTP/2），
+# 避免每个 Agent 各自创建客户端、丢掉已建立的连接与 TLS 会话；启动时可预先连接每个端点
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+import httpx
+from handyllm import OpenAIClient
+
+from app.core.config import Endpoint, LLMClientConfig
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class LLMClientRegistry:
+    def __init__(self, config: Optional[LLMClientConfig] = None, endpoints: Optional[List[Endpoint]] = None) -> None:
+        self.config = config or LLMClientConfig()
+        self.endpoints = list(endpoints or [])
+        self.http2 = self.config.http2 and _http2_available()
+        if self.config.http2 and not self.http2:
+            logger.warning("未安装 h2（httpx[http2]），模型调用改用 HTTP/1.1")
+        self._client: Optional[OpenAIClient] = None
+        # OpenAIClient 构造时自带的 httpx 客户端（被替换下来，只能异步关闭，在 aclose 中一并关闭）
+        self._replaced: List[httpx.AsyncClient] = []
+
+    def _build_http_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=self.config.max_connections,
+                max_keepalive_connections=self.config.max_keepalive_connections,
+                keepalive_expiry=self.config.keepalive_expiry,
+            ),
+            # 请求整体超时由 handyllm 按请求传入，这里只限制建立连接的时间
+            timeout=httpx.Timeout(None, connect=self.config.connect_timeout),
+        )
+
+    def get(self) -> OpenAIClient:
+        """进程内共享的异步客户端（首次调用时创建）"""
+        if self._client is None:
+            client = OpenAIClient("async", endpoints=[ep.model_dump() for ep in self.endpoints])
+            # handyLLM 0.9.x 没有提供传入 httpx 客户端的参数：依赖其内部实现，构造函数创建 _async_client，
+            # 每次请求时再交给 requestor。替换前保留默认客户端（尚未建立连接），关闭时一并释放；升级 handyLLM 时需确认
+            if client._async_client is not None:
+                self._replaced.append(client._async_client)
+            client._async_client = self._build_http_client()
+            self._client = client
+        return self._client
+
+    async def warmup(self) -> Dict[str, bool]:
+        """
+        向每个端点发送一次 GET /models，预先建立连接（TCP + TLS）并放入连接池。
+        只要收到 HTTP 响应即视为成功：handyllm 对错误状态码抛出普通 Exception（并记录错误日志），
+        部分端点不支持 /models 也没关系；只有连接层面的错误视为失败。返回 端点名 -> 是否成功
+        """
+        client = self.get()
+
+        async def _warm(index: int, endpoint: Endpoint):
+            name = endpoint.name or f"endpoint-{index}"
+            start = time.perf_counter()
+            try:
+                await client.models_list(endpoint=endpoint.model_dump(), timeout=self.config.warmup_timeout).acall()
+            except httpx.TransportError as e:
+                logger.warning(f"端点 {name} 预热失败: {e!r}")
+                metrics.inc("llm_warmup_total", {"endpoint": name, "result": "error"}, description="启动时端点预热结果")
+                return name, False
+            except Exception:
+                pass
+            logger.info(f"端点 {name} 预热完成，用时 {time.perf_counter() - start:.2f}s")
+            metrics.inc("llm_warmup_total", {"endpoint": name, "result": "ok"}, description="启动时端点预热结果")
+            return name, True
+
+        results = await asyncio.gather(*(_warm(i, ep) for i, ep in enumerate(self.endpoints)))
+        return dict(results)
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        while self._replaced:
+            await self._replaced.pop().aclose()
@@ -1,18 +1,48 @@
+from collections import OrderedDict
 from pathlib import Path
+from typing import Optional
 from sqlalchemy import Engine
 from sqlmodel import Session, select
 import json
+import logging
 
 from app.core.agent.constants import ROOT
-from BackEnd.app.core.privacy_agent import PrivacyAgent
+from app.core.metrics import metrics
+from app.core.privacy_agent import PrivacyAgent
 from app.database import Chat, Message, Suggestion
 
+logger = logging.getLogger(__name__)
+
 
 class ChatManager:
-    def __init__(self, db_engine: Engine):
+    def __init__(self, db_engine: Engine, max_agents: int = 256):
         self.db_engine = db_engine
-        # 初始化agents字典
-        self.privacy_agents: dict[int, PrivacyAgent] = {}
+        # chat_id -> PrivacyAgent，按最近使用排序；超过 max_agents 时淘汰最久未用的，
+        # 再次访问时根据数据库中的聊天记录重新创建（缓存与 prompt 目录在磁盘上，重建后仍可用）
+        self.max_agents = max_agents
+        self.privacy_agents: "OrderedDict[int, PrivacyAgent]" = OrderedDict()
+
+    def _record(self, result: str):
+        metrics.inc("privacy_agent_pool_total", {"result": result}, description="聊天 PrivacyAgent 池的命中与淘汰")
+
+    def _evict(self):
+        """淘汰最久未用的 agent，跳过仍有消息在处理中的（池可能暂时超出上限）"""
+        for chat_id in list(self.privacy_agents):
+            if len(self.privacy_agents) <= self.max_agents:
+                return
+            agent = self.privacy_agents[chat_id]
+            if agent.busy:
+                continue
+            del self.privacy_agents[chat_id]
+            agent.close()
+            self._record("evicted")
+            logger.debug(f"淘汰 chat {chat_id} 的 PrivacyAgent")
+
+    def _put(self, chat_id: int, agent: PrivacyAgent) -> PrivacyAgent:
+        self.privacy_agents[chat_id] = agent
+        self.privacy_agents.move_to_end(chat_id)
+        self._evict()
+        return agent
 
     def new_chat(self, user_id: int):
         '''创建一个新的聊天记录，返回 chat_id'''
@@ -20,13 +50,27 @@ class ChatManager:
             new_chat = Chat(user_id=user_id)
             session.add(new_chat)
             session.commit()
-            
+
             if new_chat.chat_id is not None:
                 # 为该 chat_id 创建  实例
-                self.privacy_agents[new_chat.chat_id] = PrivacyAgent(
+                self._put(new_chat.chat_id, PrivacyAgent(
                     root_dir=ROOT,
                     chat_id=new_chat.chat_id
-                )
-            
+                ))
+                self._record("created")
+
             return new_chat.chat_id
-        
+
+    def get_agent(self, chat_id: int) -> Optional[PrivacyAgent]:
+        '''取得 chat_id 对应的 PrivacyAgent，不在池中时按数据库记录重新创建；聊天不存在时返回 None'''
+        agent = self.privacy_agents.get(chat_id)
+        if agent is not None:
+            self.privacy_agents.move_to_end(chat_id)
+            self._record("hit")
+            return agent
+        with Session(self.db_engine) as session:
+            if session.get(Chat, chat_id) is None:
+                return None
+        self._record("rebuilt")
+        return self._put(chat_id, PrivacyAgent(root_dir=ROOT, chat_id=chat_id))
+
@@ -0,0 +1,124 @@
+# app/core/manager/job_manager.py
+import asyncio
+import logging
+import uuid
+from typing import Any, Callable, Coroutine, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """一次后台 AI 任务（思维导图更新 / 建议生成）"""
+
+    def __init__(self, job_id: str, kind: str, user_id: int, solution_id: int, task: asyncio.Task):
+        self.job_id = job_id
+        self.kind = kind
+        self.user_id = user_id
+        self.solution_id = solution_id
+        self.task = task
+        # 限流合并时置位：有更新的请求合并到本任务，完成后需按最新输入再执行一次
+        self.rerun_requested = False
+
+    @property
+    def done(self) -> bool:
+        return self.task.done()
+
+    @property
+    def result(self) -> Any:
+        """任务成功完成时的返回值；未完成、被取消或异常时为 None"""
+        if not self.task.done() or self.task.cancelled() or self.task.exception() is not None:
+            return None
+        return self.task.result()
+
+
+class JobManager:
+    """
+    管理进程内正在运行的后台任务。
+    HTTP 接口与 Socket.IO 事件都通过这里提交任务，并拿到统一的 job_id。
+    """
+
+    def __init__(self) -> None:
+        self.jobs: Dict[str, Job] = {}
+        # user_id -> 等待宽限期结束后执行取消的计时任务
+        self.pending_cancels: Dict[int, asyncio.Task] = {}
+
+    def submit(self, kind: str, user_id: int, solution_id: int, coro: Coroutine[Any, Any, Any]) -> Job:
+        """创建后台任务并登记，返回 Job"""
+        job_id = uuid.uuid4().hex
+        task = asyncio.create_task(coro, name=f"{kind}:{job_id}")
+        job = Job(job_id, kind, int(user_id), int(solution_id), task)
+        self.jobs[job_id] = job
+        task.add_done_callback(lambda _: self._on_done(job))
+        logger.info(f"[job {job_id}] 已提交 kind={kind} user={user_id} solution={solution_id}")
+        return job
+
+    def _on_done(self, job: Job):
+        self.jobs.pop(job.job_id, None)
+        if job.task.cancelled():
+            logger.info(f"[job {job.job_id}] 已取消")
+        elif job.task.exception() is not None:
+            logger.error(f"[job {job.job_id}] 异常结束: {job.task.exception()}")
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def current_job(self) -> Optional[Job]:
+        """在任务内部调用时返回当前任务对应的 Job"""
+        task = asyncio.current_task()
+        return next((job for job in self.jobs.values() if job.task is task), None)
+
+    def get_jobs_by_user(self, user_id: int) -> List[Job]:
+        return [job for job in self.jobs.values() if job.user_id == int(user_id)]
+
+    def get_jobs_by_solution(self, solution_id: int, kind: Optional[str] = None) -> List[Job]:
+        return [
+            job for job in self.jobs.values()
+            if job.solution_id == int(solution_id) and (kind is None or job.kind == kind)
+        ]
+
+    # =========================================================
+    # 取消任务
+    # =========================================================
+    def cancel_jobs(self, jobs: List[Job]) -> int:
+        count = 0
+        for job in jobs:
+            if not job.done:
+                job.task.cancel()
+                count += 1
+        return count
+
+    def cancel_user_jobs(self, user_id: int) -> int:
+        """取消该用户所有进行中的任务，返回取消的数量"""
+        return self.cancel_jobs(self.get_jobs_by_user(user_id))
+
+    def cancel_solution_jobs(self, solution_id: int, kind: Optional[str] = None) -> int:
+        """取消该做题记录所有进行中的任务，返回取消的数量"""
+        return self.cancel_jobs(self.get_jobs_by_solution(solution_id, kind))
+
+    def schedule_user_cancel(self, user_id: int, delay: float, should_cancel: Callable[[], bool]):
+        """
+        delay 秒后，若 should_cancel() 仍为真（例如用户仍未重连），取消该用户的任务。
+        重复调用会重置计时。
+        """
+        user_id = int(user_id)
+        if not self.get_jobs_by_user(user_id):
+            return
+        self.abort_user_cancel(user_id)
+
+        async def _delayed_cancel():
+            try:
+                await asyncio.sleep(delay)
+                if should_cancel():
+                    count = self.cancel_user_jobs(user_id)
+                    logger.info(f"用户 {user_id} 已断开超过 {delay}s，取消 {count} 个任务")
+            finally:
+                if self.pending_cancels.get(user_id) is asyncio.current_task():
+                    self.pending_cancels.pop(user_id, None)
+
+        self.pending_cancels[user_id] = asyncio.create_task(_delayed_cancel())
+
+    def abort_user_cancel(self, user_id: int):
+        """用户重连时撤销待执行的取消"""
+        task = self.pending_cancels.pop(int(user_id), None)
+        if task is not None and not task.done():
+            task.cancel()
@@ -1,11 +1,17 @@
 # app/core/problem_manager.py
+from pathlib import Path
+from typing import List, Optional, Tuple
 from sqlmodel import Session, select
 from sqlalchemy import Engine
 from app.database import Problem
+from app.core.dedup import NearDuplicateIndex
 
 class ProblemManager:
-    def __init__(self, db_engine: Engine):
+    def __init__(self, db_engine: Engine, index_path: Optional[Path] = None):
         self.db_engine = db_engine
+        # 近似重复题目索引，首次查询时加载
+        self.index_path = index_path
+        self._index: Optional[NearDuplicateIndex] = None
 
     def get_all_problems(self):
         """获取所有题目列表"""
@@ -16,4 +22,33 @@ class ProblemManager:
     def get_problem_by_id(self, problem_id: int):
         """根据ID获取题目详情"""
         with Session(self.db_engine) as session:
-            return session.get(Problem, problem_id)
\ No newline at end of file
+            return session.get(Problem, problem_id)
+
+    def get_problems_by_ids(self, problem_ids: List[int]):
+        """按给定 ID 批量获取题目，返回 {problem_id: Problem}"""
+        if not problem_ids:
+            return {}
+        with Session(self.db_engine) as session:
+            statement = select(Problem).where(Problem.problem_id.in_(problem_ids))
+            return {p.problem_id: p for p in session.exec(statement).all()}
+
+    @property
+    def index(self) -> NearDuplicateIndex:
+        if self._index is None:
+            self._index = NearDuplicateIndex.load(self.index_path) if self.index_path else NearDuplicateIndex()
+        return self._index
+
+    def find_similar_problems(self, problem_id: int, top_k: int = 5, threshold: float = 0.0) -> List[Tuple[Problem, float]]:
+        """
+        返回与指定题目最相似的题目 [(Problem, 估计相似度)]。
+        索引中没有该题（例如导入后新增）时，现场计算签名并加入内存索引
+        """
+        if problem_id not in self.index:
+            problem = self.get_problem_by_id(problem_id)
+            if not problem:
+                return []
+            self.index.add(problem_id, problem.problem_content)
+        matches = self.index.query_by_id(problem_id, top_k=top_k, threshold=threshold)
+        problems = self.get_problems_by_ids([pid for pid, _ in matches])
+        # 索引中已被删除的题目直接忽略
+        return [(problems[pid], score) for pid, score in matches if pid in problems]
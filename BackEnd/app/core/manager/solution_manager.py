@@ -54,17 +54,45 @@ class SolutionManager:
                 session.refresh(solution)
             return solution
         
-    def update_mindmap(self, solution_id: int, mindmap: dict):
-        """更新用户的思维导图"""
+    def update_mindmap(self, solution_id: int, mindmap: dict, source_text: Optional[str] = None):
+        """更新用户的思维导图；source_text 为生成该导图所依据的解答文本"""
         with Session(self.db_engine) as session:
             solution = session.get(UserSolution, solution_id)
             if solution:
                 solution.new_mindmap = mindmap
+                if source_text is not None:
+                    solution.mindmap_source = source_text
                 session.add(solution)
                 session.commit()
                 session.refresh(solution)
             return solution
         
+    def update_mindmap_source(self, solution_id: int, source_text: str):
+        """只更新导图对应的解答文本（文本有变化但导图无需改动时）"""
+        with Session(self.db_engine) as session:
+            solution = session.get(UserSolution, solution_id)
+            if solution:
+                solution.mindmap_source = source_text
+                session.add(solution)
+                session.commit()
+                session.refresh(solution)
+            return solution
+
+    def update_mindmap_and_suggestion(self, solution_id: int, mindmap: Optional[dict], source_text: str,
+                                      suggestion_summary: str):
+        """在同一次写入中保存导图（为 None 时不改动）、其对应的解答文本与建议"""
+        with Session(self.db_engine) as session:
+            solution = session.get(UserSolution, solution_id)
+            if solution:
+                if mindmap is not None:
+                    solution.new_mindmap = mindmap
+                solution.mindmap_source = source_text
+                solution.suggestion_summary = suggestion_summary
+                session.add(solution)
+                session.commit()
+                session.refresh(solution)
+            return solution
+
     def update_suggestion(self, solution_id: int, suggestion_summary: str):
         """更新用户的建议"""
         with Session(self.db_engine) as session:
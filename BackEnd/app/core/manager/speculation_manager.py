@@ -0,0 +1,101 @@
+# app/core/manager/speculation_manager.py
+# 草稿预生成：学生编辑期间按草稿预先生成导图，正式的更新请求文本一致时直接采用。
+# 每个做题记录只保留最新的一份；预生成不写库、不推送，也不登记为 Job
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Any, Coroutine, Dict, Optional
+
+from app.core.metrics import metrics
+from app.core.mindmap_graph import mindmap_hash
+
+logger = logging.getLogger(__name__)
+
+
+def speculation_key(mindmap: Optional[dict], mindmap_source: Optional[str], text: str) -> str:
+    """导图的更新方式与结果取决于现有导图、其对应的解答文本与新文本，三者一致才能采用"""
+    h = hashlib.sha256()
+    for part in (mindmap_hash(mindmap), "\0" if mindmap_source is None else mindmap_source, text):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class Speculation:
+    def __init__(self, solution_id: int, key: str, task: asyncio.Task) -> None:
+        self.solution_id = solution_id
+        self.key = key
+        self.task = task
+        self.created_at = time.monotonic()
+
+
+class SpeculationManager:
+    def __init__(self, ttl_seconds: float = 300) -> None:
+        self.ttl_seconds = ttl_seconds
+        # solution_id -> 最新的预生成
+        self.entries: Dict[int, Speculation] = {}
+
+    def _record(self, result: str):
+        metrics.inc("speculation_total", {"result": result}, description="草稿预生成的结果")
+
+    def _expired(self, entry: Speculation) -> bool:
+        return time.monotonic() - entry.created_at > self.ttl_seconds
+
+    def _purge(self):
+        for solution_id, entry in list(self.entries.items()):
+            if self._expired(entry):
+                entry.task.cancel()
+                del self.entries[solution_id]
+
+    def running_count(self) -> int:
+        return sum(1 for entry in self.entries.values() if not entry.task.done())
+
+    def has(self, solution_id: int, key: str) -> bool:
+        entry = self.entries.get(int(solution_id))
+        return entry is not None and entry.key == key and not self._expired(entry)
+
+    def start(self, solution_id: int, key: str, coro: Coroutine[Any, Any, Any]) -> Speculation:
+        """开始预生成，取代该做题记录之前的预生成"""
+        self._purge()
+        previous = self.entries.pop(int(solution_id), None)
+        if previous is not None:
+            previous.task.cancel()
+        task = asyncio.create_task(coro, name=f"speculation:{solution_id}")
+        entry = Speculation(int(solution_id), key, task)
+        self.entries[entry.solution_id] = entry
+        self._record("started")
+        return entry
+
+    def take(self, solution_id: int, key: str) -> Optional[asyncio.Task]:
+        """
+        正式请求到来时取出与之匹配的预生成（已完成或仍在进行），不匹配的预生成直接丢弃。
+        取出后不再受 cancel_running 影响，由调用方等待其结果
+        """
+        entry = self.entries.pop(int(solution_id), None)
+        if entry is None:
+            self._record("miss")
+            return None
+        task = entry.task
+        if entry.key != key or self._expired(entry):
+            task.cancel()
+            self._record("stale")
+            return None
+        if task.done() and (task.cancelled() or task.exception() is not None or not task.result()):
+            self._record("failed")
+            return None
+        self._record("hit" if task.done() else "hit_running")
+        return task
+
+    def cancel_running(self) -> int:
+        """有正式任务在等待时让出：取消所有进行中的预生成，返回取消的数量"""
+        count = 0
+        for solution_id, entry in list(self.entries.items()):
+            if not entry.task.done():
+                entry.task.cancel()
+                del self.entries[solution_id]
+                count += 1
+        if count:
+            metrics.inc("speculation_total", {"result": "yielded"}, value=count, description="草稿预生成的结果")
+            logger.info(f"正式任务繁忙，取消 {count} 个预生成")
+        return count
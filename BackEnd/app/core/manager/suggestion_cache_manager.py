@@ -0,0 +1,123 @@
+# app/core/manager/suggestion_cache_manager.py
+import hashlib
+from typing import Optional
+
+from sqlalchemy import Engine, func
+from sqlmodel import Session, select, delete
+
+from app.core.metrics import metrics
+from app.core.mindmap_graph import MindMapGraph, canonical_node_ids, mindmap_hash
+from app.database import SuggestionCache, get_current_datetime
+
+# 建议的生成方式（提示词、本地对齐规则）或缓存的存储形式变化时递增，使旧缓存失效
+SUGGESTION_CACHE_VERSION = 2
+# 缓存中建议自身的节点 / 边编号（挂载点使用用户导图的规范编号 N1..Nn）
+CACHED_NODE_PREFIX = "X"
+CACHED_EDGE_PREFIX = "XE"
+
+
+def suggestion_cache_key(user_mindmap: Optional[dict], solution_text: Optional[str],
+                         standard_mindmap: Optional[dict]) -> str:
+    """
+    用户导图取规范形式的哈希（编号、顺序不同的等价导图命中同一条缓存），
+    解答文本合并空白，标准导图的哈希即其版本
+    """
+    h = hashlib.sha256()
+    for part in (
+        str(SUGGESTION_CACHE_VERSION),
+        mindmap_hash(user_mindmap),
+        " ".join((solution_text or "").split()),
+        mindmap_hash(standard_mindmap),
+    ):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _next_number(prefix: str, ids) -> int:
+    numbers = [int(i[len(prefix):]) for i in ids if i.startswith(prefix) and i[len(prefix):].isdigit()]
+    return max(numbers, default=0) + 1
+
+
+def _relabel_suggestion(suggestion: dict, node_ids: dict, new_node_id, new_edge_id) -> dict:
+    """按 node_ids 改写挂载点的编号，建议自身的节点与边用 new_node_id / new_edge_id 重新编号"""
+    own = {}
+    for i, node in enumerate(suggestion.get("nodes", []), 1):
+        own[str(node.get("node_id"))] = new_node_id(i)
+
+    def _map(node_id):
+        node_id = str(node_id)
+        return own.get(node_id) or node_ids.get(node_id, node_id)
+
+    return {
+        "nodes": [{**node, "node_id": own[str(node.get("node_id"))]} for node in suggestion.get("nodes", [])],
+        "edges": [
+            {**edge, "edge_id": new_edge_id(i), "source": _map(edge.get("source")), "target": _map(edge.get("target"))}
+            for i, edge in enumerate(suggestion.get("edges", []), 1)
+        ],
+    }
+
+
+def to_cached_ids(suggestion: dict, user_mindmap: Optional[dict]) -> dict:
+    """
+    缓存键按导图的规范形式计算（与编号无关），缓存的建议因此也改用规范编号存储：
+    挂载点改为用户导图的规范编号，建议自身的节点与边改为 X1.. / XE1..
+    """
+    return _relabel_suggestion(
+        suggestion, canonical_node_ids(user_mindmap),
+        lambda i: f"{CACHED_NODE_PREFIX}{i}", lambda i: f"{CACHED_EDGE_PREFIX}{i}"
+    )
+
+
+def from_cached_ids(suggestion: dict, user_mindmap: Optional[dict]) -> dict:
+    """to_cached_ids 的逆过程：挂载点换回请求方导图中对应的节点，建议节点与边接着请求方导图的最大编号继续编号"""
+    graph = MindMapGraph(user_mindmap)
+    to_user = {canonical: node_id for node_id, canonical in canonical_node_ids(graph).items()}
+    first_node = _next_number("N", graph.nodes)
+    first_edge = _next_number("E", [str(e.get("edge_id", "")) for e in graph.edges])
+    return _relabel_suggestion(
+        suggestion, to_user,
+        lambda i: f"N{first_node + i - 1}", lambda i: f"E{first_edge + i - 1}"
+    )
+
+
+class SuggestionCacheManager:
+    def __init__(self, db_engine: Engine, max_entries: int = 20000):
+        self.db_engine = db_engine
+        self.max_entries = max_entries
+
+    def get(self, cache_key: str, user_mindmap: Optional[dict]) -> Optional[dict]:
+        """
+        命中时返回 {"suggestion", "suggestion_summary"}（节点编号已换成 user_mindmap 中的编号），
+        并记录命中次数与使用时间
+        """
+        with Session(self.db_engine) as session:
+            entry = session.get(SuggestionCache, cache_key)
+            metrics.inc("suggestion_cache_total", {"result": "hit" if entry else "miss"},
+                        description="解题建议缓存的查询结果")
+            if entry is None:
+                return None
+            entry.hits += 1
+            entry.last_used_at = get_current_datetime()
+            session.add(entry)
+            session.commit()
+            return {
+                "suggestion": from_cached_ids(entry.suggestion or {}, user_mindmap),
+                "suggestion_summary": entry.suggestion_summary,
+            }
+
+    def put(self, cache_key: str, problem_id: int, result: dict, user_mindmap: Optional[dict]):
+        """写入（或覆盖）一条缓存，超出上限时淘汰最久未使用的条目；user_mindmap 为生成建议时的用户导图"""
+        with Session(self.db_engine) as session:
+            entry = session.get(SuggestionCache, cache_key) or SuggestionCache(cache_key=cache_key, problem_id=problem_id)
+            entry.suggestion = to_cached_ids(result.get("suggestion") or {}, user_mindmap)
+            entry.suggestion_summary = result.get("suggestion_summary", "")
+            entry.last_used_at = get_current_datetime()
+            session.add(entry)
+            session.commit()
+
+            count = session.exec(select(func.count()).select_from(SuggestionCache)).one()
+            if count > self.max_entries:
+                stale = select(SuggestionCache.cache_key).order_by(SuggestionCache.last_used_at).limit(count - self.max_entries)
+                session.exec(delete(SuggestionCache).where(SuggestionCache.cache_key.in_(stale)))
+                session.commit()
@@ -31,6 +31,11 @@ class UserManager:
             self.sid2userId[sid] = user_id
             return user
 
+    def getUserId(self, sid) -> Optional[int]:
+        # 直接从 sid 注册表查找用户 ID，无需查库或解析 JWT
+        userId = self.sid2userId.get(sid)
+        return int(userId) if userId is not None else None
+
     def removeSid(self, sid):
         # 删除 sid 对应的映射关系
         return self.sid2userId.pop(sid, None)           
@@ -0,0 +1,45 @@
+# app/core/metrics.py
+# 进程内的简易指标收集，通过 /api/metrics 以 Prometheus 文本格式导出
+import threading
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+
+LabelsKey = Tuple[Tuple[str, str], ...]
+
+
+def _labels_key(labels: Optional[Dict[str, str]]) -> LabelsKey:
+    return tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+
+class Metrics:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[LabelsKey, float]] = defaultdict(lambda: defaultdict(float))
+        self.descriptions: Dict[str, str] = {}
+
+    def inc(self, name: str, labels: Optional[Dict[str, str]] = None, value: float = 1, description: str = ""):
+        """计数器累加"""
+        with self._lock:
+            self.counters[name][_labels_key(labels)] += value
+            if description:
+                self.descriptions.setdefault(name, description)
+
+    def get(self, name: str, labels: Optional[Dict[str, str]] = None) -> float:
+        with self._lock:
+            return self.counters.get(name, {}).get(_labels_key(labels), 0)
+
+    def render_prometheus(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            for name in sorted(self.counters):
+                if name in self.descriptions:
+                    lines.append(f"# HELP {name} {self.descriptions[name]}")
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(self.counters[name].items()):
+                    label_str = ",".join(f'{k}="{v}"' for k, v in key)
+                    lines.append(f"{name}{{{label_str}}} {value:g}" if label_str else f"{name} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
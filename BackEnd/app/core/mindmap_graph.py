@@ -0,0 +1,311 @@
+# app/core/mindmap_graph.py
+# 思维导图的图结构：邻接索引、边校验、分层布局与规范形式（结构哈希）。
+# 布局在服务端计算一次并按结构哈希缓存，前端直接使用坐标，不必在低端设备上重新排版
+import hashlib
+import json
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from app.core.dedup import LATEX_ALIASES, LATEX_NOISE
+
+Positions = Dict[str, Dict[str, float]]
+
+# $$...$$ / $...$ / \(...\) / \[...\]
+_MATH_RE = re.compile(r"\$\$(.+?)\$\$|\$(.+?)\$|\\\((.+?)\\\)|\\\[(.+?)\\\]", re.S)
+_LATEX_CMD_RE = re.compile(r"\\[A-Za-z]+|\\[,;!]")
+# 结构标签的迭代轮数：每一轮把邻居的标签并入，轮数越多区分的邻域越大
+_LABEL_ROUNDS = 3
+
+
+class MindMapGraph:
+    """
+    由 {"nodes": [...], "edges": [...]} 构建的只读图。
+    重复的节点只保留第一次出现的；端点不存在的边（悬空边）单独记录，不进入邻接表
+    """
+
+    def __init__(self, mindmap: Optional[dict]) -> None:
+        mindmap = mindmap or {}
+        self.nodes: Dict[str, dict] = {}
+        self.duplicate_nodes: List[str] = []
+        for node in mindmap.get("nodes") or []:
+            node_id = str(node.get("node_id", ""))
+            if node_id in self.nodes:
+                self.duplicate_nodes.append(node_id)
+                continue
+            self.nodes[node_id] = node
+
+        self.edges: List[dict] = []
+        self.dangling_edges: List[dict] = []
+        self.successors: Dict[str, List[str]] = {node_id: [] for node_id in self.nodes}
+        self.predecessors: Dict[str, List[str]] = {node_id: [] for node_id in self.nodes}
+        for edge in mindmap.get("edges") or []:
+            source, target = str(edge.get("source", "")), str(edge.get("target", ""))
+            if source not in self.nodes or target not in self.nodes:
+                self.dangling_edges.append(edge)
+                continue
+            self.edges.append(edge)
+            self.successors[source].append(target)
+            self.predecessors[target].append(source)
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    # =========================================================
+    # 校验
+    # =========================================================
+    def back_edges(self) -> Set[Tuple[str, str]]:
+        """DFS 中指向祖先的边（含自环）；去掉这些边后图无环"""
+        WHITE, GRAY, BLACK = 0, 1, 2
+        color = {node_id: WHITE for node_id in self.nodes}
+        result: Set[Tuple[str, str]] = set()
+        for root in self.nodes:
+            if color[root] != WHITE:
+                continue
+            # 迭代实现，避免长链导图触发递归深度限制
+            color[root] = GRAY
+            stack = [(root, iter(self.successors[root]))]
+            while stack:
+                node_id, children = stack[-1]
+                for child in children:
+                    if color[child] == WHITE:
+                        color[child] = GRAY
+                        stack.append((child, iter(self.successors[child])))
+                        break
+                    if color[child] == GRAY:
+                        result.add((node_id, child))
+                else:
+                    color[node_id] = BLACK
+                    stack.pop()
+        return result
+
+    def validate(self) -> List[str]:
+        """返回结构问题的描述列表，为空表示导图结构正常"""
+        issues = []
+        for node_id in self.duplicate_nodes:
+            issues.append(f"重复的节点: {node_id}")
+        for edge in self.dangling_edges:
+            issues.append(f"悬空的边: {edge.get('edge_id')} ({edge.get('source')} -> {edge.get('target')})")
+        seen_pairs = set()
+        for edge in self.edges:
+            pair = (str(edge["source"]), str(edge["target"]))
+            if pair[0] == pair[1]:
+                issues.append(f"自环: {edge.get('edge_id')} ({pair[0]})")
+            elif pair in seen_pairs:
+                issues.append(f"重复的边: {edge.get('edge_id')} ({pair[0]} -> {pair[1]})")
+            seen_pairs.add(pair)
+        for source, target in sorted(self.back_edges()):
+            if source != target:
+                issues.append(f"存在环: {source} -> {target}")
+        return issues
+
+    def to_mindmap(self) -> dict:
+        """去掉重复节点与悬空边后的导图"""
+        return {"nodes": list(self.nodes.values()), "edges": list(self.edges)}
+
+    # =========================================================
+    # 布局
+    # =========================================================
+    def layout_key(self, *params) -> str:
+        """
+        布局只取决于节点 / 边的拓扑与布局参数，与节点文字无关；
+        节点与边保持原有顺序（顺序会影响同层排列）
+        """
+        structure = [list(self.nodes), [[str(e["source"]), str(e["target"])] for e in self.edges], list(params)]
+        return hashlib.sha1(json.dumps(structure, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def layers(self) -> Dict[str, int]:
+        """最长路径分层：去掉回边后，每个节点位于其所有前驱之后的一层"""
+        back = self.back_edges()
+        indegree = {node_id: 0 for node_id in self.nodes}
+        forward: Dict[str, List[str]] = {node_id: [] for node_id in self.nodes}
+        for source in self.nodes:
+            for target in self.successors[source]:
+                if (source, target) in back:
+                    continue
+                forward[source].append(target)
+                indegree[target] += 1
+
+        layer = {node_id: 0 for node_id in self.nodes}
+        queue = [node_id for node_id in self.nodes if indegree[node_id] == 0]
+        for node_id in queue:  # queue 在遍历中追加，即 Kahn 拓扑排序
+            for child in forward[node_id]:
+                layer[child] = max(layer[child], layer[node_id] + 1)
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    queue.append(child)
+        return layer
+
+    def layered_layout(self, node_width: float = 350, node_height: float = 150,
+                       rank_sep: float = 80, node_sep: float = 40, sweeps: int = 4) -> Positions:
+        """
+        从左到右的分层布局（与前端 dagre rankdir=LR 的效果一致），
+        同层节点按前驱 / 后继的重心交替排序以减少交叉。
+        返回 node_id -> 节点左上角坐标 {"x", "y"}
+        """
+        if not self.nodes:
+            return {}
+        layer = self.layers()
+        ranks: List[List[str]] = [[] for _ in range(max(layer.values()) + 1)]
+        for node_id in self.nodes:
+            ranks[layer[node_id]].append(node_id)
+
+        order = {node_id: i for rank in ranks for i, node_id in enumerate(rank)}
+
+        def _sort_rank(rank: List[str], neighbours: Dict[str, List[str]], ref_layer: int):
+            def _barycenter(node_id: str) -> float:
+                refs = [order[n] for n in neighbours[node_id] if layer[n] == ref_layer]
+                return sum(refs) / len(refs) if refs else order[node_id]
+            rank.sort(key=_barycenter)
+            for i, node_id in enumerate(rank):
+                order[node_id] = i
+
+        for sweep in range(sweeps):
+            if sweep % 2 == 0:
+                for i in range(1, len(ranks)):
+                    _sort_rank(ranks[i], self.predecessors, i - 1)
+            else:
+                for i in range(len(ranks) - 2, -1, -1):
+                    _sort_rank(ranks[i], self.successors, i + 1)
+
+        # 各层相对节点最多的一层垂直居中，坐标均不小于 0
+        step_y = node_height + node_sep
+        tallest = max(len(rank) for rank in ranks)
+        positions: Positions = {}
+        for i, rank in enumerate(ranks):
+            offset = (tallest - len(rank)) * step_y / 2
+            for j, node_id in enumerate(rank):
+                positions[node_id] = {"x": i * (node_width + rank_sep), "y": offset + j * step_y}
+        return positions
+
+
+class MindMapLayoutCache:
+    """结构哈希 -> 坐标 的 LRU 缓存；导图只改动文字时直接复用上次的布局"""
+
+    def __init__(self, max_entries: int = 1024, node_width: float = 350, node_height: float = 150,
+                 rank_sep: float = 80, node_sep: float = 40) -> None:
+        self.max_entries = max_entries
+        self.params = (node_width, node_height, rank_sep, node_sep)
+        self.entries: "OrderedDict[str, Positions]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # 同步调用可能来自线程池（例如 FastAPI 的同步路由）
+        self._lock = threading.Lock()
+
+    def layout(self, mindmap: Union[dict, MindMapGraph, None]) -> Positions:
+        graph = mindmap if isinstance(mindmap, MindMapGraph) else MindMapGraph(mindmap)
+        key = graph.layout_key(*self.params)
+        with self._lock:
+            positions = self.entries.get(key)
+            if positions is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return positions
+            self.misses += 1
+
+        node_width, node_height, rank_sep, node_sep = self.params
+        positions = graph.layered_layout(node_width, node_height, rank_sep, node_sep)
+        with self._lock:
+            self.entries[key] = positions
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return positions
+
+
+# =========================================================
+# 规范形式与结构哈希
+# 模型每次生成的节点 / 边编号（N1、E1……）都是任意的，
+# 规范形式只由内容与连接关系决定，两张等价的导图得到相同的哈希
+# =========================================================
+def _normalize_math(body: str) -> str:
+    body = _LATEX_CMD_RE.sub(lambda m: "" if m.group(0) in LATEX_NOISE else LATEX_ALIASES.get(m.group(0), m.group(0)), body)
+    # 数学模式中的空白无意义，只保留分隔两个字母（如 \alpha x）所需的空格
+    body = re.sub(r"\s+", " ", body).strip()
+    return re.sub(r" (?![A-Za-z])|(?<![A-Za-z]) ", "", body)
+
+
+def normalize_text(text: Optional[str]) -> str:
+    """全角 / 半角统一，公式定界符统一为 $，公式内 LaTeX 命令统一写法，合并空白"""
+    text = unicodedata.normalize("NFKC", text or "")
+    text = _MATH_RE.sub(lambda m: "$" + _normalize_math(next(g for g in m.groups() if g is not None)) + "$", text)
+    return " ".join(text.split())
+
+
+def _digest(value) -> str:
+    return hashlib.sha1(json.dumps(value, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def _canonical_order(graph: MindMapGraph) -> Tuple[List[str], Dict[str, List[str]]]:
+    """规范形式中的节点顺序与规范化后的节点内容 [content, type]，见 canonicalize_mindmap"""
+    contents = {
+        node_id: [normalize_text(node.get("node_content")), node.get("node_type") or ""]
+        for node_id, node in graph.nodes.items()
+    }
+    outgoing: Dict[str, List[Tuple[str, str]]] = {node_id: [] for node_id in graph.nodes}
+    incoming: Dict[str, List[Tuple[str, str]]] = {node_id: [] for node_id in graph.nodes}
+    for edge in graph.edges:
+        source, target = str(edge["source"]), str(edge["target"])
+        edge_text = normalize_text(edge.get("edge_content"))
+        outgoing[source].append((edge_text, target))
+        incoming[target].append((edge_text, source))
+
+    labels = {node_id: _digest(content) for node_id, content in contents.items()}
+    for _ in range(_LABEL_ROUNDS):
+        labels = {
+            node_id: _digest([
+                labels[node_id],
+                sorted([text, labels[n]] for text, n in outgoing[node_id]),
+                sorted([text, labels[n]] for text, n in incoming[node_id]),
+            ])
+            for node_id in graph.nodes
+        }
+
+    # 按标签排好节点与边后再分层，使回边（环）的选取也与原编号无关
+    ordered = MindMapGraph({
+        "nodes": sorted(graph.nodes.values(), key=lambda n: labels[str(n["node_id"])]),
+        "edges": sorted(graph.edges, key=lambda e: (labels[str(e["source"])], labels[str(e["target"])])),
+    })
+    layer = ordered.layers()
+    node_order = sorted(graph.nodes, key=lambda node_id: (layer[node_id], labels[node_id]))
+    return node_order, contents
+
+
+def canonical_node_ids(mindmap: Optional[dict]) -> Dict[str, str]:
+    """原节点 ID -> 规范形式中的节点 ID（N1..Nn），与 canonicalize_mindmap 的编号一致"""
+    graph = mindmap if isinstance(mindmap, MindMapGraph) else MindMapGraph(mindmap)
+    node_order, _ = _canonical_order(graph)
+    return {node_id: f"N{i}" for i, node_id in enumerate(node_order, 1)}
+
+
+def canonicalize_mindmap(mindmap: Optional[dict]) -> dict:
+    """
+    返回导图的规范形式：内容规范化，去掉重复节点与悬空边，
+    节点按（层次, 结构标签）排序后重新编号为 N1..Nn，边按端点序号排序后编号为 E1..Em。
+    结构标签由节点内容与邻居标签迭代求哈希得到（Weisfeiler-Lehman），与原编号无关
+    """
+    graph = mindmap if isinstance(mindmap, MindMapGraph) else MindMapGraph(mindmap)
+    node_order, contents = _canonical_order(graph)
+    index = {node_id: i for i, node_id in enumerate(node_order, 1)}
+    edges = sorted(
+        (index[str(e["source"])], index[str(e["target"])], normalize_text(e.get("edge_content")))
+        for e in graph.edges
+    )
+    return {
+        "nodes": [
+            {"node_id": f"N{index[node_id]}", "node_content": contents[node_id][0], "node_type": contents[node_id][1]}
+            for node_id in node_order
+        ],
+        "edges": [
+            {"edge_id": f"E{i}", "source": f"N{source}", "target": f"N{target}", "edge_content": text}
+            for i, (source, target, text) in enumerate(edges, 1)
+        ],
+    }
+
+
+def mindmap_hash(mindmap: Optional[dict]) -> str:
+    """导图规范形式的哈希：编号、顺序、空白与 LaTeX 写法的差异不影响结果"""
+    return hashlib.sha256(
+        json.dumps(canonicalize_mindmap(mindmap), ensure_ascii=False, sort_keys=True).encode("utf-8")
+    ).hexdigest()
@@ -1,22 +1,21 @@
 import json
 from pathlib import Path
-from typing import List, Optional, Union
-from handyllm import OpenAIClient, CacheManager
+from typing import Optional, Set, Union
+from handyllm import CacheManager
 from handyllm.types import PathType
 from app.models import MessageResponse, PrivacyAnalysisResponse
 from app.core.manager.user_manager import UserManager
-from app.core.config import settings
 from app.core.fastapi_socketio import SocketIOServer
 from app.core.agent.agent_realtime import AgentRealtime
+from app.core.shared import llm_clients
 from app.core.manager.msg_manager import MessageManager
 from app.core.manager.suggestion_manager import SuggestionManager
 
 
 class PrivacyAgent:
     def __init__(self, root_dir: PathType, chat_id: int):
-        self.client = OpenAIClient(
-            "async", endpoints=[model.model_dump() for model in settings.endpoints]
-        )
+        # 共用进程内的客户端与连接池，不再为每个对话各建一个
+        self.client = llm_clients.get()
 
         self.cm = CacheManager(
             base_dir=Path(root_dir) / str(chat_id) / "cache", only_dump=False
@@ -26,10 +25,18 @@ class PrivacyAgent:
             client=self.client, base_dir=Path(root_dir) / str(chat_id) / "prompts"
         )
         self.base_dir = root_dir  # Add base_dir attribute
-        self.processing_msg_ids: List[int] = []  # 正在处理的 msg_id 列表
-        self.processing_response_msg_ids: List[int] = (
-            []
-        )  # 正在处理的 response msg_id 列表
+        self.processing_msg_ids: Set[int] = set()  # 正在处理的 msg_id
+        self.processing_response_msg_ids: Set[int] = set()  # 正在处理的 response msg_id
+
+    @property
+    def busy(self) -> bool:
+        """是否有正在处理的消息（ChatManager 淘汰时跳过忙碌的 agent）"""
+        return bool(self.processing_msg_ids or self.processing_response_msg_ids)
+
+    def close(self):
+        """被 ChatManager 淘汰时调用：释放对缓存与 agent 的引用（客户端为进程共享，不在这里关闭）"""
+        self.cm = None
+        self.agent = None
 
     async def generate_response(
         self,
@@ -43,12 +50,14 @@ class PrivacyAgent:
             raise RuntimeError(
                 f"Response for Message ID {user_msg_id} is already being processed."
             )
-        self.processing_response_msg_ids.append(user_msg_id)
-        response = await self.cm.cache(
-            self.agent.response,
-            f"response_{user_msg_id}",
-        )(user_input=user_input, user_msg_id=user_msg_id)
-        self.processing_response_msg_ids.remove(user_msg_id)
+        self.processing_response_msg_ids.add(user_msg_id)
+        try:
+            response = await self.cm.cache(
+                self.agent.response,
+                f"response_{user_msg_id}",
+            )(user_input=user_input, user_msg_id=user_msg_id)
+        finally:
+            self.processing_response_msg_ids.discard(user_msg_id)
 
         # 保存 agent 回复到数据库
         new_message_id = message_manager.newAgentMessage(user_msg_id, response)
@@ -83,12 +92,14 @@ class PrivacyAgent:
     ) -> list:
         if msg_id in self.processing_msg_ids:
             raise RuntimeError(f"Message ID {msg_id} is already being processed.")
-        self.processing_msg_ids.append(msg_id)
-        analysis = await self.cm.cache(
-            self.agent.analysis,
-            f"analysis_{msg_id}",
-        )(input_text=input_text, msg_id=msg_id)
-        self.processing_msg_ids.remove(msg_id)
+        self.processing_msg_ids.add(msg_id)
+        try:
+            analysis = await self.cm.cache(
+                self.agent.analysis,
+                f"analysis_{msg_id}",
+            )(input_text=input_text, msg_id=msg_id)
+        finally:
+            self.processing_msg_ids.discard(msg_id)
 
         # 保存隐私分析结果到数据库
         for suggestion in analysis:
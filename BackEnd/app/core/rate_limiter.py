@@ -0,0 +1,104 @@
+# app/core/rate_limiter.py
+# 按用户、按接口的令牌桶限流，用于保护 AI 接口的模型额度
+import logging
+import time
+from typing import Dict, Optional, Tuple
+
+from app.core.config import RateLimitConfig, RateLimitRule
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBucketBackend:
+    """单进程内存令牌桶"""
+
+    def __init__(self) -> None:
+        # key -> (剩余令牌数, 上次更新时间)
+        self.buckets: Dict[str, Tuple[float, float]] = {}
+
+    async def acquire(self, key: str, rule: RateLimitRule, cost: float = 1) -> Tuple[bool, float]:
+        """尝试取走 cost 个令牌，返回 (是否允许, 建议重试等待秒数)"""
+        now = time.monotonic()
+        tokens, last = self.buckets.get(key, (rule.capacity, now))
+        tokens = min(rule.capacity, tokens + (now - last) * rule.refill_per_second)
+        if tokens >= cost:
+            self.buckets[key] = (tokens - cost, now)
+            return True, 0.0
+        self.buckets[key] = (tokens, now)
+        return False, (cost - tokens) / rule.refill_per_second
+
+
+class RedisBucketBackend:
+    """基于 Redis 的共享令牌桶，供多进程 / 多实例部署使用"""
+
+    # 原子地补充并扣减令牌
+    SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local data = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(data[1]) or capacity
+local ts = tonumber(data[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry_after)}
+"""
+
+    def __init__(self, redis_url: str, prefix: str = "combolink:ratelimit:") -> None:
+        # 可选依赖，仅在启用 redis 后端时导入
+        import redis.asyncio as redis_asyncio
+        self.redis = redis_asyncio.from_url(redis_url)
+        self.script = self.redis.register_script(self.SCRIPT)
+        self.prefix = prefix
+
+    async def acquire(self, key: str, rule: RateLimitRule, cost: float = 1) -> Tuple[bool, float]:
+        allowed, retry_after = await self.script(
+            keys=[self.prefix + key],
+            args=[rule.capacity, rule.refill_per_second, time.time(), cost],
+        )
+        return bool(int(allowed)), float(retry_after)
+
+
+class RateLimiter:
+    def __init__(self, config: RateLimitConfig) -> None:
+        self.config = config
+        if config.backend == "redis":
+            if not config.redis_url:
+                raise ValueError("rate_limit.redis_url is required when backend is redis")
+            self.backend = RedisBucketBackend(config.redis_url)
+        else:
+            self.backend = MemoryBucketBackend()
+
+    async def acquire(self, endpoint: str, user_id: int) -> Tuple[bool, float]:
+        """
+        检查 user_id 对 endpoint 的调用是否在限额内。
+        未配置规则的接口不限流。返回 (是否允许, 建议重试等待秒数)
+        """
+        rule: Optional[RateLimitRule] = self.config.rules.get(endpoint)
+        if not self.config.enabled or rule is None:
+            return True, 0.0
+        try:
+            allowed, retry_after = await self.backend.acquire(f"{endpoint}:{user_id}", rule)
+        except Exception as e:
+            # 共享后端不可用时放行，避免限流器本身导致服务不可用
+            logger.error(f"Rate limiter backend error: {e}")
+            metrics.inc("ratelimit_backend_errors_total", {"endpoint": endpoint},
+                        description="限流后端异常次数")
+            return True, 0.0
+        return allowed, retry_after
+
+    def record(self, endpoint: str, decision: str):
+        """记录限流决策：allowed / coalesced / rejected"""
+        metrics.inc("ratelimit_decisions_total", {"endpoint": endpoint, "decision": decision},
+                    description="AI 接口限流决策次数")
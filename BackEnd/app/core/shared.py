@@ -1,14 +1,52 @@
 # app/core/shared.py
 
 # 1. 直接导入 database.py 中已经创建好的全局 engine
-from app.database import engine 
+from app.database import engine, MINHASH_INDEX_FILE
+from app.core.config import settings
 
 # 2. 导入 Managers
 from app.core.manager.user_manager import UserManager
 from app.core.manager.problem_manager import ProblemManager
 from app.core.manager.solution_manager import SolutionManager
+from app.core.manager.job_manager import JobManager
+from app.core.manager.suggestion_cache_manager import SuggestionCacheManager
+from app.core.manager.speculation_manager import SpeculationManager
+from app.core.agent.agent_realtime import AgentRealtime
+from app.core.agent.routing import ModelRouter
+from app.core.rate_limiter import RateLimiter
+from app.core.idempotency import IdempotencyStore
+from app.core.mindmap_graph import MindMapLayoutCache
+from app.core.debug_artifacts import DebugArtifactStore
+from app.core.llm_clients import LLMClientRegistry
 
 # 使用同一个 engine 实例
 user_manager = UserManager(engine)
-problem_manager = ProblemManager(engine)
-solution_manager = SolutionManager(engine)
\ No newline at end of file
+problem_manager = ProblemManager(engine, index_path=MINHASH_INDEX_FILE)
+solution_manager = SolutionManager(engine)
+job_manager = JobManager()
+suggestion_cache_manager = SuggestionCacheManager(engine, max_entries=settings.suggestion.cache_max_entries)
+speculation_manager = SpeculationManager(ttl_seconds=settings.speculation.ttl_seconds)
+rate_limiter = RateLimiter(settings.rate_limit)
+idempotency_store = IdempotencyStore(
+    max_entries=settings.idempotency.max_entries,
+    ttl_seconds=settings.idempotency.ttl_seconds
+)
+mindmap_layout = MindMapLayoutCache(
+    max_entries=settings.mindmap_layout.cache_size,
+    node_width=settings.mindmap_layout.node_width,
+    node_height=settings.mindmap_layout.node_height,
+    rank_sep=settings.mindmap_layout.rank_sep,
+    node_sep=settings.mindmap_layout.node_sep
+)
+
+# 3. 全局 AI Agent（HTTP 接口与 Socket.IO 事件共用）
+# 所有模型调用共用同一个客户端与连接池
+llm_clients = LLMClientRegistry(settings.llm_client, settings.endpoints)
+client = llm_clients.get()
+debug_artifacts = DebugArtifactStore.from_config(settings.debug_artifacts)
+global_agent = AgentRealtime(
+    client,
+    base_dir=settings.debug_artifacts.dir,
+    router=ModelRouter(settings.routing, settings.endpoints),
+    artifacts=debug_artifacts
+)
@@ -0,0 +1,105 @@
+# app/core/text_diff.py
+# 解答文本的增量比较：找出相对上次生成导图时的文本新增 / 修改 / 删除的部分，
+# 增量更新导图时只把这部分（带少量上下文）交给模型
+import difflib
+import re
+from typing import List
+
+# 按行与中文句末标点切分，每个片段保留结尾的分隔符，拼接后与原文一致
+_SEGMENT_RE = re.compile(r"[^\n。！？；]*[\n。！？；]|[^\n。！？；]+$")
+
+
+def split_segments(text: str) -> List[str]:
+    segments: List[str] = []
+    for segment in _SEGMENT_RE.findall(text or ""):
+        # 只有空白的片段（如句号后的换行）并入前一个片段
+        if segments and not segment.strip():
+            segments[-1] += segment
+        else:
+            segments.append(segment)
+    return segments
+
+
+def at_segment_boundary(text: str) -> bool:
+    """文本是否停在句子或公式结束处（末尾为句末标点、换行或闭合的 $）"""
+    stripped = (text or "").rstrip(" \t")
+    if not stripped.strip():
+        return False
+    if stripped[-1] in "\n。！？；.!?":
+        return True
+    return stripped.endswith("$") and stripped.count("$") % 2 == 0
+
+
+class SolutionDiff:
+    """
+    kind:
+        none   - 除空白外没有变化
+        append - 只在末尾追加了内容
+        edit   - 中间有插入、修改或删除
+    """
+
+    def __init__(self, kind: str, changed: str = "", deleted: str = "",
+                 context_before: str = "", context_after: str = "", total_chars: int = 0) -> None:
+        self.kind = kind
+        self.changed = changed
+        self.deleted = deleted
+        self.context_before = context_before
+        self.context_after = context_after
+        self.total_chars = total_chars
+
+    @property
+    def changed_ratio(self) -> float:
+        """变化的字符数占新文本的比例"""
+        return (len(self.changed) + len(self.deleted)) / max(self.total_chars, 1)
+
+    def to_prompt_input(self) -> str:
+        """作为增量更新提示词中“学生最新输入”的文本"""
+        parts = []
+        if self.context_before.strip():
+            parts.append("……（此前的内容已体现在现有思维导图中）\n" + self.context_before.strip())
+        if self.changed.strip():
+            label = "新增的内容" if self.kind == "append" else "新增 / 修改后的内容"
+            parts.append(f"【{label}】\n" + self.changed.strip())
+        if self.deleted.strip():
+            parts.append("【学生删去了以下内容，相关节点应一并删去】\n" + self.deleted.strip())
+        if self.context_after.strip():
+            parts.append("【之后未改动的内容】\n" + self.context_after.strip() + "\n……")
+        return "\n\n".join(parts)
+
+
+def diff_solution(old_text: str, new_text: str, context_segments: int = 2) -> SolutionDiff:
+    """以句子 / 行为单位比较两版解答"""
+    old_segments = split_segments(old_text)
+    new_segments = split_segments(new_text)
+    matcher = difflib.SequenceMatcher(
+        None, [s.strip() for s in old_segments], [s.strip() for s in new_segments], autojunk=False
+    )
+    opcodes = [op for op in matcher.get_opcodes() if op[0] != "equal"]
+    # 只有空白片段的增删不算变化
+    opcodes = [
+        op for op in opcodes
+        if "".join(old_segments[op[1]:op[2]]).strip() or "".join(new_segments[op[3]:op[4]]).strip()
+    ]
+    if not opcodes:
+        return SolutionDiff("none", total_chars=len(new_text))
+
+    first = min(op[3] for op in opcodes)
+    last = max(op[4] for op in opcodes)
+    deleted = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        old_chunk = "".join(old_segments[i1:i2])
+        # 把末尾未写完的句子补完（新内容以旧内容开头）不算删除
+        if tag == "replace" and "".join(new_segments[j1:j2]).strip().startswith(old_chunk.strip()):
+            continue
+        if tag in ("replace", "delete"):
+            deleted.append(old_chunk)
+    tag, i1, i2, _, _ = opcodes[0]
+    append = len(opcodes) == 1 and not deleted and tag in ("insert", "replace") and i2 == len(old_segments)
+    return SolutionDiff(
+        "append" if append else "edit",
+        changed="".join(new_segments[first:last]),
+        deleted="".join(deleted),
+        context_before="".join(new_segments[max(0, first - context_segments):first]),
+        context_after="".join(new_segments[last:last + context_segments]),
+        total_chars=len(new_text),
+    )
@@ -1,7 +1,7 @@
 from sqlmodel import SQLModel, create_engine, Session, Field
 from pathlib import Path
-from sqlalchemy import Column, JSON, Text
-from typing import Optional, Dict, Any
+from sqlalchemy import Column, JSON, Text, inspect, text
+from typing import Optional, Dict, Any, List
 import pytz
 from datetime import datetime
 
@@ -15,10 +15,15 @@ PROJECT_ROOT = CURRENT_FILE.parent.parent
 # 3. 拼接数据库文件的绝对路径 (BackEnd/math_tutor.db)
 SQLITE_FILE = PROJECT_ROOT / "math_tutor.db"
 DATABASE_URL = f"sqlite:///{SQLITE_FILE}"
+# 近似重复题目索引（MinHash/LSH），与数据库文件放在一起，由导入脚本构建
+MINHASH_INDEX_FILE = PROJECT_ROOT / "math_tutor.minhash.json"
 
 # 打印一下路径，方便调试确认
 print(f"--> 连接数据库: {SQLITE_FILE}")
 
+# 表结构版本：修改任意表结构时递增，init_backend.py 据此判断是否需要重新建表
+SCHEMA_VERSION = 4
+
 # 创建全局引擎
 engine = create_engine(DATABASE_URL, echo=False, connect_args={"check_same_thread": False})
 
@@ -48,6 +53,8 @@ class Problem(SQLModel, table=True):
     problem_content: str = Field(sa_column=Column(Text)) 
     problem_solution: str = Field(sa_column=Column(Text)) 
     problem_mindmap: Dict[str, Any] = Field(default={}, sa_column=Column(JSON)) 
+    # 标准导图各节点的提示（node_id -> 提示），导入时离线生成，用于即时给出第一阶段建议
+    problem_hints: Optional[Dict[str, str]] = Field(default=None, sa_column=Column(JSON))
     
     created_at: datetime = Field(default_factory=get_current_datetime)
 
@@ -60,13 +67,50 @@ class UserSolution(SQLModel, table=True):
     
     current_solution: str = Field(default="", sa_column=Column(Text))
     new_mindmap: Dict[str, Any] = Field(default={}, sa_column=Column(JSON))
+    # 生成 new_mindmap 时所依据的解答文本，增量更新时据此计算文本差异
+    mindmap_source: Optional[str] = Field(default=None, sa_column=Column(Text))
     suggestion_summary: Optional[str] = Field(default=None, sa_column=Column(Text))
     
     updated_at: datetime = Field(default_factory=get_current_datetime)
 
+# SuggestionCache 类：解题建议缓存，键由用户导图、解答文本与标准导图共同决定（见 SuggestionCacheManager）
+class SuggestionCache(SQLModel, table=True):
+    cache_key: str = Field(primary_key=True)
+    problem_id: int = Field(foreign_key="problem.problem_id", index=True)
+
+    suggestion: Dict[str, Any] = Field(default={}, sa_column=Column(JSON))
+    suggestion_summary: str = Field(default="", sa_column=Column(Text))
+    hits: int = Field(default=0)
+
+    created_at: datetime = Field(default_factory=get_current_datetime)
+    last_used_at: datetime = Field(default_factory=get_current_datetime, index=True)
+
 # 3. 辅助函数
-def create_db_and_tables():
-    SQLModel.metadata.create_all(engine)
+def migrate_db(db_engine=engine) -> List[str]:
+    """
+    为已有的表补上新增的列（create_all 只建新表，不会修改已存在的表）。
+    只适用于可为空的新列；返回新增的列名
+    """
+    inspector = inspect(db_engine)
+    added = []
+    with db_engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                column_type = column.type.compile(dialect=db_engine.dialect)
+                conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'))
+                added.append(f"{table.name}.{column.name}")
+    return added
+
+def create_db_and_tables(db_engine=engine):
+    SQLModel.metadata.create_all(db_engine)
+    added = migrate_db(db_engine)
+    if added:
+        print(f"--> 已为现有表补充新列: {', '.join(added)}")
 
 def get_session():
     with Session(engine) as session:
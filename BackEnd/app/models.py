@@ -1,4 +1,4 @@
-from typing import List, Optional, Union, Dict, Any
+from typing import List, Literal, Optional, Union, Dict, Any
 from pydantic import BaseModel, Field
 
 class RegisterRequest(BaseModel):
@@ -25,6 +25,11 @@ class MindMapData(BaseModel):
     nodes: List[MindMapNode] = []
     edges: List[MindMapEdge] = []
 
+class MindMapPosition(BaseModel):
+    """服务端布局给出的节点左上角坐标（从左到右分层）"""
+    x: float
+    y: float
+
 # ==========================================
 # 2. HTTP API 请求与响应模型
 # ==========================================
@@ -53,6 +58,19 @@ class ProblemDetailResponse(BaseModel):
     problem_solution: str
     problem_mindmap: MindMapData
 
+# --- [POST] /api/similarProblems ---
+
+class SimilarProblemsRequest(BaseModel):
+    problem_id: int
+    top_k: int = Field(default=5, ge=1, le=20, description="最多返回的题目数")
+
+class SimilarProblem(ProblemSummary):
+    similarity: float = Field(..., description="估计的内容相似度 (MinHash Jaccard)，0-1")
+
+class SimilarProblemsResponse(BaseModel):
+    code: int = Field(default=0)
+    problems: List[SimilarProblem]
+
 # --- [POST] /api/startSolution ---
 
 class StartSolutionRequest(BaseModel):
@@ -71,22 +89,28 @@ class UpdateMindmapRequest(BaseModel):
     problem_id: int
     mindmap_id: int = Field(..., description="全局唯一做题过程 ID")
     current_solution: str = Field(..., description="用户最新的解答内容")
+    idempotency_key: Optional[str] = Field(None, description="幂等键，HTTP 请求也可使用 Idempotency-Key 请求头")
+    with_suggestion: bool = Field(default=False, description="是否在同一次模型调用中一并生成解题建议（随后推送 sendAnalysisMap 与 sendAnalysisSuggestion）")
     
 class UpdateMindmapResponse(BaseModel):
     code: int = Field(default=0, description="0表示后端已收到请求，开始异步更新思维导图")
+    job_id: Optional[str] = Field(None, description="后台任务 ID")
     # 后端直接根据最新版本的思维导图进行分析，无需返回新的导图数据
 
 class QueryAnalysisRequest(BaseModel):
     problem_id: int
     mindmap_id: int = Field(..., description="全局唯一做题过程 ID")
+    idempotency_key: Optional[str] = Field(None, description="幂等键，HTTP 请求也可使用 Idempotency-Key 请求头")
 
 class QueryAnalysisResponse(BaseModel):
     code: int = Field(default=0, description="0表示后端已收到请求，开始异步生成建议")
+    job_id: Optional[str] = Field(None, description="后台任务 ID")
 
 # --- [POST] /api/refresh ---
 
 class RefreshRequest(BaseModel):
     mindmap_id: int = Field(..., description="当前解题的ID")
+    include_positions: bool = Field(default=False, description="是否附带服务端计算的节点坐标")
 
 class RefreshResponse(BaseModel):
     code: int = Field(default=0)
@@ -95,20 +119,38 @@ class RefreshResponse(BaseModel):
     problem_content: str = Field(..., description="problem_id 对应的题目内容")
     current_solution: str = Field(default="", description="用户已经完成的markdown格式的解答")
     current_mindmap: MindMapData = Field(default_factory=MindMapData, description="当前思维导图")
+    positions: Optional[Dict[str, MindMapPosition]] = Field(None, description="node_id -> 节点坐标，仅在请求时附带")
 
 # ==========================================
 # 3. SocketIO 事件推送模型
 # ==========================================
 
+# 客户端 -> 服务端事件 "updateMindmap" / "queryAnalysis"
+# 请求体分别与 UpdateMindmapRequest / QueryAnalysisRequest 相同，ack 为 SocketAckResponse
+class SocketAckResponse(BaseModel):
+    code: int = Field(default=0, description="0 表示已受理，否则为对应的 HTTP 状态码")
+    job_id: Optional[str] = Field(None, description="后台任务 ID")
+    message: Optional[str] = Field(None, description="错误信息")
+    retry_after: Optional[float] = Field(None, description="被限流时建议等待的秒数")
+
+# 客户端 -> 服务端事件 "draftSnapshot"：编辑中的草稿，服务端空闲时据此预生成导图（需开启 speculation）
+# ack 为 SocketAckResponse，message 为处理结果（started / not_boundary / busy 等）
+class DraftSnapshotRequest(BaseModel):
+    problem_id: int
+    mindmap_id: int = Field(..., description="全局唯一做题过程 ID")
+    current_solution: str = Field(..., description="编辑中的解答草稿")
+
 # 事件名: "sendAnalysisMap"
 class SocketAnalysisMapResponse(BaseModel):
     problem_id: int
     mindmap_id: int
     new_mindmap: MindMapData
+    positions: Optional[Dict[str, MindMapPosition]] = Field(None, description="node_id -> 节点坐标，服务端开启布局推送时附带")
 
 # 事件名: "sendAnalysisSuggestion"
 class SocketAnalysisSuggestionResponse(BaseModel):
     problem_id: int
     mindmap_id: int
     suggestion: MindMapData = Field(..., description="仅包含不在 mindmap 里的推荐思考方向")
-    suggestion_summary: str = Field(..., description="Markdown 格式的建议总结")
\ No newline at end of file
+    suggestion_summary: str = Field(..., description="Markdown 格式的建议总结")
+    phase: Literal["heuristic", "final"] = Field("final", description="heuristic 为即时的启发式建议，随后由 final 覆盖")
\ No newline at end of file
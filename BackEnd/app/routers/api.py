@@ -1,6 +1,8 @@
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Response
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Response
+from fastapi.responses import PlainTextResponse
 from fastapi.security import OAuth2PasswordRequestForm
 import asyncio
+from typing import Optional
 
 # 1. 导入数据模型 (Pydantic)
 from app.models import (
@@ -15,25 +17,17 @@ from app.models import (
 from app.database import User
 
 # 3. 导入 Managers (从 shared 中获取单例)
-from app.core.shared import user_manager, problem_manager, solution_manager
+from app.core.shared import user_manager, problem_manager, solution_manager, mindmap_layout
 
 # 4. 导入其他依赖
 from app.core.auth import encode_token  
-from app.routers.deps import userDeps, ACCESS_TOKEN_EXPIRE, sioDeps
+from app.routers.deps import userDeps, metricsDeps, ACCESS_TOKEN_EXPIRE, sioDeps
 from app.core.fastapi_socketio import SocketIOServer
 
-from pathlib import Path
-from app.core.config import settings
-from handyllm import OpenAIClient
-from app.core.agent.agent_realtime import AgentRealtime
-from app.services.tasks import update_mindmap_pipeline, run_analysis_pipeline
+from app.services.dispatch import DispatchError, start_update_mindmap, start_query_analysis
+from app.core.metrics import metrics
 
 api_router = APIRouter()
-client = OpenAIClient(
-    "async", 
-    endpoints=[model.model_dump() for model in settings.endpoints]
-)
-global_agent = AgentRealtime(client, base_dir=Path("logs/debug_prompts"))
 
 
 # ==========================================
@@ -44,6 +38,11 @@ global_agent = AgentRealtime(client, base_dir=Path("logs/debug_prompts"))
 async def get_data():
     return {"message": "This is data from the FastAPI backend"}
 
+@api_router.get("/api/metrics", response_class=PlainTextResponse, dependencies=[metricsDeps])
+async def get_metrics():
+    """导出运行指标（Prometheus 文本格式）；需在配置 metrics 中启用，见 check_metrics_access"""
+    return metrics.render_prometheus()
+
 # --- 登录注册模块 (使用 UserManager) ---
 
 @api_router.post("/token")
@@ -122,6 +121,28 @@ async def get_problem_detail(request: ProblemDetailRequest, user: User = userDep
         "problem_mindmap": problem.problem_mindmap
     }
 
+# [POST] /api/similarProblems
+from app.models import SimilarProblemsRequest, SimilarProblemsResponse, SimilarProblem
+
+@api_router.post("/api/similarProblems", response_model=SimilarProblemsResponse)
+async def get_similar_problems(request: SimilarProblemsRequest, user: User = userDeps):
+    """返回与指定题目内容最相近的题目（近似重复检测，基于 MinHash/LSH 索引）"""
+    if not problem_manager.get_problem_by_id(request.problem_id):
+        raise HTTPException(status_code=404, detail="Problem not found")
+
+    matches = problem_manager.find_similar_problems(request.problem_id, top_k=request.top_k)
+    p_list = [
+        SimilarProblem(
+            problem_id=p.problem_id,
+            chapter_id=p.chapter_id,
+            chapter_name=p.chapter_name,
+            difficulty=p.difficulty,
+            problem_content=p.problem_content,
+            similarity=round(score, 3)
+        ) for p, score in matches
+    ]
+    return {"code": 0, "problems": p_list}
+
 # [POST] /api/startSolution
 @api_router.post("/api/startSolution", response_model=StartSolutionResponse)
 async def start_solution(request: StartSolutionRequest, user: User = userDeps):
@@ -145,56 +166,41 @@ async def start_solution(request: StartSolutionRequest, user: User = userDeps):
 @api_router.post("/api/updateMindmap", response_model=UpdateMindmapResponse)
 async def update_mind_map(
     request: UpdateMindmapRequest,
-    background_tasks: BackgroundTasks,
     sio: SocketIOServer = sioDeps,
-    user: User = userDeps
+    user: User = userDeps,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key")
 ):
-    # 1. 更新解答 (SolutionManager)
-    solution = solution_manager.update_solution_text(
-        request.mindmap_id, 
-        request.current_solution
-    )
-    
-    if not solution:
-        raise HTTPException(status_code=404, detail="Solution record not found")
-    
-    # 2. 触发后台任务
-    background_tasks.add_task(
-        update_mindmap_pipeline,
-        # 参数传递：
-        solution_id=solution.solution_id,
-        user_input_text=request.current_solution,
-        sio=sio,
-        agent=global_agent,
-        solution_manager=solution_manager,
-        problem_manager=problem_manager,
-        user_manager=user_manager
-    )
+    # 保存解答并触发后台任务（与 Socket.IO 事件 updateMindmap 共用逻辑）
+    try:
+        job_id = await start_update_mindmap(
+            user.user_id, request.mindmap_id, request.current_solution, sio,
+            idempotency_key=idempotency_key or request.idempotency_key,
+            with_suggestion=request.with_suggestion
+        )
+    except DispatchError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers)
     
-    return {"code": 0}
+    return {"code": 0, "job_id": job_id}
 
 # [POST] /api/queryAnalysis
 @api_router.post("/api/queryAnalysis", response_model=QueryAnalysisResponse)
 async def query_analysis(
     request: QueryAnalysisRequest,
-    background_tasks: BackgroundTasks,
     sio: SocketIOServer = sioDeps,
-    user: User = userDeps
+    user: User = userDeps,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key")
 ):
+    # 触发后台任务（与 Socket.IO 事件 queryAnalysis 共用逻辑）
+    # mindmap_id 即 solution_id
+    try:
+        job_id = await start_query_analysis(
+            user.user_id, request.mindmap_id, sio,
+            idempotency_key=idempotency_key or request.idempotency_key
+        )
+    except DispatchError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=e.headers)
     
-    # 触发后台任务
-    background_tasks.add_task(
-        run_analysis_pipeline,
-        # 参数传递：
-        solution_id=request.mindmap_id, # mindmap_id 即 solution_id
-        sio=sio,
-        agent=global_agent,
-        solution_manager=solution_manager,
-        problem_manager=problem_manager,
-        user_manager=user_manager
-    )
-    
-    return {"code": 0}
+    return {"code": 0, "job_id": job_id}
 
 # [POST] /api/refresh
 @api_router.post("/api/refresh", response_model=RefreshResponse)
@@ -215,11 +221,14 @@ async def refresh_solution(request: RefreshRequest, user: User = userDeps):
         raise HTTPException(status_code=404, detail="Problem not found")
     
     # 4. 返回当前进度
+    current_mindmap = solution.new_mindmap or {"nodes": [], "edges": []}
     return {
         "code": 0,
         "mindmap_id": solution.solution_id,
         "problem_id": solution.problem_id,
         "problem_content": problem.problem_content,
         "current_solution": solution.current_solution or "",
-        "current_mindmap": solution.new_mindmap or {"nodes": [], "edges": []}
+        "current_mindmap": current_mindmap,
+        # 坐标按导图结构缓存，前端可跳过本地布局
+        "positions": mindmap_layout.layout(current_mindmap) if request.include_positions else None
     }
\ No newline at end of file
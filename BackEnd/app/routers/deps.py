@@ -1,8 +1,10 @@
+import secrets
 from datetime import datetime, timedelta
-from fastapi import Body, Depends, HTTPException, Request, status, Cookie
+from fastapi import Body, Depends, Header, HTTPException, Request, status, Cookie
 from fastapi.security import OAuth2PasswordBearer
 from typing import Optional
 
+from app.core.config import settings
 from app.core.shared import user_manager
 from app.database import User
 from app.core.fastapi_socketio import SocketIOServer
@@ -39,6 +41,26 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 
 userDeps = Depends(get_user_from_cookie)
 
+async def check_metrics_access(
+    authorization: Optional[str] = Header(default=None),
+    mytoken: Optional[str] = Cookie(default=None),
+):
+    """/api/metrics：未启用时返回 404；配置了 token 时校验 Bearer token，否则要求登录"""
+    if not settings.metrics.enabled:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if settings.metrics.token:
+        scheme, _, token = (authorization or "").partition(" ")
+        if scheme.lower() != "bearer" or not secrets.compare_digest(token, settings.metrics.token):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid metrics token",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+        return
+    await get_user_from_cookie(mytoken)
+
+metricsDeps = Depends(check_metrics_access)
+
 async def get_sio(request: Request) -> SocketIOServer:
     sio = request.app.state.sio
     if sio is None:
@@ -2,10 +2,15 @@ import asyncio
 import logging
 from datetime import datetime
 
+from pydantic import ValidationError
+
 from app.core.socketio_router import SocketIORouter
+from app.core.config import settings
 from app.core.shared import (
-    user_manager
+    user_manager, job_manager
 )
+from app.models import UpdateMindmapRequest, QueryAnalysisRequest, DraftSnapshotRequest, SocketAckResponse
+from app.services.dispatch import DispatchError, start_update_mindmap, start_query_analysis, start_speculation
 
 
 logger_sio = logging.getLogger("sio")
@@ -34,6 +39,8 @@ async def connect(sid: str, environ, auth):
         logger_sio.error(f"authentication failed: sid={sid} auth={auth}")
         raise ConnectionRefusedError('Socket.IO authentication failed')
     print(f"setSid sid={sid} userId={user.user_id} username={user.username}")
+    # 宽限期内重连，保留之前的任务
+    job_manager.abort_user_cancel(user.user_id)
     
     assert sio_router.sio is not None
     
@@ -42,5 +49,80 @@ async def disconnect(sid):
     logger_sio.info(f"disconnect {sid}")
     userId = user_manager.removeSid(sid)
     logger_sio.info(f"removeSid sid={sid} userId={userId}")
+    # 用户最后一个连接断开：宽限期后取消其仍在运行的 AI 任务
+    if userId is not None and settings.jobs.cancel_on_disconnect and not user_manager.getSid(userId):
+        job_manager.schedule_user_cancel(
+            int(userId),
+            settings.jobs.disconnect_grace_seconds,
+            should_cancel=lambda: not user_manager.getSid(userId)
+        )
+    
+  
+
+
+# ==========================================
+# 客户端请求事件（返回值即 ack）
+# 与 /api/updateMindmap、/api/queryAnalysis 等价，
+# 直接使用已认证连接的 sid 注册表识别用户，无需 cookie / JWT
+# ==========================================
+
+def _ack(code: int = 0, job_id=None, message=None, retry_after=None):
+    return SocketAckResponse(code=code, job_id=job_id, message=message, retry_after=retry_after).model_dump()
+
+@sio_router.on("updateMindmap")
+async def update_mindmap_event(sid, data):
+    userId = user_manager.getUserId(sid)
+    if userId is None:
+        return _ack(401, message="User not authenticated")
+    try:
+        request = UpdateMindmapRequest.model_validate(data)
+    except ValidationError as e:
+        return _ack(422, message=str(e))
+    
+    assert sio_router.sio is not None
+    try:
+        job_id = await start_update_mindmap(
+            userId, request.mindmap_id, request.current_solution, sio_router.sio,
+            idempotency_key=request.idempotency_key,
+            with_suggestion=request.with_suggestion
+        )
+    except DispatchError as e:
+        return _ack(e.status_code, message=e.detail, retry_after=e.retry_after)
+    return _ack(job_id=job_id)
+
+@sio_router.on("queryAnalysis")
+async def query_analysis_event(sid, data):
+    userId = user_manager.getUserId(sid)
+    if userId is None:
+        return _ack(401, message="User not authenticated")
+    try:
+        request = QueryAnalysisRequest.model_validate(data)
+    except ValidationError as e:
+        return _ack(422, message=str(e))
     
-  
\ No newline at end of file
+    assert sio_router.sio is not None
+    try:
+        job_id = await start_query_analysis(
+            userId, request.mindmap_id, sio_router.sio,
+            idempotency_key=request.idempotency_key
+        )
+    except DispatchError as e:
+        return _ack(e.status_code, message=e.detail, retry_after=e.retry_after)
+    return _ack(job_id=job_id)
+
+@sio_router.on("draftSnapshot")
+async def draft_snapshot_event(sid, data):
+    # 草稿只用于预生成，不保存解答，也不推送结果
+    userId = user_manager.getUserId(sid)
+    if userId is None:
+        return _ack(401, message="User not authenticated")
+    try:
+        request = DraftSnapshotRequest.model_validate(data)
+    except ValidationError as e:
+        return _ack(422, message=str(e))
+
+    try:
+        status = await start_speculation(userId, request.mindmap_id, request.current_solution)
+    except DispatchError as e:
+        return _ack(e.status_code, message=e.detail)
+    return _ack(message=status)
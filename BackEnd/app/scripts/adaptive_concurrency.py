@@ -0,0 +1,103 @@
+"""
+批量转换用的全局自适应并发控制与进度输出。
+
+AdaptiveLimiter 采用 AIMD 策略：请求成功时缓慢加大并发，
+遇到 429 / 超时则立即减半，从而贴近但不超过上游的速率限制。
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+
+def is_throttle_error(e: BaseException) -> bool:
+    """判断异常是否意味着上游过载（429 限流或超时）"""
+    if isinstance(e, (asyncio.TimeoutError, httpx.TimeoutException)):
+        return True
+    # handyllm 把 HTTP 错误包装为 "API error (<url> <status> <reason>) - <message>"
+    message = str(e)
+    return " 429 " in message or "rate limit" in message.lower() or "timed out" in message.lower()
+
+
+class AdaptiveLimiter:
+    def __init__(self, initial: int = 4, min_limit: int = 1, max_limit: int = 32, cooldown: float = 5.0):
+        self.limit = max(min_limit, min(initial, max_limit))
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        # 两次减半之间的最小间隔，避免同一波 429 把并发一路压到底
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.successes_since_change = 0
+        self.last_decrease = 0.0
+        self._cond = asyncio.Condition()
+
+    @asynccontextmanager
+    async def slot(self):
+        """占用一个并发名额，直到 with 块结束"""
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self.in_flight -= 1
+                self._cond.notify_all()
+
+    async def on_success(self):
+        """加性增：连续成功 limit 次后并发 +1"""
+        async with self._cond:
+            self.successes_since_change += 1
+            if self.successes_since_change >= self.limit and self.limit < self.max_limit:
+                self.limit += 1
+                self.successes_since_change = 0
+                logger.info(f"[concurrency] increase -> {self.limit}")
+                self._cond.notify_all()
+
+    async def on_throttle(self):
+        """乘性减：遇到限流 / 超时后并发减半"""
+        async with self._cond:
+            now = time.monotonic()
+            self.successes_since_change = 0
+            if now - self.last_decrease < self.cooldown:
+                return
+            self.last_decrease = now
+            new_limit = max(self.min_limit, self.limit // 2)
+            if new_limit != self.limit:
+                logger.warning(f"[concurrency] throttled, decrease {self.limit} -> {new_limit}")
+                self.limit = new_limit
+
+
+class ProgressReporter:
+    """输出进度、吞吐量与预计剩余时间"""
+
+    def __init__(self, limiter: Optional[AdaptiveLimiter] = None):
+        self.limiter = limiter
+        self.total = 0
+        self.done = 0
+        self.failed = 0
+        self.start_time = time.monotonic()
+
+    def add_total(self, n: int):
+        self.total += n
+
+    def update(self, ok: bool = True, label: str = ""):
+        self.done += 1
+        if not ok:
+            self.failed += 1
+        elapsed = time.monotonic() - self.start_time
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = self.total - self.done
+        eta = remaining / rate if rate > 0 else float("inf")
+        eta_str = time.strftime("%H:%M:%S", time.gmtime(eta)) if eta != float("inf") else "--:--:--"
+        concurrency = f" | concurrency {self.limiter.limit} (in flight {self.limiter.in_flight})" if self.limiter else ""
+        logger.info(
+            f"[progress] {self.done}/{self.total} ({self.done / max(self.total, 1):.0%}) "
+            f"failed {self.failed} | {rate * 60:.1f} problems/min | ETA {eta_str}{concurrency}"
+            + (f" | {label}" if label else "")
+        )
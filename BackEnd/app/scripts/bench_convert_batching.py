@@ -0,0 +1,75 @@
+"""
+基准测试：LaTeX 转换的单题请求与批量请求在 token 用量和耗时上的差异。
+
+对 app/constants/latex 下的章节（默认全部）分别以不同批量大小完整转换一次，
+不读写缓存，结果写入临时目录，不影响 json_output。
+注意：会真实调用模型，产生费用。
+
+用法:
+    python app/scripts/bench_convert_batching.py [--batch-sizes 1 4 8] [--files 1-排列组合.tex]
+"""
+import argparse
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# --- 解决模块导入路径问题 ---
+FILE_PATH = Path(__file__).resolve()
+ROOT_DIR = FILE_PATH.parent.parent.parent  # app/scripts/ -> app/ -> root
+sys.path.append(str(ROOT_DIR))
+
+from app.scripts.convert_latex import LATEX_ROOT, LatexProcessor
+
+
+async def run_once(batch_size: int, files, output_dir: Path, max_concurrency: int) -> dict:
+    processor = LatexProcessor(
+        use_cache=False, batch_size=batch_size, output_dir=output_dir, max_concurrency=max_concurrency
+    )
+    start = time.monotonic()
+    await asyncio.gather(*(processor.process_file(f) for f in files))
+    elapsed = time.monotonic() - start
+    await processor.aclose()
+    failed = sum(r["failed"] for r in processor.report.values())
+    total = sum(r["total"] for r in processor.report.values())
+    return {**processor.agent.usage, "fallbacks": processor.agent.fallbacks,
+            "elapsed": elapsed, "failed": failed, "total": total}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LaTeX 转换批量请求基准测试")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4], help="要比较的批量大小")
+    parser.add_argument("--files", nargs="*", help="只测试指定的 .tex 文件名（默认全部）")
+    parser.add_argument("--max-concurrency", type=int, default=32, help="并发请求数上限")
+    args = parser.parse_args()
+
+    files = args.files or sorted(f.name for f in LATEX_ROOT.glob("*.tex"))
+    print(f"章节: {', '.join(files)}\n")
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for batch_size in args.batch_sizes:
+            result = asyncio.run(run_once(batch_size, files, Path(tmp) / f"batch_{batch_size}", args.max_concurrency))
+            rows.append((batch_size, result))
+
+    header = f"{'batch':>6}{'requests':>10}{'prompt tok':>12}{'compl tok':>11}{'fallbacks':>11}{'failed':>8}{'time(s)':>9}"
+    print(header)
+    print("-" * len(header))
+    for batch_size, r in rows:
+        print(f"{batch_size:>6}{r['requests']:>10}{r['prompt_tokens']:>12}{r['completion_tokens']:>11}"
+              f"{r['fallbacks']:>11}{r['failed']:>8}{r['elapsed']:>9.1f}")
+
+    base_size, base = rows[0]
+    for batch_size, r in rows[1:]:
+        base_tokens = base["prompt_tokens"] + base["completion_tokens"]
+        tokens = r["prompt_tokens"] + r["completion_tokens"]
+        print(
+            f"\nbatch {batch_size} vs {base_size}: "
+            f"tokens {(1 - tokens / max(base_tokens, 1)):+.1%} saved, "
+            f"time {(1 - r['elapsed'] / max(base['elapsed'], 1e-9)):+.1%} saved"
+        )
+
+
+if __name__ == "__main__":
+    main()
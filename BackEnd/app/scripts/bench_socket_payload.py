@@ -0,0 +1,160 @@
+"""
+基准测试：思维导图 Socket.IO 推送的线上字节数与序列化耗时。
+
+数据来源为 app/constants/json_output 中的标准思维导图，每道题构造一条
+sendAnalysisMap 推送；另将每章所有导图合并为一张大图，模拟长解答的学生导图。
+
+用法:
+    python app/scripts/bench_socket_payload.py [--repeat 200] [--threshold 2048]
+"""
+import argparse
+import json
+import sys
+import time
+import zlib
+from pathlib import Path
+
+from socketio import packet
+
+# --- 解决模块导入路径问题 ---
+FILE_PATH = Path(__file__).resolve()
+ROOT_DIR = FILE_PATH.parent.parent.parent  # app/scripts/ -> app/ -> root
+sys.path.append(str(ROOT_DIR))
+
+from app.core.fastapi_socketio import Utf8Json
+
+JSON_DIR = ROOT_DIR / "app" / "constants" / "json_output"
+
+try:
+    from socketio import msgpack_packet
+except ImportError:  # 未安装 msgpack
+    msgpack_packet = None
+
+
+def load_payloads():
+    """返回 [(名称, sendAnalysisMap 负载)]"""
+    payloads = []
+    for json_file in sorted(JSON_DIR.glob("*.json")):
+        with open(json_file, "r", encoding="utf-8") as f:
+            problems = json.load(f)
+
+        merged = {"nodes": [], "edges": []}
+        for idx, item in enumerate(problems, 1):
+            mindmap = item.get("problem_mindmap") or {}
+            payloads.append((f"{json_file.stem}#{idx}", {
+                "problem_id": idx,
+                "mindmap_id": idx,
+                "new_mindmap": mindmap,
+            }))
+            # 合并时给 id 加前缀，避免冲突
+            for node in mindmap.get("nodes", []):
+                merged["nodes"].append({**node, "node_id": f"Q{idx}{node['node_id']}"})
+            for edge in mindmap.get("edges", []):
+                merged["edges"].append({
+                    **edge,
+                    "edge_id": f"Q{idx}{edge['edge_id']}",
+                    "source": f"Q{idx}{edge['source']}",
+                    "target": f"Q{idx}{edge['target']}",
+                })
+        payloads.append((f"{json_file.stem}#merged", {
+            "problem_id": 0,
+            "mindmap_id": 0,
+            "new_mindmap": merged,
+        }))
+    return payloads
+
+
+def deflate_size(data: bytes, level: int = 6) -> int:
+    """近似 permessage-deflate（raw deflate，无上下文复用）后的字节数"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return len(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+
+
+def encode_packet(packet_class, payload) -> bytes:
+    """按 Socket.IO 协议编码一条事件，返回线上字节（含二进制附件）"""
+    pkt = packet_class(packet.EVENT, data=["sendAnalysisMap", payload], namespace="/")
+    encoded = pkt.encode()
+    if isinstance(encoded, list):
+        # 文本协议下的二进制附件会拆成多个帧
+        return b"".join(e if isinstance(e, bytes) else e.encode("utf-8") for e in encoded)
+    return encoded if isinstance(encoded, bytes) else encoded.encode("utf-8")
+
+
+def time_encode(packet_class, transform, payload, repeat: int) -> float:
+    """平均单次编码耗时（微秒），包含压缩等预处理"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        encode_packet(packet_class, transform(payload))
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def compressed_payload(payload, threshold: int, level: int):
+    """与 SocketIOServer.pack_mindmap_payload 相同的压缩策略"""
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    if len(raw) < threshold:
+        return payload
+    return {"encoding": "zlib+json", "data": zlib.compress(raw, level)}
+
+
+class AsciiJsonPacket(packet.Packet):
+    # socketio 默认行为：中文被转义为 \uXXXX
+    json = json
+
+
+class Utf8JsonPacket(packet.Packet):
+    json = Utf8Json
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Socket.IO 思维导图推送负载基准测试")
+    parser.add_argument("--repeat", type=int, default=200, help="每种编码的计时重复次数")
+    parser.add_argument("--threshold", type=int, default=2048, help="zlib 压缩阈值（字节）")
+    parser.add_argument("--level", type=int, default=6, help="zlib 压缩等级")
+    args = parser.parse_args()
+
+    payloads = load_payloads()
+    print(f"数据源目录: {JSON_DIR}，共 {len(payloads)} 条推送负载\n")
+
+    variants = [
+        ("json(ascii)", AsciiJsonPacket, lambda p: p),
+        ("json(utf8)", Utf8JsonPacket, lambda p: p),
+        ("json(utf8)+zlib", Utf8JsonPacket, lambda p: compressed_payload(p, args.threshold, args.level)),
+    ]
+    if msgpack_packet is not None:
+        variants.append(("msgpack", msgpack_packet.MsgPackPacket, lambda p: p))
+        variants.append(("msgpack+zlib", msgpack_packet.MsgPackPacket, lambda p: compressed_payload(p, args.threshold, args.level)))
+    else:
+        print("ℹ️  未安装 msgpack，跳过 msgpack 相关测试\n")
+
+    totals = {name: [0, 0, 0.0] for name, _, _ in variants}  # 原始字节, deflate 后字节, 编码耗时
+    header = f"{'payload':<24}" + "".join(f"{name:>22}" for name, _, _ in variants)
+    print(header)
+    print("-" * len(header))
+
+    for label, payload in payloads:
+        row = f"{label:<24}"
+        for name, packet_class, transform in variants:
+            data = transform(payload)
+            wire = encode_packet(packet_class, data)
+            deflated = deflate_size(wire)
+            cost = time_encode(packet_class, transform, payload, args.repeat)
+            totals[name][0] += len(wire)
+            totals[name][1] += deflated
+            totals[name][2] += cost
+            row += f"{len(wire):>8}B/{deflated:>6}B/{cost:>5.0f}us"
+        print(row)
+
+    print("-" * len(header))
+    print("格式: 原始字节 / permessage-deflate 后字节 / 单次编码耗时\n")
+
+    baseline = totals["json(ascii)"][0]
+    for name, (raw, deflated, cost) in totals.items():
+        print(
+            f"{name:<18} 总计 {raw:>9} B ({raw / baseline:6.1%})  "
+            f"deflate 后 {deflated:>9} B ({deflated / baseline:6.1%})  "
+            f"编码耗时合计 {cost / 1000:8.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,15 @@
 import json
 import logging
 import asyncio
+import os
+import argparse
+import hashlib
 import re
 import sys
 import ast
+import time
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple, Union
 from handyllm import OpenAIClient, RunConfig, load_from, ChatPrompt, VM
 from handyllm.types import PathType
 
@@ -18,9 +22,29 @@ PROJECT_ROOT = CURRENT_FILE_PATH.parent.parent.parent
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
+from app.scripts.adaptive_concurrency import AdaptiveLimiter, ProgressReporter, is_throttle_error
+from app.scripts.latex_tokenizer import LatexQuestion, normalize_snippet, split_latex_questions
+
 PROMPT_ROOT = PROJECT_ROOT / "app/prompts"
 LATEX_ROOT = PROJECT_ROOT / "app/constants/latex"
 OUTPUT_ROOT = PROJECT_ROOT / "app/constants/json_output"
+# 按题目片段内容缓存的转换结果
+CACHE_ROOT = OUTPUT_ROOT / ".cache"
+# 断点文件：每完成一题追加一行，中断后可用 --resume 续跑
+CHECKPOINT_ROOT = OUTPUT_ROOT / ".checkpoint"
+REPORT_PATH = PROJECT_ROOT / "logs/convert_report.json"
+
+# 提示词版本：修改提示词语义或转换逻辑时手动递增，使旧缓存全部失效
+# （PROMPT_FILES 中提示词文件的内容本身也会计入缓存键，改动这些文件会自动失效）
+PROMPT_VERSION = "1"
+# 计入缓存指纹的提示词：单题与批量的结果写入同一份缓存，因此两种模式的提示词都要计入；
+# 新增会影响转换结果的提示词时须加入此列表
+PROMPT_FILES = (
+    "extract_json.hprompt",
+    "generate_standard_mindmap.hprompt",
+    "extract_json_batch.hprompt",
+    "generate_standard_mindmap_batch.hprompt",
+)
 
 # 设置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -29,6 +53,118 @@ logger = logging.getLogger(__name__)
 # 加载 Prompts
 prompt_extract = load_from(PROMPT_ROOT / "extract_json.hprompt", cls=ChatPrompt)
 prompt_mindmap = load_from(PROMPT_ROOT / "generate_standard_mindmap.hprompt", cls=ChatPrompt)
+# 批量模式：一次请求处理多道题目，系统提示词只发送一次
+# （批量结果与单题结果写入同一份缓存，批量提示词同样计入缓存指纹）
+prompt_extract_batch = load_from(PROMPT_ROOT / "extract_json_batch.hprompt", cls=ChatPrompt)
+prompt_mindmap_batch = load_from(PROMPT_ROOT / "generate_standard_mindmap_batch.hprompt", cls=ChatPrompt)
+
+
+def prompt_fingerprint() -> str:
+    """提示词版本 + PROMPT_FILES 中各提示词文件内容的哈希"""
+    h = hashlib.sha256(PROMPT_VERSION.encode("utf-8"))
+    for name in PROMPT_FILES:
+        h.update((PROMPT_ROOT / name).read_bytes())
+    return h.hexdigest()
+
+
+def write_json_atomic(path: Path, data, **dump_kwargs):
+    """先写临时文件再替换，避免中断时留下半个 JSON"""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, **dump_kwargs)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class SnippetCache:
+    """
+    单题转换结果缓存。
+    键为 (提示词指纹, 章节信息, 规范化后的片段) 的哈希，
+    只有新增或修改过的题目才需要调用模型。
+    """
+    def __init__(self, cache_dir: Path, fingerprint: str):
+        self.cache_dir = cache_dir
+        self.fingerprint = fingerprint
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def key(self, latex_snippet: str, chapter_info: dict) -> str:
+        h = hashlib.sha256()
+        for part in (self.fingerprint, str(chapter_info['id']), str(chapter_info['name']), normalize_snippet(latex_snippet)):
+            h.update(part.encode("utf-8"))
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[dict]:
+        path = self._path(key)
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Broken cache entry {path}: {e}")
+            return None
+
+    def put(self, key: str, data: dict):
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_json_atomic(path, data)
+
+
+class ConversionCheckpoint:
+    """
+    单个章节的断点文件（JSONL）。
+    {stem}.jsonl 每完成一题追加一行 {task_id, index, key, data}；
+    {stem}.failed.jsonl 记录失败的题目片段及错误，供下次 --resume 重试或人工排查。
+    """
+    def __init__(self, checkpoint_dir: Path, stem: str):
+        checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        self.path = checkpoint_dir / f"{stem}.jsonl"
+        self.failed_path = checkpoint_dir / f"{stem}.failed.jsonl"
+
+    @staticmethod
+    def _append(path: Path, record: dict):
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def load(self) -> Dict[str, dict]:
+        """读取已完成的题目，task_id -> 记录；进程被杀时可能残留的半行会被忽略"""
+        done: Dict[str, dict] = {}
+        if not self.path.exists():
+            return done
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                done[record["task_id"]] = record
+        return done
+
+    def append(self, task_id: str, index: int, key: str, data: dict):
+        self._append(self.path, {"task_id": task_id, "index": index, "key": key, "data": data})
+
+    def record_failure(self, task_id: str, index: int, snippet: str, error: str, span: str = ""):
+        self._append(self.failed_path, {
+            "task_id": task_id, "index": index, "lines": span, "snippet": snippet, "error": error
+        })
+
+    def reset(self, keep_done: bool = False):
+        """开始新一轮转换：清空失败列表；非续跑时同时清空已完成记录"""
+        self.failed_path.unlink(missing_ok=True)
+        if not keep_done:
+            self.path.unlink(missing_ok=True)
+
+    def finish(self):
+        """整章全部成功后删除断点文件"""
+        self.path.unlink(missing_ok=True)
+        self.failed_path.unlink(missing_ok=True)
 
 
 def extract_json_tag(text: str, tag: str = "jsonOutput") -> str:
@@ -40,11 +176,59 @@ def extract_json_tag(text: str, tag: str = "jsonOutput") -> str:
     return text.strip()
 
 
+def parse_json_output(raw_content: str, task_id: str):
+    """提取 <jsonOutput> 内容并解析；单引号等非标准 JSON 退回 ast.literal_eval"""
+    json_str = extract_json_tag(raw_content, "jsonOutput")
+    json_str = re.sub(r'^```json\s*', '', json_str, flags=re.MULTILINE)
+    json_str = re.sub(r'^```\s*', '', json_str, flags=re.MULTILINE)
+    json_str = re.sub(r'\s*```$', '', json_str)
+    try:
+        return json.loads(json_str)
+    except json.JSONDecodeError:
+        logger.warning(f"[{task_id}] Standard JSON parse failed, trying ast.literal_eval...")
+        return ast.literal_eval(json_str)
+
+
+def format_batch_items(items: List[Tuple[str, str]]) -> str:
+    """把 (task_id, 内容) 列表拼成批量提示词中的 <item> 块"""
+    return "\n\n".join(f'<item task_id="{task_id}">\n{content}\n</item>' for task_id, content in items)
+
+
 class ConvertAgent:
-    def __init__(self, client: OpenAIClient, debug_dir: PathType):
+    def __init__(self, client: OpenAIClient, debug_dir: PathType, limiter: Optional[AdaptiveLimiter] = None):
         self.client = client
         self.debug_dir = Path(debug_dir)
         self.debug_dir.mkdir(parents=True, exist_ok=True)
+        # 所有文件、所有题目共享的并发控制器
+        self.limiter = limiter or AdaptiveLimiter()
+        # 请求数与 token 用量，用于比较单题 / 批量模式的开销
+        self.usage = {"requests": 0, "prompt_tokens": 0, "completion_tokens": 0}
+        # 批量结果缺失或解析失败、回退为单题请求的次数
+        self.fallbacks = 0
+
+    async def _arun(self, p_val):
+        """经全局并发控制器执行一次 LLM 请求，并把成功 / 限流信号反馈给控制器"""
+        try:
+            async with self.limiter.slot():
+                result_prompt = await p_val.arun(client=self.client)
+        except Exception as e:
+            if is_throttle_error(e):
+                await self.limiter.on_throttle()
+            raise
+        await self.limiter.on_success()
+        self._record_usage(result_prompt)
+        return result_prompt
+
+    def _record_usage(self, result_prompt):
+        self.usage["requests"] += 1
+        usage = (result_prompt.response or {}).get("usage") or {}
+        self.usage["prompt_tokens"] += usage.get("prompt_tokens", 0) or 0
+        self.usage["completion_tokens"] += usage.get("completion_tokens", 0) or 0
+
+    @staticmethod
+    def _retry_delay(e: Exception, attempt: int, base: float) -> float:
+        """限流 / 超时时指数退避，其余错误保持固定间隔"""
+        return base * (2 ** (attempt + 1)) if is_throttle_error(e) else base
 
     async def extract_latex_info(self, latex_snippet: str, chapter_info: dict, task_id: str) -> dict:
         """
@@ -64,7 +248,7 @@ class ConvertAgent:
 
         for attempt in range(3):
             try:
-                result_prompt = await p_val.arun(client=self.client)
+                result_prompt = await self._arun(p_val)
                 raw_content = result_prompt.result_str
                 
                 # 1. 提取标签内容
@@ -95,7 +279,7 @@ class ConvertAgent:
             except Exception as e:
                 logger.error(f"[{task_id}] Step 1 Error (Attempt {attempt+1}): {e}")
                 if attempt < 2:
-                    await asyncio.sleep(2)
+                    await asyncio.sleep(self._retry_delay(e, attempt, 2))
         
         raise RuntimeError(f"Failed Step 1 for {task_id}")
     
@@ -113,18 +297,18 @@ class ConvertAgent:
 
         for attempt in range(3):
             try:
-                result_prompt = await p_val.arun(client=self.client)
+                result_prompt = await self._arun(p_val)
                 json_str = extract_json_tag(result_prompt.result_str, "jsonOutput")
                 json_str = re.sub(r'^```json\s*', '', json_str)
                 json_str = re.sub(r'\s*```$', '', json_str)
                 return json.loads(json_str)
             except Exception as e:
                 logger.error(f"[{task_id}] Step 2 Error: {e}")
-                await asyncio.sleep(1)
+                await asyncio.sleep(self._retry_delay(e, attempt, 1))
 
         raise RuntimeError(f"Failed Step 2 for {task_id}")
 
-    async def process_single_problem(self, latex_snippet: str, chapter_info: dict, idx: int, file_stem: str) -> Optional[dict]:
+    async def process_single_problem(self, latex_snippet: str, chapter_info: dict, idx: int, file_stem: str) -> dict:
         task_id = f"{file_stem}_q{idx}"
         try:
             # 1. 提取信息
@@ -137,21 +321,144 @@ class ConvertAgent:
             base_data['problem_mindmap'] = final_data.get('problem_mindmap', {})
             return base_data
         except Exception as e:
+            # 不在这里吞掉异常：由调用方写入失败列表，便于重试
             logger.error(f"[{task_id}] Failed: {e}")
-            return None
+            raise
+
+    # =========================================================
+    # 批量模式
+    # =========================================================
+    async def _run_batch(self, prompt: ChatPrompt, var_map: VM, output_path: str, batch_id: str,
+                         task_ids: List[str], is_valid) -> Dict[str, dict]:
+        """
+        执行一次批量请求，按 task_id 拆分结果。
+        只返回字段完整的条目；整批失败时返回空字典，由调用方逐题回退。
+        """
+        p_val = prompt.eval(var_map=var_map, run_config=RunConfig(output_path=output_path))
+        for attempt in range(2):
+            try:
+                result_prompt = await self._arun(p_val)
+                data = parse_json_output(result_prompt.result_str, batch_id)
+                if not isinstance(data, dict):
+                    raise ValueError("batch output is not a JSON object keyed by task_id")
+                return {tid: data[tid] for tid in task_ids if isinstance(data.get(tid), dict) and is_valid(data[tid])}
+            except Exception as e:
+                logger.error(f"[{batch_id}] Batch Error (Attempt {attempt+1}): {e}")
+                if attempt < 1:
+                    await asyncio.sleep(self._retry_delay(e, attempt, 2))
+        return {}
+
+    async def extract_latex_info_batch(self, items: List[Tuple[str, str]], chapter_info: dict, batch_id: str) -> Dict[str, dict]:
+        """Step 1（批量）：items 为 (task_id, LaTeX 片段)"""
+        return await self._run_batch(
+            prompt_extract_batch,
+            VM(
+                items=format_batch_items(items),
+                chapter_id=str(chapter_info['id']),
+                chapter_name=str(chapter_info['name'])
+            ),
+            (self.debug_dir / f"{batch_id}_step1_extract_batch.hprompt").as_posix(),
+            batch_id,
+            [tid for tid, _ in items],
+            lambda d: bool(d.get('problem_content')) and 'problem_solution' in d
+        )
+
+    async def generate_mindmap_batch(self, items: List[Tuple[str, str, str]], batch_id: str) -> Dict[str, dict]:
+        """Step 2（批量）：items 为 (task_id, 题目内容, 标准解答)"""
+        return await self._run_batch(
+            prompt_mindmap_batch,
+            VM(items=format_batch_items([
+                (tid, f"【题目内容】\n{content}\n\n【标准解答】\n{solution}") for tid, content, solution in items
+            ])),
+            (self.debug_dir / f"{batch_id}_step2_mindmap_batch.hprompt").as_posix(),
+            batch_id,
+            [tid for tid, _, _ in items],
+            lambda d: bool((d.get('problem_mindmap') or {}).get('nodes'))
+        )
+
+    async def process_batch(self, batch: List[Tuple[int, str]], chapter_info: dict, file_stem: str) -> Dict[int, Union[dict, BaseException]]:
+        """
+        批量处理多道题目：提取与导图各一次请求。
+        批量结果中缺失或不完整的题目回退为单题请求。
+        返回 题号 -> 结果或异常
+        """
+        task_ids = {idx: f"{file_stem}_q{idx}" for idx, _ in batch}
+        batch_id = f"{file_stem}_q{batch[0][0]}-{batch[-1][0]}"
+
+        # 1. 批量提取
+        extracted = await self.extract_latex_info_batch(
+            [(task_ids[idx], snip) for idx, snip in batch], chapter_info, batch_id
+        )
+
+        async def _extract(idx: int, snip: str) -> dict:
+            task_id = task_ids[idx]
+            if task_id in extracted:
+                return extracted[task_id]
+            logger.warning(f"[{task_id}] Missing from batch extraction, falling back to single request")
+            self.fallbacks += 1
+            return await self.extract_latex_info(snip, chapter_info, task_id)
+
+        bases = await asyncio.gather(*(_extract(idx, snip) for idx, snip in batch), return_exceptions=True)
+        results: Dict[int, Union[dict, BaseException]] = {}
+        ok: List[Tuple[int, dict]] = []
+        for (idx, _), base_data in zip(batch, bases):
+            if isinstance(base_data, BaseException):
+                results[idx] = base_data
+            else:
+                ok.append((idx, base_data))
+        if not ok:
+            return results
+
+        # 2. 批量生成导图
+        mindmaps = await self.generate_mindmap_batch(
+            [(task_ids[idx], d['problem_content'], d['problem_solution']) for idx, d in ok], batch_id
+        )
+
+        async def _mindmap(idx: int, base_data: dict) -> dict:
+            task_id = task_ids[idx]
+            final_data = mindmaps.get(task_id)
+            if final_data is None:
+                logger.warning(f"[{task_id}] Missing from batch mindmap, falling back to single request")
+                self.fallbacks += 1
+                final_data = await self.generate_mindmap(base_data['problem_content'], base_data['problem_solution'], task_id)
+            base_data['problem_mindmap'] = final_data.get('problem_mindmap', {})
+            return base_data
+
+        finals = await asyncio.gather(*(_mindmap(idx, d) for idx, d in ok), return_exceptions=True)
+        for (idx, _), final in zip(ok, finals):
+            results[idx] = final
+        return results
 
 
 class LatexProcessor:
-    def __init__(self):
+    def __init__(self, use_cache: bool = True, initial_concurrency: int = 4, max_concurrency: int = 32, resume: bool = False,
+                 batch_size: int = 1, output_dir: Optional[Path] = None, seed_from_output: bool = False):
         # 请确保在这里正确配置你的 Client
         from app.core.config import settings
-        self.client = OpenAIClient(
-            "async", 
-            endpoints=[model.model_dump() for model in settings.endpoints]
-        )
-        self.agent = ConvertAgent(self.client, debug_dir=PROJECT_ROOT / "logs/debug_prompts")
-        self.output_dir = OUTPUT_ROOT
+        from app.core.llm_clients import LLMClientRegistry
+        # 与后端使用同一套连接池配置（批量转换时并发较高，复用连接收益明显）
+        self.llm_clients = LLMClientRegistry(settings.llm_client, settings.endpoints)
+        self.client = self.llm_clients.get()
+        # 全局并发控制：所有章节共享，按上游反馈自适应调整
+        self.limiter = AdaptiveLimiter(initial=initial_concurrency, max_limit=max_concurrency)
+        self.progress = ProgressReporter(self.limiter)
+        self.agent = ConvertAgent(self.client, debug_dir=PROJECT_ROOT / "logs/debug_prompts", limiter=self.limiter)
+        self.output_dir = output_dir or OUTPUT_ROOT
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.checkpoint_dir = CHECKPOINT_ROOT if output_dir is None else self.output_dir / CHECKPOINT_ROOT.name
+        self.use_cache = use_cache
+        # 与断点一样，指定输出目录时缓存也放在该目录下（如基准测试的临时目录），不读写 json_output 的缓存
+        cache_dir = CACHE_ROOT if output_dir is None else self.output_dir / CACHE_ROOT.name
+        self.cache = SnippetCache(cache_dir, prompt_fingerprint())
+        # 续跑模式：跳过断点文件中已完成的题目
+        self.resume = resume
+        # 用已有的 {stem}.json 按位置作为缓存种子（只在确认输出与当前 .tex 一一对应时手动开启）
+        self.seed_from_output = seed_from_output
+        # 每次请求打包的题目数，1 表示逐题请求
+        self.batch_size = max(1, batch_size)
+        self.start_time = time.monotonic()
+        # 每个文件的 复用 / 重新生成 / 失败 统计
+        self.report: Dict[str, dict] = {}
 
     def _parse_filename(self, filename: str) -> dict:
         """
@@ -170,37 +477,33 @@ class LatexProcessor:
         
         return {'id': c_id, 'name': c_name}
 
-    def _split_latex_questions(self, file_path: Path) -> List[str]:
+    def _split_latex_questions(self, file_path: Path) -> List[LatexQuestion]:
         """
         切分 LaTeX。不再人为拼接 '题目：' 前缀。
+        注释、导言区与题目之外的内容不会进入片段，重复的题目只保留第一次出现。
         """
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+        return split_latex_questions(file_path)
 
-        # 简单按 \question 切分
-        # 注意：第一个元素通常是文件头(header)，如果不包含题目内容需要丢弃
-        parts = re.split(r'\\question', content)
-        
-        questions = []
-        for i, part in enumerate(parts):
-            if not part.strip():
-                continue
-            
-            # 简单的过滤：如果这一段没有 content 且在开头，可能是 header
-            # 这里只要包含实质内容就放进去，LLM 会负责提取
-            # 为了避免 header 混入第一题，通常第一题在 split 后是 parts[1]
-            # parts[0] 是 \section{...} \begin{questions} 等
-            
-            # 如果 part 里包含 \section 但看起来不像题目（太短），或者是 split 后的第一部分
-            if i == 0 and '\\begin{document}' in part: 
-                # 检查 parts[0] 是否真的包含题目（有些格式直接开始写题）
-                # 稳妥起见，如果 parts[0] 没有 \question（肯定没有，被split了）
-                # 我们假设 parts[0] 是 preamble，跳过
-                continue
-
-            questions.append(part.strip())
-            
-        return questions
+    def _adopt_existing_output(self, stem: str, snippets: List[str], keys: List[str]):
+        """
+        首次启用缓存时，把已有的 {stem}.json 按位置作为缓存种子，避免把已转换好的章节整体重跑一遍。
+        输出中没有保存源片段，无法校验每一项是否对应当前片段：题目在上次转换后被修改、增删
+        （或切分规则变化）时，旧结果会记在新内容的缓存键下并被一直复用。
+        因此只在 --seed-from-output 时执行，由使用者确认输出与当前 .tex 一致；数量不同时仍然跳过。
+        """
+        out_file = self.output_dir / f"{stem}.json"
+        if not out_file.exists() or any(self.cache.get(k) is not None for k in keys):
+            return
+        try:
+            with open(out_file, 'r', encoding='utf-8') as f:
+                existing = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        if not isinstance(existing, list) or len(existing) != len(snippets):
+            return
+        for key, item in zip(keys, existing):
+            self.cache.put(key, item)
+        logger.info(f"[{stem}] Seeded cache from existing {out_file.name} ({len(existing)} items)")
 
     async def process_file(self, filename: str):
         input_path = LATEX_ROOT / filename
@@ -213,31 +516,161 @@ class LatexProcessor:
         logger.info(f"Processing {filename} | ID: {chapter_info['id']} | Name: {chapter_info['name']}")
 
         # 2. 切分题目
-        snippets = self._split_latex_questions(input_path)
+        questions = self._split_latex_questions(input_path)
+        snippets = [q.text for q in questions]
+        spans = [q.span for q in questions]
         logger.info(f"Found {len(snippets)} snippets")
 
-        # 3. 并发处理
-        sem = asyncio.Semaphore(5)
-        async def _run(snip, i):
-            async with sem:
-                return await self.agent.process_single_problem(snip, chapter_info, i, input_path.stem)
+        # 3. 按内容哈希查缓存，只有新增或修改过的题目才调用模型
+        stem = input_path.stem
+        keys = [self.cache.key(s, chapter_info) for s in snippets]
+        if self.use_cache and self.seed_from_output:
+            self._adopt_existing_output(stem, snippets, keys)
+        checkpoint = ConversionCheckpoint(self.checkpoint_dir, stem)
+        checkpoint.reset(keep_done=self.resume)
+        done = checkpoint.load() if self.resume else {}
+        stats = {
+            "total": len(snippets), "resumed": 0, "reused": 0, "regenerated": 0, "failed": 0,
+            "regenerated_ids": [], "failed_ids": []
+        }
+        self.progress.add_total(len(snippets))
+
+        # 3.1 断点 / 缓存命中的题目直接落盘，其余进入待生成列表
+        pending: List[Tuple[int, str]] = []
+        for i, (snip, key) in enumerate(zip(snippets, keys), 1):
+            task_id = f"{stem}_q{i}"
+            # 断点中的记录只有在题目内容未变时才算完成
+            record = done.get(task_id)
+            if record is not None and record.get("key") == key:
+                stats["resumed"] += 1
+                self.progress.update(True, f"{task_id} (resumed)")
+                continue
+            cached = self.cache.get(key) if self.use_cache else None
+            if cached is not None:
+                checkpoint.append(task_id, i, key, cached)
+                stats["reused"] += 1
+                self.progress.update(True, f"{task_id} (cached)")
+                continue
+            pending.append((i, snip))
+
+        def _finish(i: int, result: Union[dict, BaseException]):
+            task_id = f"{stem}_q{i}"
+            if isinstance(result, BaseException):
+                logger.error(f"[{task_id}] Source lines {spans[i - 1]} failed")
+                checkpoint.record_failure(task_id, i, snippets[i - 1], str(result), spans[i - 1])
+                stats["failed"] += 1
+                stats["failed_ids"].append(task_id)
+                self.progress.update(False, task_id)
+                return
+            self.cache.put(keys[i - 1], result)
+            checkpoint.append(task_id, i, keys[i - 1], result)
+            stats["regenerated"] += 1
+            stats["regenerated_ids"].append(task_id)
+            self.progress.update(True, task_id)
+
+        # 3.2 调用模型；并发由全局 AdaptiveLimiter 在每次 LLM 请求处控制
+        async def _run_single(i: int, snip: str):
+            try:
+                result = await self.agent.process_single_problem(snip, chapter_info, i, stem)
+            except Exception as e:
+                result = e
+            _finish(i, result)
+
+        async def _run_batch(batch: List[Tuple[int, str]]):
+            results = await self.agent.process_batch(batch, chapter_info, stem)
+            for i, _ in batch:
+                _finish(i, results[i])
+
+        if self.batch_size > 1:
+            batches = [pending[k:k + self.batch_size] for k in range(0, len(pending), self.batch_size)]
+            await asyncio.gather(*(_run_batch(batch) for batch in batches))
+        else:
+            await asyncio.gather(*(_run_single(i, snip) for i, snip in pending))
 
-        tasks = [_run(s, i) for i, s in enumerate(snippets, 1)]
-        results = await asyncio.gather(*tasks)
-        results = [r for r in results if r is not None]
+        # 4. 由断点文件按题号组装最终结果，原子写入
+        completed = checkpoint.load()
+        results = []
+        for i, key in enumerate(keys, 1):
+            record = completed.get(f"{stem}_q{i}")
+            if record is not None and record.get("key") == key:
+                results.append(record["data"])
+        out_file = self.output_dir / f"{stem}.json"
+        write_json_atomic(out_file, results, indent=2)
+        self.report[stem] = stats
 
-        # 4. 保存
-        out_file = self.output_dir / f"{input_path.stem}.json"
-        with open(out_file, 'w', encoding='utf-8') as f:
-            json.dump(results, f, ensure_ascii=False, indent=2)
-        logger.info(f"Saved to {out_file}")
+        if stats["failed"]:
+            logger.warning(
+                f"[{stem}] {stats['failed']} problems failed, see {checkpoint.failed_path}; "
+                f"rerun with --resume to retry them"
+            )
+        else:
+            checkpoint.finish()
+        logger.info(
+            f"Saved to {out_file} | resumed: {stats['resumed']}, reused: {stats['reused']}, "
+            f"regenerated: {stats['regenerated']}, failed: {stats['failed']}"
+        )
 
     async def run_all(self):
         # 扫描目录下所有 .tex 文件
-        files = [f.name for f in LATEX_ROOT.glob("*.tex")]
-        for f in files:
-            await self.process_file(f)
+        # 所有章节并行处理，整体吞吐由全局并发控制器决定
+        files = sorted(f.name for f in LATEX_ROOT.glob("*.tex"))
+        try:
+            await asyncio.gather(*(self.process_file(f) for f in files))
+        finally:
+            await self.aclose()
+        self.write_report()
+
+    async def aclose(self):
+        """关闭本实例创建的 HTTP 连接池"""
+        await self.llm_clients.aclose()
+
+    def write_report(self):
+        """输出本次转换的 复用 / 重新生成 报告"""
+        total = {k: sum(r[k] for r in self.report.values()) for k in ("total", "resumed", "reused", "regenerated", "failed")}
+        logger.info(
+            f"Conversion summary | files: {len(self.report)}, snippets: {total['total']}, "
+            f"resumed: {total['resumed']}, reused: {total['reused']}, regenerated: {total['regenerated']}, failed: {total['failed']}"
+        )
+        logger.info(
+            f"Model usage | batch size: {self.batch_size}, requests: {self.agent.usage['requests']}, "
+            f"prompt tokens: {self.agent.usage['prompt_tokens']}, completion tokens: {self.agent.usage['completion_tokens']}, "
+            f"fallbacks: {self.agent.fallbacks}, elapsed: {time.monotonic() - self.start_time:.1f}s"
+        )
+        REPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(REPORT_PATH, 'w', encoding='utf-8') as f:
+            json.dump({
+                "summary": total,
+                "usage": {
+                    **self.agent.usage,
+                    "batch_size": self.batch_size,
+                    "fallbacks": self.agent.fallbacks,
+                    "elapsed_seconds": round(time.monotonic() - self.start_time, 1)
+                },
+                "files": self.report
+            }, f, ensure_ascii=False, indent=2)
+        logger.info(f"Report saved to {REPORT_PATH}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="将 LaTeX 题目转换为结构化 JSON")
+    parser.add_argument("--no-cache", action="store_true", help="忽略缓存，全部重新调用模型")
+    parser.add_argument("--resume", action="store_true", help="从断点续跑，跳过已完成的题目并重试失败的题目")
+    parser.add_argument("--seed-from-output", action="store_true",
+                        help="缓存为空时按位置用已有的 json_output 作为缓存种子（仅在确认其与当前 .tex 逐题对应时使用）")
+    parser.add_argument("--batch-size", type=int, default=1, help="每次请求打包的题目数（1 为逐题请求）")
+    parser.add_argument("--initial-concurrency", type=int, default=4, help="初始并发请求数")
+    parser.add_argument("--max-concurrency", type=int, default=32, help="并发请求数上限")
+    return parser.parse_args(argv)
+
 
 if __name__ == "__main__":
-    p = LatexProcessor()
-    asyncio.run(p.run_all())
\ No newline at end of file
+    args = parse_args()
+    p = LatexProcessor(
+        use_cache=not args.no_cache,
+        initial_concurrency=args.initial_concurrency,
+        max_concurrency=args.max_concurrency,
+        resume=args.resume,
+        batch_size=args.batch_size,
+        seed_from_output=args.seed_from_output
+    )
+    asyncio.run(p.run_all())
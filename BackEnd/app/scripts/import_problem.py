@@ -1,7 +1,10 @@
+import argparse
 import json
 import sys
 from pathlib import Path
-from sqlmodel import Session, select
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from sqlmodel import Session, select, update
 
 # --- 关键点：解决模块导入路径问题 ---
 # 将项目根目录添加到 sys.path 中，这样就能直接引用 'app.database'
@@ -11,76 +14,282 @@ ROOT_DIR = FILE_PATH.parent.parent.parent  # app/scripts/ -> app/ -> root
 sys.path.append(str(ROOT_DIR))
 
 # 现在可以正常导入 app 中的模块了
-from app.database import engine, Problem
-
-# 定义需要导入的文件列表
-TARGET_FILES = [
-    "1-排列组合.json",
-    "2-鸽巢原理.json",
-    "3-母函数.json",
-    "4-线性常系数.json",
-    "6-容斥原理.json",
-    "7-波利亚定理.json"
-]
-
-def import_data():
-    # 动态获取 JSON 文件所在的目录
-    # 路径逻辑: app/scripts/../constants/json_output
-    json_dir = FILE_PATH.parent.parent / "constants" / "json_output"
-    
-    print(f"数据源目录: {json_dir}")
+from app.database import engine, Problem, MINHASH_INDEX_FILE
+from app.core.dedup import DUPLICATE_THRESHOLD, NearDuplicateIndex, content_digest, minhash_signature
+from app.core.gap_analysis import build_node_hints
 
-    with Session(engine) as session:
-        total_added = 0
-        total_skipped = 0
+# 路径逻辑: app/scripts/../constants/json_output
+JSON_DIR = FILE_PATH.parent.parent / "constants" / "json_output"
+# 未通过校验的条目写入这里（JSONL），便于修正后重新导入
+REJECT_FILE = ROOT_DIR / "logs" / "import_rejects.jsonl"
+# 疑似近似重复（措辞 / 记号不同）的新题目写入这里，题目照常导入，供人工复核
+DUPLICATE_FILE = ROOT_DIR / "logs" / "import_near_duplicates.jsonl"
+# 每个事务提交的新增条目数
+DEFAULT_CHUNK_SIZE = 200
 
-        for filename in TARGET_FILES:
-            json_file_path = json_dir / filename
-            print(f"\n正在处理文件: {filename} ...")
 
-            if not json_file_path.exists():
-                print(f"  -> [错误] 找不到文件: {json_file_path}")
-                continue
+class ProblemItem(BaseModel):
+    """导入条目的校验模型，字段与 Problem 表中可导入的字段一致"""
+    model_config = ConfigDict(extra="forbid")
+
+    chapter_id: int
+    chapter_name: str
+    difficulty: int = Field(default=1, ge=1, le=5)
+    problem_content: str = Field(min_length=1)
+    problem_solution: str
+    problem_mindmap: Dict[str, Any] = Field(default_factory=dict)
+
 
-            try:
-                with open(json_file_path, "r", encoding="utf-8") as f:
-                    problems_data = json.load(f)
-            except json.JSONDecodeError as e:
-                print(f"  -> [错误] JSON 解析失败: {e}")
+# =========================================================
+# 流式读取：内存占用只与单个条目的大小有关
+# =========================================================
+def discover_files(json_dir: Path) -> List[Path]:
+    """目录下所有 .json / .jsonl 文件（不含 .cache 等子目录），按文件名排序"""
+    return sorted(
+        (p for p in json_dir.iterdir() if p.is_file() and p.suffix in (".json", ".jsonl")),
+        key=lambda p: p.name
+    )
+
+
+def iter_json_array(path: Path, read_size: int = 1 << 16) -> Iterator[Any]:
+    """逐个解析顶层 JSON 数组中的元素，不把整个文件读入内存"""
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = ""
+        eof = False
+        # start: 等待 '['；item: 等待元素；sep: 等待 ',' 或 ']'；end: 数组已结束
+        state = "start"
+        while True:
+            buf = buf.lstrip()
+            if not buf:
+                if eof:
+                    break
+                chunk = f.read(read_size)
+                eof = not chunk
+                buf += chunk
                 continue
 
-            file_added_count = 0
-            file_skipped_count = 0
-            
-            for item in problems_data:
-                # 查重逻辑：通过 content 查重
-                # 注意：如果 problem_content 很长，建议数据库字段建有索引，或者增加哈希字段查重
-                existing = session.exec(
-                    select(Problem).where(Problem.problem_content == item["problem_content"])
-                ).first()
-
-                if existing:
-                    file_skipped_count += 1
+            if state == "start":
+                if buf[0] != "[":
+                    raise ValueError("top-level JSON value is not an array")
+                buf, state = buf[1:], "item"
+            elif state == "sep":
+                if buf[0] not in ",]":
+                    raise ValueError(f"expected ',' or ']' but got {buf[0]!r}")
+                buf, state = buf[1:], ("item" if buf[0] == "," else "end")
+            elif state == "end":
+                raise ValueError("unexpected data after the top-level array")
+            elif buf[0] == "]":
+                buf, state = buf[1:], "end"
+            else:
+                try:
+                    item, end = decoder.raw_decode(buf)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    # 元素跨越了读取边界，继续读取
+                    chunk = f.read(read_size)
+                    eof = not chunk
+                    buf += chunk
+                    continue
+                yield item
+                buf, state = buf[end:], "sep"
+
+        if state != "end":
+            raise ValueError("unexpected end of file inside the top-level array")
+
+
+def iter_items(path: Path) -> Iterator[Tuple[int, Optional[Any], Optional[str]]]:
+    """
+    逐条产出 (序号, 条目, 解析错误)。
+    JSONL 中单行解析失败只影响该行；JSON 数组格式错误则在出错位置终止该文件。
+    """
+    if path.suffix == ".jsonl":
+        with open(path, "r", encoding="utf-8") as f:
+            for index, line in enumerate(f):
+                if not line.strip():
                     continue
+                try:
+                    yield index, json.loads(line), None
+                except json.JSONDecodeError as e:
+                    yield index, None, f"JSON 解析失败: {e}"
+        return
+
+    index = -1
+    try:
+        for index, item in enumerate(iter_json_array(path)):
+            yield index, item, None
+    except ValueError as e:  # json.JSONDecodeError 也是 ValueError
+        yield index + 1, None, f"JSON 解析失败，文件其余部分已跳过: {e}"
+
+
+# =========================================================
+# 导入
+# =========================================================
+def load_existing(session: Session, index: NearDuplicateIndex) -> Set[str]:
+    """
+    按题目内容查重。problem_content 没有索引，逐条查询在大语料下是 O(n^2)，
+    因此预先流式读出已有题目内容的摘要（SHA-1 十六进制，每条 40 字符）；
+    同一次遍历中把近似重复索引与数据库对齐
+    """
+    digests = set()
+
+    def _rows():
+        result = session.execute(select(Problem.problem_id, Problem.problem_content).execution_options(yield_per=1000))
+        for problem_id, problem_content in result:
+            digests.add(content_digest(problem_content))
+            yield problem_id, problem_content
+
+    updated = index.sync(_rows())
+    if updated:
+        print(f"近似重复索引: 重新计算 {updated} 道已有题目的签名")
+    return digests
+
+
+def backfill_hints(session: Session, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """为缺少节点提示的已有题目（例如提示功能上线前导入的题目）补充生成，返回补充的数量"""
+    result = session.execute(select(Problem.problem_id, Problem.problem_hints).execution_options(yield_per=1000))
+    missing = [problem_id for problem_id, hints in result if not hints]
+    # 分块读取导图并提交，内存占用与题库规模无关
+    for start in range(0, len(missing), chunk_size):
+        chunk = missing[start:start + chunk_size]
+        rows = session.execute(
+            select(Problem.problem_id, Problem.problem_mindmap).where(Problem.problem_id.in_(chunk))
+        ).all()
+        for problem_id, mindmap in rows:
+            session.execute(
+                update(Problem).where(Problem.problem_id == problem_id).values(problem_hints=build_node_hints(mindmap))
+            )
+        session.commit()
+    if missing:
+        print(f"节点提示: 为 {len(missing)} 道已有题目补充生成")
+    return len(missing)
+
+
+class JsonlReport:
+    """导入过程中的报告（拒绝的条目、疑似重复）逐条写入 JSONL，只在出现第一条时创建文件"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.count = 0
+        self._file = None
+        # 清除上一次导入留下的拒绝记录
+        self.path.unlink(missing_ok=True)
+
+    def write(self, record: dict):
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "w", encoding="utf-8")
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def import_data(json_dir: Path = JSON_DIR, chunk_size: int = DEFAULT_CHUNK_SIZE, reject_file: Path = REJECT_FILE,
+                duplicate_file: Path = DUPLICATE_FILE, index_file: Path = MINHASH_INDEX_FILE) -> dict:
+    """
+    导入目录下的所有题目文件，并维护近似重复索引。
+    返回 {"added": 新增数, "skipped": 跳过数, "rejected": 拒绝数, "near_duplicates": 疑似重复数}
+    """
+    print(f"数据源目录: {json_dir}")
+    files = discover_files(json_dir)
+    if not files:
+        print("  -> [警告] 没有找到 .json / .jsonl 文件")
+
+    rejects = JsonlReport(reject_file)
+    duplicates = JsonlReport(duplicate_file)
+    index = NearDuplicateIndex.load(index_file)
+    total_added = 0
+    total_skipped = 0
+    pending = 0
+
+    with Session(engine) as session:
+        seen = load_existing(session, index)
+        backfill_hints(session, chunk_size)
+        try:
+            for json_file_path in files:
+                filename = json_file_path.name
+                print(f"\n正在处理文件: {filename} ...")
+                file_added_count = 0
+                file_skipped_count = 0
+                file_rejected_count = rejects.count
+
+                for item_index, item, error in iter_items(json_file_path):
+                    if error is not None:
+                        rejects.write({"file": filename, "index": item_index, "reason": error})
+                        continue
+                    if not isinstance(item, dict):
+                        rejects.write({"file": filename, "index": item_index, "reason": "条目不是 JSON 对象", "item": item})
+                        continue
+                    try:
+                        data = ProblemItem.model_validate(item)
+                    except ValidationError as e:
+                        rejects.write({"file": filename, "index": item_index, "reason": str(e), "item": item})
+                        continue
+
+                    # 查重逻辑：通过 content 查重
+                    digest = content_digest(data.problem_content)
+                    if digest in seen:
+                        file_skipped_count += 1
+                        continue
+                    seen.add(digest)
+
+                    # 近似重复：只标记，不拦截
+                    signature = minhash_signature(data.problem_content)
+                    similar = index.query(signature, top_k=3, threshold=DUPLICATE_THRESHOLD)
+
+                    problem = Problem(**data.model_dump(), problem_hints=build_node_hints(data.problem_mindmap))
+                    session.add(problem)
+                    session.flush()  # 获取自增 ID
+                    index.add(problem.problem_id, data.problem_content, signature=signature)
+                    if similar:
+                        duplicates.write({
+                            "problem_id": problem.problem_id, "file": filename, "index": item_index,
+                            "similar": [{"problem_id": pid, "similarity": round(score, 3)} for pid, score in similar]
+                        })
+                        print(f"  -> [疑似重复] {filename}#{item_index} (problem_id={problem.problem_id}) 与 "
+                              + ", ".join(f"{pid}({score:.2f})" for pid, score in similar))
+                    file_added_count += 1
+                    pending += 1
+
+                    # 分块提交，并释放已提交对象，保证内存占用不随语料规模增长
+                    if pending >= chunk_size:
+                        session.commit()
+                        session.expunge_all()
+                        pending = 0
+
+                file_rejected_count = rejects.count - file_rejected_count
+                print(f"  -> {filename} 处理完成。新增: {file_added_count}, 跳过: {file_skipped_count}, 拒绝: {file_rejected_count}")
+                total_added += file_added_count
+                total_skipped += file_skipped_count
 
-                # 实例化模型
-                # 注意：确保 json 中的 key 与 Problem 模型的字段完全对应
-                # 如果 json 中包含 problem_mindmap (dict/json)，确保 Problem 模型对应字段类型为 JSON 或 SAColumn(JSON)
-                problem = Problem(**item)
-                session.add(problem)
-                file_added_count += 1
-            
-            # 每处理完一个文件提交一次，避免一次性提交数据量过大
             session.commit()
-            print(f"  -> {filename} 导入完成。新增: {file_added_count}, 跳过: {file_skipped_count}")
-            
-            total_added += file_added_count
-            total_skipped += file_skipped_count
-        
-        print(f"\n========================================")
-        print(f"所有文件处理完毕！")
-        print(f"总计新增: {total_added} 条")
-        print(f"总计跳过: {total_skipped} 条")
+            index.save(index_file)
+        finally:
+            rejects.close()
+            duplicates.close()
+
+    print(f"\n========================================")
+    print(f"所有文件处理完毕！")
+    print(f"总计新增: {total_added} 条")
+    print(f"总计跳过: {total_skipped} 条")
+    print(f"总计拒绝: {rejects.count} 条" + (f"（详见 {reject_file}）" if rejects.count else ""))
+    print(f"疑似重复: {duplicates.count} 条" + (f"（详见 {duplicate_file}）" if duplicates.count else ""))
+
+    return {"added": total_added, "skipped": total_skipped, "rejected": rejects.count, "near_duplicates": duplicates.count}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="将题目 JSON / JSONL 导入数据库")
+    parser.add_argument("--dir", type=Path, default=JSON_DIR, help="题目文件所在目录")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="每个事务提交的新增条目数")
+    parser.add_argument("--reject-file", type=Path, default=REJECT_FILE, help="未通过校验的条目输出路径")
+    return parser.parse_args(argv)
+
 
 if __name__ == "__main__":
-    import_data()
\ No newline at end of file
+    args = parse_args()
+    import_data(args.dir, chunk_size=max(1, args.chunk_size), reject_file=args.reject_file)
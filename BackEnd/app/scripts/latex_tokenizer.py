@@ -0,0 +1,209 @@
+"""
+LaTeX 题目切分。
+
+逐行流式扫描 .tex 文件，识别注释、环境嵌套与 \\question 命令，
+输出带源文件行号范围、去重后的题目片段。
+只有处于顶层或 questions 环境内的 \\question 才会开始新题；
+导言区、\\section 等题目之外的内容以及注释不会进入片段。
+"""
+import hashlib
+import logging
+import re
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# \begin{env} / \end{env} / \question / \part 四类记号
+TOKEN_RE = re.compile(r'\\(begin|end)\s*\{([^}]*)\}|\\(question|part)(?![A-Za-z])')
+# exam 文档类中的各种解答环境
+SOLUTION_ENVS = {"solution", "solutionorbox", "solutionorlines", "solutionordottedlines", "solutionorgrid"}
+
+
+def normalize_snippet(latex_snippet: str) -> str:
+    """规范化题目片段：合并空白，避免仅排版差异导致缓存失效或去重失败"""
+    return re.sub(r'\s+', ' ', latex_snippet).strip()
+
+
+def strip_comment(line: str) -> str:
+    """去掉行内注释：第一个前面不是奇数个反斜杠的 %"""
+    i = line.find('%')
+    while i != -1:
+        backslashes = 0
+        j = i - 1
+        while j >= 0 and line[j] == '\\':
+            backslashes += 1
+            j -= 1
+        if backslashes % 2 == 0:
+            return line[:i]
+        i = line.find('%', i + 1)
+    return line
+
+
+class LatexQuestion:
+    """一道题目的片段及其在源文件中的位置"""
+
+    def __init__(self, index: int, start_line: int) -> None:
+        self.index = index
+        self.start_line = start_line
+        self.end_line = start_line
+        self.lines: List[str] = []
+        self.parts = 0
+        self.solutions = 0
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.lines).strip()
+
+    @property
+    def span(self) -> str:
+        return f"L{self.start_line}-{self.end_line}"
+
+    def add(self, text: str, line_no: int):
+        self.lines.append(text)
+        if text.strip():
+            self.end_line = line_no
+
+
+class LatexQuestionTokenizer:
+    """
+    用法：
+        for q in LatexQuestionTokenizer().iter_file(path): ...
+    逐行处理，内存占用只与单道题目的大小有关。
+    """
+
+    def __init__(self, dedupe: bool = True) -> None:
+        self.dedupe = dedupe
+        # 环境栈，只记录环境名
+        self.env_stack: List[str] = []
+        self.in_document = False
+        self.has_document = False
+        self.current: Optional[LatexQuestion] = None
+        self.count = 0
+        self.seen: set = set()
+        self.duplicates = 0
+
+    def iter_file(self, file_path: Path) -> Iterator[LatexQuestion]:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            # 若存在 \begin{document}，之前的导言区全部跳过
+            self.has_document = any('\\begin{document}' in strip_comment(line) for line in f)
+            f.seek(0)
+            yield from self.iter_lines(f)
+
+    def iter_lines(self, lines: Iterable[str]) -> Iterator[LatexQuestion]:
+        self.in_document = not self.has_document
+        for line_no, raw in enumerate(lines, 1):
+            line = strip_comment(raw.rstrip('\n'))
+            # 整行注释直接丢弃，不留空行
+            if not line.strip() and raw.lstrip().startswith('%'):
+                continue
+            yield from self._feed_line(line, line_no)
+        question = self._close_question()
+        if question is not None:
+            yield question
+
+    # =========================================================
+    # 内部实现
+    # =========================================================
+    def _question_allowed(self) -> bool:
+        """\\question 只在顶层或 questions 环境内开始新题"""
+        if not self.in_document:
+            return False
+        return not self.env_stack or self.env_stack[-1] == "questions"
+
+    def _feed_line(self, line: str, line_no: int) -> Iterator[LatexQuestion]:
+        pos = 0
+        for m in TOKEN_RE.finditer(line):
+            kind, env, command = m.group(1), (m.group(2) or "").strip(), m.group(3)
+
+            if kind == "begin":
+                if env == "document":
+                    self.in_document = True
+                    pos = m.end()
+                    continue
+                if env == "questions" and self._question_allowed():
+                    # questions 环境本身不属于任何题目
+                    self._append(line[pos:m.start()], line_no)
+                    question = self._close_question()
+                    if question is not None:
+                        yield question
+                    self.env_stack.append(env)
+                    pos = m.end()
+                    continue
+                self.env_stack.append(env)
+                if env in SOLUTION_ENVS and self.current is not None:
+                    self.current.solutions += 1
+
+            elif kind == "end":
+                if env == "document":
+                    self._append(line[pos:m.start()], line_no)
+                    question = self._close_question()
+                    if question is not None:
+                        yield question
+                    self.in_document = False
+                    pos = m.end()
+                    continue
+                if env not in self.env_stack:
+                    # 不匹配的 \end{...}（例如缺少对应的 \begin{questions}）
+                    if env == "questions":
+                        self._append(line[pos:m.start()], line_no)
+                        question = self._close_question()
+                        if question is not None:
+                            yield question
+                        pos = m.end()
+                    continue
+                # 弹出到匹配的环境为止，容忍内部未闭合的环境
+                while self.env_stack:
+                    top = self.env_stack.pop()
+                    if top == env:
+                        break
+                if env == "questions":
+                    self._append(line[pos:m.start()], line_no)
+                    question = self._close_question()
+                    if question is not None:
+                        yield question
+                    pos = m.end()
+
+            elif command == "question" and self._question_allowed():
+                self._append(line[pos:m.start()], line_no)
+                question = self._close_question()
+                if question is not None:
+                    yield question
+                self.count += 1
+                self.current = LatexQuestion(self.count, line_no)
+                pos = m.end()
+
+            elif command == "part" and self.current is not None:
+                self.current.parts += 1
+
+        self._append(line[pos:], line_no)
+
+    def _append(self, text: str, line_no: int):
+        # 题目之外的内容（导言区、\section、环境之间的说明）直接丢弃
+        if self.current is not None and self.in_document:
+            self.current.add(text, line_no)
+
+    def _close_question(self) -> Optional[LatexQuestion]:
+        question, self.current = self.current, None
+        if question is None:
+            return None
+        text = question.text
+        if not text:
+            logger.warning(f"Empty question at line {question.start_line}, skipped")
+            return None
+        if self.dedupe:
+            digest = hashlib.sha1(normalize_snippet(text).encode("utf-8")).digest()
+            if digest in self.seen:
+                self.duplicates += 1
+                logger.warning(f"Duplicate question at {question.span}, skipped")
+                return None
+            self.seen.add(digest)
+        return question
+
+
+def split_latex_questions(file_path: Path) -> List[LatexQuestion]:
+    """切分整个文件，返回去重后的题目列表（题号连续编排）"""
+    questions = list(LatexQuestionTokenizer().iter_file(file_path))
+    for i, question in enumerate(questions, 1):
+        question.index = i
+    return questions
@@ -0,0 +1,72 @@
+import argparse
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# 与直接运行其他脚本时一样，保证 'from app.xxx' 可以导入
+ROOT_DIR = Path(__file__).resolve().parent.parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from app.core.debug_artifacts import ArtifactName, iter_artifacts, read_artifact
+
+
+def matches_solution(task_id: str, solution_id: int) -> bool:
+    # 正式任务为 sol_<id>，草稿预生成为 sol_<id>_spec
+    prefix = f"sol_{solution_id}"
+    return task_id == prefix or task_id.startswith(prefix + "_")
+
+
+def search(base_dir: Path, solution_id: int, task=None, status=None, since=None):
+    """返回 [(修改时间, 路径, 文件名信息)]，按时间从新到旧"""
+    found = []
+    for path in iter_artifacts(base_dir):
+        name = ArtifactName.parse(path)
+        if name is None or not matches_solution(name.task_id, solution_id):
+            continue
+        if task and name.task != task:
+            continue
+        if status == "failed":
+            if name.status == "ok":
+                continue
+        elif status and name.status != status:
+            continue
+        mtime = datetime.fromtimestamp(path.stat().st_mtime)
+        if since and mtime < since:
+            continue
+        found.append((mtime, path, name))
+    found.sort(key=lambda item: item[0], reverse=True)
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="按做题记录 (solution / mindmap id) 查找模型调用的调试记录")
+    parser.add_argument("solution_id", type=int)
+    parser.add_argument("--dir", type=Path, default=None, help="调试记录目录（默认取配置 debug_artifacts.dir）")
+    parser.add_argument("--task", choices=["scratch", "update", "suggestion", "fused"], help="只看该类任务")
+    parser.add_argument("--status", choices=["ok", "failed", "parse_error", "invalid"],
+                        help="按结果过滤，failed 表示 ok 以外的所有结果")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="只看该时间之后的记录，如 2026-10-01T08:00")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--show", action="store_true", help="输出记录内容（解压后）")
+    args = parser.parse_args(argv)
+
+    base_dir = args.dir
+    if base_dir is None:
+        from app.core.config import settings
+        base_dir = settings.debug_artifacts.dir
+
+    found = search(base_dir, args.solution_id, args.task, args.status, args.since)
+    if not found:
+        print(f"没有找到 solution {args.solution_id} 的调试记录（目录: {base_dir}）")
+        return
+    print(f"共 {len(found)} 条，显示最新的 {min(len(found), args.limit)} 条：")
+    for mtime, path, name in found[:args.limit]:
+        print(f"{mtime:%Y-%m-%d %H:%M:%S}  {name.task:<10} {name.status:<11} run={name.run_id}  {path}")
+        if args.show:
+            print(read_artifact(path))
+            print("-" * 60)
+
+
+if __name__ == "__main__":
+    main()
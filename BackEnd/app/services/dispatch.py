@@ -0,0 +1,327 @@
+# app/services/dispatch.py
+# HTTP 接口与 Socket.IO 事件共用的任务入口：校验请求并提交后台任务
+import logging
+import math
+from typing import Any, Awaitable, Callable, Optional
+
+from app.core.config import settings
+from app.core.fastapi_socketio import SocketIOServer
+from app.core.idempotency import derive_idempotency_key
+from app.core.metrics import metrics
+from app.core.shared import (
+    user_manager, problem_manager, solution_manager, job_manager, global_agent,
+    rate_limiter, idempotency_store, suggestion_cache_manager, speculation_manager
+)
+from app.core.manager.suggestion_cache_manager import suggestion_cache_key
+from app.core.manager.speculation_manager import speculation_key
+from app.core.text_diff import at_segment_boundary, diff_solution
+from app.services.tasks import (
+    update_mindmap_pipeline, run_analysis_pipeline, update_and_suggest_pipeline, speculate_mindmap_pipeline
+)
+
+logger = logging.getLogger(__name__)
+
+JOB_UPDATE_MINDMAP = "updateMindmap"
+JOB_QUERY_ANALYSIS = "queryAnalysis"
+# 更新导图并生成建议（单次模型调用），由 updateMindmap 的 with_suggestion 选择
+JOB_UPDATE_AND_SUGGEST = "updateAndSuggest"
+# 草稿预生成（不登记为 Job，只用于限流）
+DRAFT_SNAPSHOT = "draftSnapshot"
+
+
+class DispatchError(Exception):
+    """请求无法受理，status_code 与 HTTP 状态码一致"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[float] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        # 429 时建议客户端等待的秒数
+        self.retry_after = retry_after
+
+    @property
+    def headers(self):
+        if self.retry_after is None:
+            return None
+        return {"Retry-After": str(math.ceil(self.retry_after))}
+
+
+def _get_owned_solution(user_id: int, solution_id: int):
+    solution = solution_manager.get_solution_by_id(solution_id)
+    if not solution:
+        raise DispatchError(404, "Solution record not found")
+    if solution.user_id != user_id:
+        raise DispatchError(403, "Access denied")
+    return solution
+
+
+async def _check_rate_limit(kind: str, user_id: int, solution_id: int, rerun_on_coalesce: bool = False) -> Optional[str]:
+    """
+    令牌桶限流。未超限返回 None；
+    超限时按配置合并到正在进行的同类任务（返回其 job_id），否则抛出 429。
+    rerun_on_coalesce 为真时标记被合并的任务，使其完成后按最新输入再执行一次（见 _run_with_followups）
+    """
+    allowed, retry_after = await rate_limiter.acquire(kind, user_id)
+    if allowed:
+        rate_limiter.record(kind, "allowed")
+        return None
+
+    if rate_limiter.config.over_limit == "coalesce":
+        pending = job_manager.get_jobs_by_solution(solution_id, kind)
+        if pending:
+            rate_limiter.record(kind, "coalesced")
+            if rerun_on_coalesce:
+                pending[-1].rerun_requested = True
+            logger.info(f"[{kind}] user={user_id} 超出限额，合并到进行中的任务 {pending[-1].job_id}")
+            return pending[-1].job_id
+
+    rate_limiter.record(kind, "rejected")
+    logger.info(f"[{kind}] user={user_id} 超出限额，{retry_after:.1f}s 后可重试")
+    raise DispatchError(429, "Too many requests", retry_after=retry_after)
+
+
+def _resolve_idempotency_key(kind: str, user_id: int, solution_id: int, client_key: Optional[str], *inputs) -> Optional[str]:
+    """客户端提供的 Idempotency-Key 优先（按用户隔离），否则按输入内容自动生成"""
+    if not settings.idempotency.enabled:
+        return None
+    if client_key:
+        return f"client:{user_id}:{kind}:{client_key}"
+    if settings.idempotency.derive_keys:
+        return derive_idempotency_key(kind, solution_id, *inputs)
+    return None
+
+
+async def _attach_existing_job(kind: str, key: Optional[str], solution, sio: SocketIOServer) -> Optional[str]:
+    """
+    若幂等键已对应一个任务，返回其 job_id。
+    任务已完成时把结果重新推送给用户，确保重试的客户端也能收到。
+    """
+    if key is None:
+        return None
+    job = idempotency_store.get(key)
+    if job is None:
+        return None
+
+    metrics.inc("idempotency_hits_total", {"endpoint": kind, "state": "done" if job.done else "running"},
+                description="重复请求挂到已有任务的次数")
+    logger.info(f"[{kind}] solution={solution.solution_id} 重复请求，复用任务 {job.job_id}")
+
+    sid = user_manager.getSid(solution.user_id)
+    if job.done and sid:
+        if kind == JOB_UPDATE_AND_SUGGEST:
+            result = job.result or {}
+            if result.get("new_mindmap"):
+                await sio.sendAnalysisMap(sid, result["new_mindmap"], problem_id=solution.problem_id, mindmap_id=solution.solution_id)
+            if result.get("suggestion"):
+                await sio.sendAnalysisSuggestion(sid, result["suggestion"], problem_id=solution.problem_id, mindmap_id=solution.solution_id)
+        elif kind == JOB_UPDATE_MINDMAP:
+            await sio.sendAnalysisMap(sid, job.result, problem_id=solution.problem_id, mindmap_id=solution.solution_id)
+        else:
+            await sio.sendAnalysisSuggestion(sid, job.result, problem_id=solution.problem_id, mindmap_id=solution.solution_id)
+    return job.job_id
+
+
+async def _run_with_followups(solution_id: int, user_input_text: str,
+                              run: Callable[[str], Awaitable[Any]]) -> Any:
+    """
+    执行导图更新。执行期间有更新请求被限流合并进来时（Job.rerun_requested），
+    完成后按数据库中最新的解答文本再执行一次，直到没有新的合并请求为止；返回最后一次的结果
+    """
+    result = await run(user_input_text)
+    job = job_manager.current_job()
+    while job is not None and job.rerun_requested:
+        job.rerun_requested = False
+        solution = solution_manager.get_solution_by_id(solution_id)
+        if not solution or solution.current_solution == user_input_text:
+            break
+        user_input_text = solution.current_solution
+        logger.info(f"[{job.kind}] solution={solution_id} 有请求合并到本任务，按最新解答再次更新")
+        result = await run(user_input_text)
+    return result
+
+
+async def start_update_mindmap(
+    user_id: int, solution_id: int, current_solution: str, sio: SocketIOServer,
+    idempotency_key: Optional[str] = None, with_suggestion: bool = False
+) -> str:
+    """
+    保存用户解答并提交思维导图更新任务，返回 job_id。
+    with_suggestion 为真时同一次模型调用中一并生成解题建议（单独的任务类型与限额）
+    """
+    kind = JOB_UPDATE_AND_SUGGEST if with_suggestion else JOB_UPDATE_MINDMAP
+    solution = _get_owned_solution(user_id, solution_id)
+    # 相同的解答文本 + 相同的现有导图 => 相同的任务
+    key = _resolve_idempotency_key(
+        kind, user_id, solution_id, idempotency_key,
+        current_solution, solution.new_mindmap
+    )
+
+    # 1. 更新解答 (SolutionManager)
+    # 即使随后被限流，用户的解答也要先保存
+    solution = solution_manager.update_solution_text(solution_id, current_solution)
+    if not solution:
+        raise DispatchError(404, "Solution record not found")
+
+    # 2. 幂等：重复请求直接挂到已有任务
+    existing_job_id = await _attach_existing_job(kind, key, solution, sio)
+    if existing_job_id:
+        return existing_job_id
+
+    # 3. 限流
+    # 被合并的任务会在完成后按最新的解答文本再更新一次，刚保存的文本不会被遗漏
+    coalesced_job_id = await _check_rate_limit(kind, user_id, solution_id, rerun_on_coalesce=True)
+    if coalesced_job_id:
+        return coalesced_job_id
+
+    # 4. 提交后台任务（分步流程中有文本一致的草稿预生成时直接采用，只用于第一次执行）
+    # 合并流程不使用预生成：留在管理器中，过期或被取代时取消
+    speculative = None
+    if settings.speculation.enabled and not with_suggestion:
+        speculative = speculation_manager.take(
+            solution_id, speculation_key(solution.new_mindmap, solution.mindmap_source, current_solution)
+        )
+
+    def run(user_input_text: str):
+        nonlocal speculative
+        if with_suggestion:
+            return update_and_suggest_pipeline(
+                solution_id=solution_id,
+                user_input_text=user_input_text,
+                sio=sio,
+                agent=global_agent,
+                solution_manager=solution_manager,
+                problem_manager=problem_manager,
+                user_manager=user_manager,
+                suggestion_cache_manager=suggestion_cache_manager if settings.suggestion.cache_enabled else None
+            )
+        adopted, speculative = speculative, None
+        return update_mindmap_pipeline(
+            solution_id=solution_id,
+            user_input_text=user_input_text,
+            sio=sio,
+            agent=global_agent,
+            solution_manager=solution_manager,
+            problem_manager=problem_manager,
+            user_manager=user_manager,
+            speculative=adopted
+        )
+
+    job = job_manager.submit(kind, user_id, solution_id, _run_with_followups(solution_id, current_solution, run))
+    if key is not None:
+        idempotency_store.put(key, job)
+    _yield_speculation()
+    return job.job_id
+
+
+async def _serve_cached_suggestion(solution, sio: SocketIOServer) -> bool:
+    """建议缓存命中时立即推送（无需提交任务，也不占用限流额度），返回是否命中"""
+    if not settings.suggestion.cache_enabled or not solution.new_mindmap:
+        return False
+    problem = problem_manager.get_problem_by_id(solution.problem_id)
+    if not problem or not problem.problem_mindmap:
+        return False
+    cached = suggestion_cache_manager.get(
+        suggestion_cache_key(solution.new_mindmap, solution.current_solution, problem.problem_mindmap),
+        solution.new_mindmap
+    )
+    if cached is None:
+        return False
+
+    logger.info(f"[{JOB_QUERY_ANALYSIS}] solution={solution.solution_id} 命中建议缓存")
+    if cached["suggestion_summary"] != solution.suggestion_summary:
+        solution_manager.update_suggestion(solution.solution_id, cached["suggestion_summary"])
+    sid = user_manager.getSid(solution.user_id)
+    if sid:
+        await sio.sendAnalysisSuggestion(sid, cached, problem_id=solution.problem_id, mindmap_id=solution.solution_id)
+    return True
+
+
+async def start_query_analysis(
+    user_id: int, solution_id: int, sio: SocketIOServer,
+    idempotency_key: Optional[str] = None
+) -> Optional[str]:
+    """提交解题建议生成任务，返回 job_id；建议缓存命中时直接推送结果，返回 None"""
+    solution = _get_owned_solution(user_id, solution_id)
+    if await _serve_cached_suggestion(solution, sio):
+        return None
+
+    # 相同的解答文本 + 相同的用户导图 => 相同的建议
+    key = _resolve_idempotency_key(
+        JOB_QUERY_ANALYSIS, user_id, solution_id, idempotency_key,
+        solution.current_solution, solution.new_mindmap
+    )
+    existing_job_id = await _attach_existing_job(JOB_QUERY_ANALYSIS, key, solution, sio)
+    if existing_job_id:
+        return existing_job_id
+
+    coalesced_job_id = await _check_rate_limit(JOB_QUERY_ANALYSIS, user_id, solution_id)
+    if coalesced_job_id:
+        return coalesced_job_id
+
+    job = job_manager.submit(
+        JOB_QUERY_ANALYSIS, user_id, solution_id,
+        run_analysis_pipeline(
+            solution_id=solution_id,
+            sio=sio,
+            agent=global_agent,
+            solution_manager=solution_manager,
+            problem_manager=problem_manager,
+            user_manager=user_manager,
+            suggestion_cache_manager=suggestion_cache_manager if settings.suggestion.cache_enabled else None
+        )
+    )
+    if key is not None:
+        idempotency_store.put(key, job)
+    _yield_speculation()
+    return job.job_id
+
+
+# =========================================================
+# 草稿预生成
+# =========================================================
+def _engine_idle() -> bool:
+    return len(job_manager.jobs) <= settings.speculation.idle_max_jobs
+
+
+def _yield_speculation():
+    """正式任务超过空闲阈值时，取消进行中的预生成，把模型调用让给正式请求"""
+    if settings.speculation.enabled and not _engine_idle():
+        speculation_manager.cancel_running()
+
+
+async def start_speculation(user_id: int, solution_id: int, draft_text: str) -> str:
+    """
+    收到草稿时尝试预生成导图，返回处理结果：
+    started / not_boundary / too_small / duplicate / busy / rate_limited。
+    草稿只是提示，不满足条件时直接忽略
+    """
+    if not settings.speculation.enabled:
+        raise DispatchError(501, "Speculation disabled")
+    solution = _get_owned_solution(user_id, solution_id)
+
+    # 只在句子或公式结束处预生成，避免对写到一半的内容反复生成
+    if not at_segment_boundary(draft_text):
+        return "not_boundary"
+    if solution.mindmap_source is not None:
+        diff = diff_solution(solution.mindmap_source, draft_text)
+        if len(diff.changed) + len(diff.deleted) < settings.speculation.min_changed_chars:
+            return "too_small"
+    key = speculation_key(solution.new_mindmap, solution.mindmap_source, draft_text)
+    if speculation_manager.has(solution_id, key):
+        return "duplicate"
+    if not _engine_idle() or speculation_manager.running_count() >= settings.speculation.max_concurrent:
+        return "busy"
+    allowed, _ = await rate_limiter.acquire(DRAFT_SNAPSHOT, user_id)
+    rate_limiter.record(DRAFT_SNAPSHOT, "allowed" if allowed else "rejected")
+    if not allowed:
+        return "rate_limited"
+
+    speculation_manager.start(solution_id, key, speculate_mindmap_pipeline(
+        solution_id=solution_id,
+        draft_text=draft_text,
+        agent=global_agent,
+        solution_manager=solution_manager,
+        problem_manager=problem_manager
+    ))
+    logger.info(f"[{DRAFT_SNAPSHOT}] solution={solution_id} 开始预生成（{len(draft_text)} 字）")
+    return "started"
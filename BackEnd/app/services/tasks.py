@@ -1,13 +1,160 @@
 # app/services/tasks.py
+import asyncio
 import logging
+from typing import Optional, Tuple
 from app.core.fastapi_socketio import SocketIOServer
 from app.core.agent.agent_realtime import AgentRealtime
 from app.core.manager.solution_manager import SolutionManager
 from app.core.manager.problem_manager import ProblemManager
 from app.core.manager.user_manager import UserManager
+from app.core.manager.suggestion_cache_manager import (
+    SuggestionCacheManager, suggestion_cache_key, to_cached_ids, from_cached_ids
+)
+from app.core.mindmap_graph import MindMapGraph, mindmap_hash
+from app.core.text_diff import diff_solution
+from app.core.metrics import metrics
+from app.core.config import settings
+from app.core.gap_analysis import analyze_gap, local_suggestion, heuristic_suggestion, build_node_hints
 
 logger = logging.getLogger(__name__)
 
+EMPTY_MINDMAP = {"nodes": [], "edges": []}
+
+
+def plan_mindmap_update(solution, user_input_text: str) -> Tuple[str, str]:
+    """
+    决定导图的更新方式，返回 (方式, 交给模型的学生文本)：
+        scratch   - 还没有导图，从零生成
+        rebuild   - 变化过大或删去了较多内容，整体重新生成
+        diff      - 只把相对上次生成导图时新增 / 修改的文本（带上下文）交给模型
+        full_text - 增量更新，但给模型完整文本
+        skip      - 文本没有实质变化
+    """
+    existing_mindmap = solution.new_mindmap
+    # 判断现有导图是否包含有效节点
+    # 假设空导图结构是 {"nodes": [], "edges": []}
+    has_existing_nodes = existing_mindmap and len(existing_mindmap.get("nodes", [])) > 0
+    if not has_existing_nodes:
+        return "scratch", user_input_text
+
+    source_text = solution.mindmap_source
+    if not settings.mindmap_update.diff_input or source_text is None:
+        return "full_text", user_input_text
+    diff = diff_solution(source_text, user_input_text, settings.mindmap_update.context_segments)
+    if diff.kind == "none":
+        return "skip", user_input_text
+    if diff.changed_ratio > settings.mindmap_update.rebuild_ratio or \
+            len(diff.deleted) > settings.mindmap_update.max_deleted_chars:
+        return "rebuild", user_input_text
+    return "diff", diff.to_prompt_input()
+
+
+def clean_mindmap(task_id: str, mindmap: dict) -> dict:
+    """结构校验：重复节点与悬空边直接去掉（前端无法渲染），环只记录"""
+    graph = MindMapGraph(mindmap)
+    issues = graph.validate()
+    if issues:
+        logger.warning(f"[{task_id}] 导图结构问题: {'; '.join(issues[:10])}")
+        if graph.duplicate_nodes or graph.dangling_edges:
+            return graph.to_mindmap()
+    return mindmap
+
+
+async def generate_user_mindmap(
+    agent: AgentRealtime,
+    task_id: str,
+    problem_content: str,
+    existing_mindmap: Optional[dict],
+    update_mode: str,
+    update_input: str,
+    user_input_text: str
+) -> dict:
+    """按 plan_mindmap_update 决定的方式调用 Agent，返回经过结构校验的导图（无效时为空）"""
+    if update_mode in ("scratch", "rebuild"):
+        # --- Case A: 首次生成 / 变化过大时整体重新生成 ---
+        logger.info(f"[{task_id}] 模式: {'首次生成' if update_mode == 'scratch' else '整体重新生成'}")
+        result = await agent.generate_mindmap_scratch(problem_content, user_input_text, task_id)
+    else:
+        # --- Case B: 增量更新 ---
+        logger.info(f"[{task_id}] 模式: 增量更新（{'文本差异' if update_mode == 'diff' else '完整文本'}，"
+                    f"输入 {len(update_input)}/{len(user_input_text)} 字）")
+        result = await agent.update_mindmap_incremental(
+            problem_content=problem_content,
+            existing_map=existing_mindmap,
+            user_input=update_input,
+            task_id=task_id
+        )
+    final_mindmap = result.get("problem_mindmap", result)
+    return clean_mindmap(task_id, final_mindmap) if final_mindmap else {}
+
+
+async def adopt_speculation(task_id: str, speculative: asyncio.Task) -> Optional[dict]:
+    """等待草稿预生成的结果；预生成失败或被取消时返回 None，由调用方正常生成"""
+    if not speculative.done():
+        logger.info(f"[{task_id}] 等待进行中的草稿预生成")
+    # asyncio.wait 不会因预生成被取消而抛出 CancelledError，避免与本任务自身的取消混淆
+    try:
+        await asyncio.wait({speculative})
+    except asyncio.CancelledError:
+        # 预生成已从管理器中取出，只有这里还能取消它
+        speculative.cancel()
+        raise
+    if speculative.cancelled() or speculative.exception() is not None or not speculative.result():
+        logger.info(f"[{task_id}] 草稿预生成不可用，改为正常生成")
+        return None
+    logger.info(f"[{task_id}] 采用草稿预生成的导图")
+    return speculative.result()
+
+
+async def send_heuristic_final(sio: SocketIOServer, user_manager: UserManager, solution, result: dict, task_id: str):
+    """已推送启发式建议、但模型未能给出建议时，把启发式建议作为最终结果推送（推送失败只记录）"""
+    sid = user_manager.getSid(solution.user_id)
+    if not sid:
+        return
+    try:
+        await sio.sendAnalysisSuggestion(
+            sid=sid,
+            suggestion_data=result,
+            problem_id=solution.problem_id,
+            mindmap_id=solution.solution_id,
+            phase="final"
+        )
+        logger.info(f"[{task_id}] 模型建议未生成，启发式建议已作为最终结果推送")
+    except Exception as e:
+        logger.warning(f"[{task_id}] 启发式建议的最终结果推送失败: {e}")
+
+
+async def speculate_mindmap_pipeline(
+    solution_id: int,
+    draft_text: str,
+    agent: AgentRealtime,
+    solution_manager: SolutionManager,
+    problem_manager: ProblemManager
+) -> Optional[dict]:
+    """按草稿预先生成导图，不写库也不推送；返回导图（无需更新或失败时返回 None）"""
+    task_id = f"sol_{solution_id}_spec"
+    solution = solution_manager.get_solution_by_id(solution_id)
+    problem = problem_manager.get_problem_by_id(solution.problem_id) if solution else None
+    if not solution or not problem:
+        return None
+
+    update_mode, update_input = plan_mindmap_update(solution, draft_text)
+    if update_mode == "skip":
+        return None
+    try:
+        final_mindmap = await generate_user_mindmap(
+            agent, task_id, getattr(problem, "problem_content", ""), solution.new_mindmap,
+            update_mode, update_input, draft_text
+        )
+    except asyncio.CancelledError:
+        logger.info(f"[{task_id}] 草稿预生成已取消")
+        raise
+    except Exception as e:
+        logger.warning(f"[{task_id}] 草稿预生成失败: {e}")
+        return None
+    return final_mindmap or None
+
+
 async def update_mindmap_pipeline(
     solution_id: int,
     user_input_text: str,
@@ -15,8 +162,10 @@ async def update_mindmap_pipeline(
     agent: AgentRealtime,
     solution_manager: SolutionManager,
     problem_manager: ProblemManager,
-    user_manager: UserManager
+    user_manager: UserManager,
+    speculative: Optional[asyncio.Task] = None
 ):
+    """更新用户思维导图，返回新导图（失败时返回 None）；speculative 为与本次文本匹配的草稿预生成任务"""
     task_id = f"sol_{solution_id}"
     logger.info(f"[{task_id}] 开始更新思维导图...")
 
@@ -50,46 +199,55 @@ async def update_mindmap_pipeline(
         # problem_solution = getattr(problem, "problem_solution", "")
         existing_mindmap = solution.new_mindmap
         
-        # 判断现有导图是否包含有效节点
-        # 假设空导图结构是 {"nodes": [], "edges": []}
-        has_existing_nodes = existing_mindmap and len(existing_mindmap.get("nodes", [])) > 0
-        
         final_mindmap = {}
 
+        # 增量更新只需把相对上次生成导图时新增 / 修改的文本交给模型；
+        # 变化过大或删去了较多内容时整体重新生成
+        update_mode, update_input = plan_mindmap_update(solution, user_input_text)
+        has_existing_nodes = update_mode != "scratch"
+        metrics.inc("mindmap_update_mode_total", {"mode": update_mode}, description="思维导图更新的方式")
+        if update_mode == "skip":
+            logger.info(f"[{task_id}] 解答文本没有实质变化，跳过更新")
+            return existing_mindmap
+
         # ==================================================
-        # Step 3: 调用 Agent 
+        # Step 3: 调用 Agent（有与本次文本一致的草稿预生成时直接采用其结果）
         # ==================================================
         
-        if not has_existing_nodes:
-            # --- Case A: 首次生成 ---
-            logger.info(f"[{task_id}] 模式: 首次生成")
-            result = await agent.generate_mindmap_scratch(problem_content, user_input_text, task_id)
-            final_mindmap = result.get("problem_mindmap", result)
-        else:
-            # --- Case B: 增量更新 ---
-            logger.info(f"[{task_id}] 模式: 增量更新")
-            result = await agent.update_mindmap_incremental(
-                problem_content=problem_content,
-                existing_map=existing_mindmap,
-                user_input=user_input_text,
-                task_id=task_id
+        if speculative is not None:
+            final_mindmap = await adopt_speculation(task_id, speculative)
+        if not final_mindmap:
+            final_mindmap = await generate_user_mindmap(
+                agent, task_id, problem_content, existing_mindmap, update_mode, update_input, user_input_text
             )
-            final_mindmap = result.get("problem_mindmap", result)
 
         # 简单的有效性检查
         if not final_mindmap:
             logger.warning(f"[{task_id}] AI 生成结果无效，跳过保存")
             return
 
+        # 与现有导图等价（仅编号、顺序、空白或 LaTeX 写法不同）时不落库也不推送，避免前端无意义的重绘
+        if has_existing_nodes and mindmap_hash(final_mindmap) == mindmap_hash(existing_mindmap):
+            metrics.inc("mindmap_noop_updates_total", description="模型返回的导图与现有导图等价、跳过保存与推送的次数")
+            logger.info(f"[{task_id}] 导图没有实质变化，跳过保存与推送")
+            # 导图不变，但之后的文本差异应以本次的文本为基准
+            solution_manager.update_mindmap_source(solution_id, user_input_text)
+            return existing_mindmap
+
         # ==================================================
         # Step 4: 更新数据库 & 推送
         # ==================================================
         
         # 保存回 Solution
-        solution_manager.update_mindmap(solution_id, final_mindmap)
+        # 先落库再推送：即使推送前任务被取消，用户重连后也能看到结果
+        solution_manager.update_mindmap(solution_id, final_mindmap, source_text=user_input_text)
         logger.info(f"[{task_id}] 数据库更新成功")
 
-        # 推送 SocketIO
+        # 推送 SocketIO（LLM 调用期间用户可能已重连，重新获取 SID）
+        sid = user_manager.getSid(solution.user_id)
+        if not sid:
+            logger.info(f"[{task_id}] 用户已离线，跳过推送")
+            return final_mindmap
         await sio.sendAnalysisMap(
             sid=sid,
             mindmap_data=final_mindmap,
@@ -97,7 +255,11 @@ async def update_mindmap_pipeline(
             mindmap_id=solution_id
         )
         logger.info(f"[{task_id}] SocketIO 推送完成，sid={sid}")
+        return final_mindmap
 
+    except asyncio.CancelledError:
+        logger.info(f"[{task_id}] 思维导图更新任务已取消")
+        raise
     except Exception as e:
         logger.error(f"[{task_id}] 思维导图更新异常: {e}", exc_info=True)
 
@@ -107,8 +269,10 @@ async def run_analysis_pipeline(
     agent: AgentRealtime,
     solution_manager: SolutionManager,
     problem_manager: ProblemManager,
-    user_manager: UserManager
+    user_manager: UserManager,
+    suggestion_cache_manager: Optional[SuggestionCacheManager] = None
 ):
+    """生成解题建议，返回建议结果（失败时返回 None）"""
     task_id = f"sol_{solution_id}"
     logger.info(f"[{task_id}] 开始 AI 分析任务...")
 
@@ -154,25 +318,81 @@ async def run_analysis_pipeline(
         # 只有当存在标准导图，且刚才生成了有效的用户导图时，才进行差异分析
         if standard_mindmap and latest_mindmap:
             logger.info(f"[{task_id}] 开始生成解题建议 (Gap Analysis)...")
-            
-            # 5.2 调用 Agent 生成建议
-            suggestion_result = await agent.generate_mindmap_suggestion(
-                problem_content=problem_content,
-                # problem_solution=problem_solution,
-                user_solution=latest_solution,  # 用户的最新解答
-                user_mindmap=latest_mindmap,     # 用户的最新用户导图
-                standard_mindmap=standard_mindmap,
-                task_id=task_id
-            )
+
+            # 5.2 缓存：用户导图、解答文本与标准导图都没变时直接复用上次的建议
+            suggestion_result = None
+            cache_key = None
+            if suggestion_cache_manager is not None:
+                cache_key = suggestion_cache_key(latest_mindmap, latest_solution, standard_mindmap)
+                suggestion_result = suggestion_cache_manager.get(cache_key, latest_mindmap)
+                if suggestion_result is not None:
+                    logger.info(f"[{task_id}] 命中建议缓存")
+
+            # 5.3 本地对齐：能直接回答的情况不调用模型，否则只给模型缺失的子图
+            gap_mindmap = standard_mindmap
+            report = None
+            if suggestion_result is None and settings.suggestion.local_analysis:
+                report = analyze_gap(latest_mindmap, standard_mindmap, settings.suggestion.match_threshold)
+                logger.info(f"[{task_id}] 本地对齐覆盖率 {report.coverage:.0%}，缺失节点: {report.missing}")
+                suggestion_result = local_suggestion(report, settings.suggestion.complete_coverage)
+                if suggestion_result is None:
+                    gap_mindmap = report.missing_subgraph()
+                metrics.inc("suggestion_requests_total", {"source": "local" if suggestion_result else "llm"},
+                            description="解题建议的来源（本地模板 / 模型）")
+
+            # 5.4 调用 Agent 生成建议
+            if suggestion_result is None:
+                # 第一阶段：用预先生成的节点提示立即推送启发式建议，模型的建议随后覆盖它
+                heuristic_final = None
+                sid = user_manager.getSid(solution.user_id)
+                if sid and report is not None and settings.suggestion.two_phase:
+                    hints = getattr(problem, "problem_hints", None) or build_node_hints(standard_mindmap)
+                    quick_result = heuristic_suggestion(report, hints)
+                    if quick_result:
+                        await sio.sendAnalysisSuggestion(
+                            sid=sid,
+                            suggestion_data=quick_result,
+                            problem_id=solution.problem_id,
+                            mindmap_id=solution_id,
+                            phase="heuristic"
+                        )
+                        logger.info(f"[{task_id}] 启发式建议已推送 (sid={sid})")
+                        # 模型未能给出建议（异常、取消或结果为空）时以它作为最终结果，前端不会一直显示“正在生成”
+                        heuristic_final = heuristic_suggestion(report, hints, pending=False)
+
+                try:
+                    suggestion_result = await agent.generate_mindmap_suggestion(
+                        problem_content=problem_content,
+                        # problem_solution=problem_solution,
+                        user_solution=latest_solution,  # 用户的最新解答
+                        user_mindmap=latest_mindmap,     # 用户的最新用户导图
+                        standard_mindmap=gap_mindmap,    # 标准导图中尚未覆盖的部分
+                        task_id=task_id
+                    )
+                except (Exception, asyncio.CancelledError):
+                    if heuristic_final:
+                        await send_heuristic_final(sio, user_manager, solution, heuristic_final, task_id)
+                    raise
+                if not suggestion_result and heuristic_final:
+                    await send_heuristic_final(sio, user_manager, solution, heuristic_final, task_id)
+                    return heuristic_final
+                if suggestion_result and cache_key is not None:
+                    suggestion_cache_manager.put(cache_key, solution.problem_id, suggestion_result, latest_mindmap)
             
             if suggestion_result:
-                # 5.3 保存建议总结到数据库
+                # 5.5 保存建议总结到数据库（与已保存的相同时跳过）
                 # 提取 summary，如果为空则默认为空字符串
                 summary_text = suggestion_result.get("suggestion_summary", "")
-                solution_manager.update_suggestion(solution_id, summary_text)
-                logger.info(f"[{task_id}] 建议 Summary 已保存到数据库")
+                if summary_text != solution.suggestion_summary:
+                    solution_manager.update_suggestion(solution_id, summary_text)
+                    logger.info(f"[{task_id}] 建议 Summary 已保存到数据库")
+
+                sid = user_manager.getSid(solution.user_id)
+                if not sid:
+                    logger.info(f"[{task_id}] 用户已离线，跳过推送")
+                    return suggestion_result
 
-                # 5.4 推送 SocketIO 给前端
+                # 5.6 推送 SocketIO 给前端
                 # 假设 sio 封装了 sendAnalysisSuggestion 方法
                 # suggestion_result 结构包含: { "suggestion": {...}, "suggestion_summary": "..." }
                 await sio.sendAnalysisSuggestion(
@@ -182,6 +402,7 @@ async def run_analysis_pipeline(
                     mindmap_id=solution_id
                 )
                 logger.info(f"[{task_id}] 建议数据已推送到前端 (sid={sid})")
+                return suggestion_result
             else:
                 logger.warning(f"[{task_id}] AI 生成建议结果为空")
         else:
@@ -190,5 +411,128 @@ async def run_analysis_pipeline(
             if not latest_mindmap:
                 logger.warning(f"[{task_id}] 用户思维导图查询失败，无法进行差异分析")
 
+    except asyncio.CancelledError:
+        logger.info(f"[{task_id}] 分析任务已取消")
+        raise
+    except Exception as e:
+        logger.error(f"[{task_id}] 分析任务执行异常: {e}", exc_info=True)
+
+async def update_and_suggest_pipeline(
+    solution_id: int,
+    user_input_text: str,
+    sio: SocketIOServer,
+    agent: AgentRealtime,
+    solution_manager: SolutionManager,
+    problem_manager: ProblemManager,
+    user_manager: UserManager,
+    suggestion_cache_manager: Optional[SuggestionCacheManager] = None
+):
+    """
+    更新用户思维导图并生成解题建议：一次模型调用同时返回两者，一次写入同时保存导图与建议，
+    再依次推送 sendAnalysisMap 与 sendAnalysisSuggestion。
+    返回 {"new_mindmap": ..., "suggestion": ...}（失败时返回 None）
+    """
+    task_id = f"sol_{solution_id}"
+    logger.info(f"[{task_id}] 开始更新思维导图并生成建议...")
+
+    try:
+        solution = solution_manager.get_solution_by_id(solution_id)
+        if not solution:
+            logger.error(f"[{task_id}] Solution 不存在")
+            return
+        problem = problem_manager.get_problem_by_id(solution.problem_id)
+        if not problem:
+            logger.error(f"[{task_id}] 关联的 Problem (ID: {solution.problem_id}) 不存在")
+            return
+
+        problem_content = getattr(problem, "problem_content", "")
+        standard_mindmap = getattr(problem, "problem_mindmap", None)
+        existing_mindmap = solution.new_mindmap
+        update_mode, update_input = plan_mindmap_update(solution, user_input_text)
+
+        # 没有标准导图时无法生成建议；文本没有实质变化时导图不变，建议可走本地分析与缓存 —— 都退回分步流程
+        if not standard_mindmap or update_mode == "skip":
+            logger.info(f"[{task_id}] {'缺少标准思维导图' if not standard_mindmap else '解答文本没有实质变化'}，改用分步流程")
+            new_mindmap = await update_mindmap_pipeline(
+                solution_id, user_input_text, sio, agent, solution_manager, problem_manager, user_manager
+            )
+            suggestion_result = None
+            if standard_mindmap and new_mindmap:
+                suggestion_result = await run_analysis_pipeline(
+                    solution_id, sio, agent, solution_manager, problem_manager, user_manager, suggestion_cache_manager
+                )
+            return {"new_mindmap": new_mindmap, "suggestion": suggestion_result}
+
+        metrics.inc("mindmap_update_mode_total", {"mode": update_mode}, description="思维导图更新的方式")
+        metrics.inc("suggestion_requests_total", {"source": "fused"}, description="解题建议的来源（本地模板 / 模型）")
+        logger.info(f"[{task_id}] 模式: {update_mode}（单次调用），输入 {len(update_input)}/{len(user_input_text)} 字")
+
+        # 从零生成 / 整体重新生成时不提供现有导图
+        has_existing_nodes = update_mode != "scratch"
+        result = await agent.update_mindmap_and_suggest(
+            problem_content=problem_content,
+            existing_map=existing_mindmap if update_mode in ("diff", "full_text") else EMPTY_MINDMAP,
+            user_input=update_input,
+            user_solution=user_input_text,
+            standard_mindmap=standard_mindmap,
+            task_id=task_id
+        )
+        final_mindmap = result.get("problem_mindmap")
+        if not final_mindmap:
+            logger.warning(f"[{task_id}] AI 生成结果无效，跳过保存")
+            return
+        final_mindmap = clean_mindmap(task_id, final_mindmap)
+        suggestion_result = {
+            "suggestion": result.get("suggestion") or EMPTY_MINDMAP,
+            "suggestion_summary": result.get("suggestion_summary") or "",
+        }
+
+        # 导图与现有导图等价时只保存建议，不推送导图
+        map_changed = not has_existing_nodes or mindmap_hash(final_mindmap) != mindmap_hash(existing_mindmap)
+        if not map_changed:
+            metrics.inc("mindmap_noop_updates_total", description="模型返回的导图与现有导图等价、跳过保存与推送的次数")
+            # 建议挂在模型返回的导图上，两者编号可能不同，换成现有导图的编号
+            suggestion_result["suggestion"] = from_cached_ids(
+                to_cached_ids(suggestion_result["suggestion"], final_mindmap), existing_mindmap
+            )
+            final_mindmap = existing_mindmap
+
+        # 一次写入同时保存导图、其对应的解答文本与建议
+        solution_manager.update_mindmap_and_suggestion(
+            solution_id, final_mindmap if map_changed else None, user_input_text,
+            suggestion_result["suggestion_summary"]
+        )
+        logger.info(f"[{task_id}] 导图与建议已保存到数据库")
+        if suggestion_cache_manager is not None:
+            suggestion_cache_manager.put(
+                suggestion_cache_key(final_mindmap, user_input_text, standard_mindmap),
+                solution.problem_id, suggestion_result, final_mindmap
+            )
+
+        sid = user_manager.getSid(solution.user_id)
+        fused_result = {"new_mindmap": final_mindmap, "suggestion": suggestion_result}
+        if not sid:
+            logger.info(f"[{task_id}] 用户已离线，跳过推送")
+            return fused_result
+        # 前端收到新导图时会清空旧建议，因此先推导图再推建议
+        if map_changed:
+            await sio.sendAnalysisMap(
+                sid=sid,
+                mindmap_data=final_mindmap,
+                problem_id=solution.problem_id,
+                mindmap_id=solution_id
+            )
+        await sio.sendAnalysisSuggestion(
+            sid=sid,
+            suggestion_data=suggestion_result,
+            problem_id=solution.problem_id,
+            mindmap_id=solution_id
+        )
+        logger.info(f"[{task_id}] 导图与建议已推送到前端 (sid={sid})")
+        return fused_result
+
+    except asyncio.CancelledError:
+        logger.info(f"[{task_id}] 导图更新与建议任务已取消")
+        raise
     except Exception as e:
-        logger.error(f"[{task_id}] 分析任务执行异常: {e}", exc_info=True)
\ No newline at end of file
+        logger.error(f"[{task_id}] 导图更新与建议任务异常: {e}", exc_info=True)
@@ -1,68 +1,195 @@
-import os
+import argparse
+import asyncio
+import hashlib
+import json
 import sys
-import subprocess
 from pathlib import Path
+from typing import Callable, Dict, List, Optional
 
 # --- 1. 路径配置 ---
 # 脚本在 BackEnd 根目录下
 BACKEND_ROOT = Path(__file__).resolve().parent
+# 与直接运行各脚本时一样，保证 'from app.xxx' 可以导入
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.insert(0, str(BACKEND_ROOT))
 
-# 各个脚本的相对路径
-CONVERT_SCRIPT = BACKEND_ROOT / "app" / "scripts" / "convert_latex.py"
-DATABASE_SCRIPT = BACKEND_ROOT / "app" / "database.py"
-IMPORT_SCRIPT = BACKEND_ROOT / "app" / "scripts" / "import_problem.py"
+LATEX_DIR = BACKEND_ROOT / "app" / "constants" / "latex"
+JSON_DIR = BACKEND_ROOT / "app" / "constants" / "json_output"
+DB_FILE = BACKEND_ROOT / "math_tutor.db"
+# 记录每个阶段上次成功运行时的输入指纹
+STATE_FILE = BACKEND_ROOT / ".init_state.json"
 
-# JSON 检查目录
-JSON_OUTPUT_DIR = BACKEND_ROOT / "app" / "constants" / "json_output"
 
-def run_python_script(script_path):
-    """
-    运行指定的 Python 脚本，并设置正确的 PYTHONPATH
-    """
-    if not script_path.exists():
-        print(f"❌ 错误: 找不到文件 {script_path}")
-        return False
+def hash_files(paths: List[Path]) -> str:
+    """按文件名排序后对 文件名 + 内容 求哈希"""
+    h = hashlib.sha256()
+    for path in sorted(paths, key=lambda p: p.name):
+        h.update(path.name.encode("utf-8"))
+        h.update(b"\0")
+        h.update(path.read_bytes())
+        h.update(b"\0")
+    return h.hexdigest()
+
 
-    print(f"🚀 正在执行: {script_path.relative_to(BACKEND_ROOT)}...")
-    
-    # 核心：设置 PYTHONPATH 为 BackEnd 目录，这样脚本里 'from app.xxx' 才能生效
-    env = os.environ.copy()
-    env["PYTHONPATH"] = str(BACKEND_ROOT)
-    
+def load_state() -> Dict[str, str]:
+    if not STATE_FILE.exists():
+        return {}
     try:
-        # 使用当前 Python 解释器运行子脚本
-        subprocess.run([sys.executable, str(script_path)], env=env, check=True)
-        print(f"✅ 执行成功\n")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"❌ 执行失败: {script_path.name}")
+        with open(STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_state(state: Dict[str, str]):
+    tmp_path = STATE_FILE.with_name(STATE_FILE.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    tmp_path.replace(STATE_FILE)
+
+
+# =========================================================
+# 各阶段：fingerprint() 计算输入指纹，run() 执行并返回是否成功
+# =========================================================
+class Stage:
+    def __init__(self, name: str, title: str, fingerprint: Callable[[], str], run: Callable[[], bool],
+                 outputs_missing: Callable[[], Optional[str]] = lambda: None, rerun_after: tuple = ()):
+        self.name = name
+        self.title = title
+        self.fingerprint = fingerprint
+        self.run = run
+        # 输出缺失时（例如数据库文件被删除）即使指纹未变也需要重跑，返回原因
+        self.outputs_missing = outputs_missing
+        # 这些阶段本次运行过时，本阶段必须重跑（其影响无法体现在输入指纹中，例如重建了数据库）
+        self.rerun_after = set(rerun_after)
+
+
+def convert_fingerprint() -> str:
+    # 提示词指纹包含提示词版本与提示词文件内容
+    from app.scripts.convert_latex import prompt_fingerprint
+    return f"{hash_files(list(LATEX_DIR.glob('*.tex')))}:{prompt_fingerprint()}"
+
+
+def convert_outputs_missing() -> Optional[str]:
+    missing = [p.stem for p in LATEX_DIR.glob("*.tex") if not (JSON_DIR / f"{p.stem}.json").exists()]
+    return f"缺少 JSON: {', '.join(sorted(missing))}" if missing else None
+
+
+def run_convert() -> bool:
+    # 转换按题目内容哈希缓存，只有新增或修改过的题目才会调用模型；
+    # 已有的 JSON 在首次运行时会被作为缓存种子，不会整体重跑
+    from app.scripts.convert_latex import LatexProcessor
+    processor = LatexProcessor()
+    asyncio.run(processor.run_all())
+    failed = sum(r["failed"] for r in processor.report.values())
+    if failed:
+        print(f"❌ {failed} 道题目转换失败，可运行 convert_latex.py --resume 重试")
         return False
+    return True
+
+
+def schema_fingerprint() -> str:
+    from app.database import SCHEMA_VERSION
+    return str(SCHEMA_VERSION)
+
+
+def db_missing() -> Optional[str]:
+    return None if DB_FILE.exists() else "数据库文件不存在"
+
+
+def run_schema() -> bool:
+    from app.database import create_db_and_tables
+    create_db_and_tables()
+    return True
+
+
+def import_fingerprint() -> str:
+    # 表结构变化后也需要重新导入
+    from app.scripts.import_problem import discover_files
+    return f"{hash_files(discover_files(JSON_DIR))}:{schema_fingerprint()}"
+
+
+def import_outputs_missing() -> Optional[str]:
+    from app.database import MINHASH_INDEX_FILE
+    return db_missing() or (None if MINHASH_INDEX_FILE.exists() else "近似重复索引不存在")
+
+
+def run_import() -> bool:
+    from app.scripts.import_problem import import_data
+    import_data(JSON_DIR)
+    return True
+
+
+STAGES = [
+    Stage("convert", "增量转换 LaTeX 题目（仅处理新增或修改过的题目）", convert_fingerprint, run_convert, convert_outputs_missing),
+    Stage("schema", "初始化数据库表结构", schema_fingerprint, run_schema, db_missing),
+    Stage("import", "向数据库导入题目数据", import_fingerprint, run_import, import_outputs_missing, rerun_after=("schema",)),
+]
+
+
+def stale_reason(stage: Stage, state: Dict[str, str], force: bool, ran: set) -> Optional[str]:
+    """返回该阶段需要运行的原因；无需运行时返回 None"""
+    if force:
+        return "--force"
+    missing = stage.outputs_missing()
+    if missing:
+        return missing
+    upstream = stage.rerun_after & ran
+    if upstream:
+        return f"上游阶段 {', '.join(sorted(upstream))} 已运行"
+    recorded = state.get(stage.name)
+    if recorded is None:
+        return "首次运行"
+    if stage.fingerprint() != recorded:
+        return "输入已变化"
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="后端环境初始化：仅重新运行输入发生变化的阶段")
+    parser.add_argument("--dry-run", action="store_true", help="只报告各阶段是否需要运行，不实际执行")
+    parser.add_argument("--force", nargs="*", choices=[s.name for s in STAGES], metavar="STAGE",
+                        help="强制运行指定阶段（不指定则全部）")
+    args = parser.parse_args(argv)
+    forced = set(s.name for s in STAGES) if args.force == [] else set(args.force or [])
 
-def main():
     print("=== 后端环境初始化脚本 ===\n")
+    state = load_state()
+    # 本次已运行（dry-run 时为将要运行）的阶段
+    ran = set()
 
-    # --- 步骤 1: LaTeX 转换 ---
-    # 检查是否有 .json 文件
-    json_files = list(JSON_OUTPUT_DIR.glob("*.json")) if JSON_OUTPUT_DIR.exists() else []
-    
-    if json_files:
-        print(f"ℹ️  步骤 1: 检测到 {len(json_files)} 个 JSON 文件，跳过 LaTeX 转换。")
-    else:
-        print("ℹ️  步骤 1: 未找到 JSON 数据，开始从 LaTeX 转换...")
-        if not run_python_script(CONVERT_SCRIPT):
-            sys.exit(1)
+    for step, stage in enumerate(STAGES, 1):
+        # 指纹在上游阶段运行之后才计算，因此能反映上游产出的变化
+        reason = stale_reason(stage, state, stage.name in forced, ran)
 
-    # --- 步骤 2: 数据库建表 ---
-    print("ℹ️  步骤 2: 初始化数据库表结构...")
-    if not run_python_script(DATABASE_SCRIPT):
-        sys.exit(1)
+        if args.dry_run:
+            if reason is not None:
+                print(f"🔍 步骤 {step} [{stage.name}] {stage.title}: 将运行（{reason}）")
+                ran.add(stage.name)
+            elif ran:
+                # 上游阶段将运行，本阶段的输入可能随之改变
+                print(f"🔍 步骤 {step} [{stage.name}] {stage.title}: 当前已是最新，上游运行后可能需要运行")
+            else:
+                print(f"🔍 步骤 {step} [{stage.name}] {stage.title}: 已是最新，跳过")
+            continue
+
+        if reason is None:
+            print(f"⏭️  步骤 {step} [{stage.name}] {stage.title}: 已是最新，跳过\n")
+            continue
+
+        print(f"ℹ️  步骤 {step} [{stage.name}] {stage.title}（{reason}）...")
+        if not stage.run():
+            print(f"❌ 执行失败: {stage.name}")
+            sys.exit(1)
+        # 记录本次实际使用的输入指纹
+        state[stage.name] = stage.fingerprint()
+        save_state(state)
+        ran.add(stage.name)
+        print(f"✅ 执行成功\n")
 
-    # --- 步骤 3: 导入数据 ---
-    print("ℹ️  步骤 3: 开始向数据库导入题目数据...")
-    if not run_python_script(IMPORT_SCRIPT):
-        sys.exit(1)
+    if not args.dry_run:
+        print("🎉 所有初始化流程已完成！")
 
-    print("🎉 所有初始化流程已完成！")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,7 +1,6 @@
 # main.py
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
-from sqlmodel import SQLModel
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
@@ -14,7 +13,9 @@ logging.getLogger("sqlalchemy.engine").setLevel(logging.WARNING)
 # 确保导入路径正确
 from app.routers import sio_routes, api
 from app.core.fastapi_socketio import SocketIOServer
-from app.database import engine
+from app.database import create_db_and_tables
+from app.core.config import settings
+from app.core.shared import mindmap_layout, debug_artifacts, llm_clients
 
 # --- 1. 定义生命周期管理 (Lifespan) ---
 @asynccontextmanager
@@ -22,19 +23,38 @@ async def lifespan(app: FastAPI):
     print(">>> [Lifespan] 系统启动：正在检查并创建数据库表...")
     # 建议加上 try-except 以防数据库连接失败导致启动崩溃
     try:
-        SQLModel.metadata.create_all(engine)
+        create_db_and_tables()
         print(">>> [Lifespan] 数据库表检查完成")
     except Exception as e:
         print(f">>> [Lifespan] 数据库连接失败: {e}")
+
+    # 预先连接模型端点，避免第一个请求承担 TCP/TLS 握手的延迟
+    if settings.llm_client.warmup:
+        try:
+            results = await llm_clients.warmup()
+            print(f">>> [Lifespan] 模型端点预热: {results}")
+        except Exception as e:
+            print(f">>> [Lifespan] 模型端点预热失败: {e}")
     
     yield
+    # 写完队列中剩余的调试记录
+    debug_artifacts.close()
+    await llm_clients.aclose()
     print(">>> [Lifespan] 系统关闭")
 
 # --- 2. 实例化 App ---
 app = FastAPI(lifespan=lifespan)
 
 # --- 3. 配置 SocketIO ---
-sio = SocketIOServer(app) 
+sio = SocketIOServer(
+    app,
+    serializer=settings.socketio.serializer,
+    http_compression=settings.socketio.http_compression,
+    compression_threshold=settings.socketio.compression_threshold,
+    mindmap_compress_threshold=settings.socketio.mindmap_compress_threshold,
+    mindmap_compress_level=settings.socketio.mindmap_compress_level,
+    mindmap_layout=mindmap_layout if settings.mindmap_layout.push_positions else None,
+)
 sio_routes.sio_router.register(sio)
 
 # --- 4. 配置 API 路由 ---
@@ -57,4 +77,8 @@ app.add_middleware(
 
 # --- 6. 启动入口 ---
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
+    uvicorn.run(
+        "main:app", host="127.0.0.1", port=8000, reload=True,
+        # WebSocket 帧压缩（permessage-deflate），弱网下显著减少思维导图推送流量
+        ws_per_message_deflate=settings.socketio.ws_per_message_deflate,
+    )
\ No newline at end of file
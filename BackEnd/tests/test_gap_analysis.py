@@ -0,0 +1,46 @@
+from app.core.gap_analysis import analyze_gap
+
+
+def test_missing_subgraph_ids_do_not_collide_with_user_ids():
+    # 用户节点 N3 对应标准节点 N2；两边都从 N1 编号，标准导图中缺失的 N3 与用户的 N3 重名
+    user = {
+        "nodes": [
+            {"node_id": "N1", "node_type": "问题核心", "node_content": "求三角形的面积"},
+            {"node_id": "N2", "node_type": "切入点", "node_content": "画出草图"},
+            {"node_id": "N3", "node_type": "关键结论", "node_content": "由余弦定理得 $c^2=a^2+b^2-2ab\\cos C$"},
+        ],
+        "edges": [
+            {"edge_id": "E1", "source": "N1", "target": "N2", "edge_content": ""},
+            {"edge_id": "E2", "source": "N2", "target": "N3", "edge_content": ""},
+        ],
+    }
+    standard = {
+        "nodes": [
+            {"node_id": "N1", "node_type": "问题核心", "node_content": "求三角形的面积"},
+            {"node_id": "N2", "node_type": "关键结论", "node_content": "由余弦定理得 $c^2=a^2+b^2-2ab\\cos C$"},
+            {"node_id": "N3", "node_type": "关键结论", "node_content": "代入面积公式 $S=\\frac12 ab\\sin C$"},
+            {"node_id": "N4", "node_type": "最终答案", "node_content": "面积为 $6$"},
+        ],
+        "edges": [
+            {"edge_id": "E1", "source": "N1", "target": "N2", "edge_content": "余弦定理"},
+            {"edge_id": "E2", "source": "N2", "target": "N3", "edge_content": "求正弦"},
+            {"edge_id": "E3", "source": "N3", "target": "N4", "edge_content": "计算"},
+        ],
+    }
+
+    report = analyze_gap(user, standard)
+    assert report.matches["N2"][0] == "N3"
+    assert report.missing == ["N3", "N4"]
+
+    subgraph = report.missing_subgraph()
+    node_ids = [node["node_id"] for node in subgraph["nodes"]]
+    assert node_ids == ["N3", "S1", "S2"]
+    assert len(set(node_ids)) == len(node_ids)
+    assert subgraph["nodes"][0]["node_content"] == user["nodes"][2]["node_content"]
+    assert subgraph["nodes"][1]["node_content"] == standard["nodes"][2]["node_content"]
+
+    edges = [(edge["source"], edge["target"]) for edge in subgraph["edges"]]
+    assert edges == [("N3", "S1"), ("S1", "S2")]
+    assert all(edge["source"] != edge["target"] for edge in subgraph["edges"])
+    # 边也使用单独的编号
+    assert [edge["edge_id"] for edge in subgraph["edges"]] == ["SE1", "SE2"]
@@ -0,0 +1,30 @@
+from app.core.manager.suggestion_cache_manager import from_cached_ids, suggestion_cache_key, to_cached_ids
+
+
+def _mindmap(ids, edge_ids):
+    a, b = ids
+    return {
+        "nodes": [
+            {"node_id": a, "node_type": "问题核心", "node_content": "求 $x$"},
+            {"node_id": b, "node_type": "关键结论", "node_content": "移项得 $2x=4$"},
+        ],
+        "edges": [{"edge_id": edge_ids[0], "source": a, "target": b, "edge_content": "移项"}],
+    }
+
+
+def test_cached_suggestion_follows_requester_ids():
+    # 两份等价但编号不同的导图命中同一条缓存，建议须挂到各自对应的节点上
+    first = _mindmap(("N1", "N2"), ["E1"])
+    second = _mindmap(("N7", "N3"), ["E5"])
+    assert suggestion_cache_key(first, "x", None) == suggestion_cache_key(second, "x", None)
+
+    suggestion = {
+        "nodes": [{"node_id": "N3", "node_content": "两边同除以 $2$", "node_type": "思路提示"}],
+        "edges": [{"edge_id": "E2", "source": "N2", "target": "N3", "edge_content": "接下来"}],
+    }
+    cached = to_cached_ids(suggestion, first)
+    assert from_cached_ids(cached, first) == suggestion
+
+    served = from_cached_ids(cached, second)
+    assert served["nodes"][0]["node_id"] == "N8"
+    assert served["edges"][0] == {"edge_id": "E6", "source": "N3", "target": "N8", "edge_content": "接下来"}
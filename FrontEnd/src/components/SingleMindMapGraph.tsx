@@ -37,6 +37,10 @@ interface MindMapGraphProps {
 
 const NODE_WIDTH = 350;
 const NODE_HEIGHT = 150;
+// 层间距 / 同层节点间距，须与后端 mindmap_layout.rank_sep / node_sep 一致，
+// 否则建议出现或清除时（切换到本地布局 / 服务端坐标）导图会整体改变间距
+const RANK_SEP = 80;
+const NODE_SEP = 40;
 
 const proOptions: ProOptions = { hideAttribution: true };
 
@@ -62,7 +66,7 @@ const SingleMindMapGraph: React.FC<MindMapGraphProps> = ({
 
     const getLayoutedElements = useCallback((nodes: Node[], edges: Edge[]) => {
         const g = new dagre.graphlib.Graph();
-        g.setGraph({ rankdir: 'LR' });
+        g.setGraph({ rankdir: 'LR', ranksep: RANK_SEP, nodesep: NODE_SEP });
         g.setDefaultEdgeLabel(() => ({}));
 
         nodes.forEach((node) => {
@@ -155,6 +159,15 @@ const SingleMindMapGraph: React.FC<MindMapGraphProps> = ({
             return;
         }
 
+        // 服务端已给出全部节点的坐标时直接使用，避免大导图在低端设备上重新布局；
+        // 合并了建议节点时仍在本地布局
+        const positions = data?.positions;
+        if (!suggestionData && positions && initialNodes.every(node => positions[node.id])) {
+            setNodes(initialNodes.map(node => ({ ...node, position: positions[node.id] })));
+            setEdges(initialEdges);
+            return;
+        }
+
         const { nodes: layoutedNodes, edges: layoutedEdges } = getLayoutedElements(
             initialNodes,
             initialEdges
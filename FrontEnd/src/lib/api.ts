@@ -1,5 +1,6 @@
 import axios from 'axios';
 import { API_BASE_URL } from '@/lib/constants';
+import { socketManager } from '@/lib/socket';
 
 const TIMEOUT = 2000;
 
@@ -78,7 +79,8 @@ export function refreshMindmap(mindmap_id: number) {
     return axios.post(
         `${API_BASE_URL}/api/refresh`,
         {
-            mindmap_id: mindmap_id
+            mindmap_id: mindmap_id,
+            include_positions: true
         },
         { withCredentials: true, timeout: TIMEOUT }
     );
@@ -94,6 +96,19 @@ export function getAllProblems() {
     );
 }
 
+export function getSimilarProblems(problem_id: number, top_k: number = 5) {
+    return axios.post(`${API_BASE_URL}/api/similarProblems`,
+        {
+            problem_id: problem_id,
+            top_k: top_k
+        },
+        {
+            withCredentials: true,
+            timeout: TIMEOUT
+        }
+    );
+}
+
 export function singleProblemDetail(problem_id: number) {
     return axios.post(`${API_BASE_URL}/api/singleProblemDetail`,
         {
@@ -118,7 +133,12 @@ export function startSolution(problem_id: number) {
     );
 }
 
+// Socket.IO 已连接时优先走 socket 请求（ack 中带 job_id），省去 HTTP 往返与 cookie 校验
+// 返回值包装成 { data } 以兼容 axios 的调用方式
 export function queryAnalysis(problem_id: number, mindmap_id: number) {
+    if (socketManager.connected) {
+        return socketManager.request('queryAnalysis', { problem_id, mindmap_id }).then(data => ({ data }));
+    }
     return axios.post(`${API_BASE_URL}/api/queryAnalysis`,
         {
             problem_id: problem_id,
@@ -132,12 +152,26 @@ export function queryAnalysis(problem_id: number, mindmap_id: number) {
     );
 }
 
-export function updateMindmap(problem_id: number, mindmap_id: number, current_solution: string) {
+// 编辑中的草稿，仅在 Socket.IO 已连接时发送；后端空闲时据此预生成导图，保存时文本一致即可立即得到结果
+// 返回 null 表示未发送
+export function sendDraftSnapshot(problem_id: number, mindmap_id: number, current_solution: string) {
+    if (!socketManager.connected) {
+        return null;
+    }
+    return socketManager.request('draftSnapshot', { problem_id, mindmap_id, current_solution });
+}
+
+// with_suggestion 为 true 时后端在同一次模型调用中一并生成解题建议，随后依次推送新导图与建议
+export function updateMindmap(problem_id: number, mindmap_id: number, current_solution: string, with_suggestion: boolean = false) {
+    if (socketManager.connected) {
+        return socketManager.request('updateMindmap', { problem_id, mindmap_id, current_solution, with_suggestion }).then(data => ({ data }));
+    }
     return axios.post(`${API_BASE_URL}/api/updateMindmap`,
         {
             problem_id: problem_id,
             mindmap_id: mindmap_id,
-            current_solution: current_solution
+            current_solution: current_solution,
+            with_suggestion: with_suggestion
         },
         {
             withCredentials: true,
@@ -1 +1,3 @@
 export const API_BASE_URL = 'http://127.0.0.1:8000';  // FastAPI 服务器的 URL
+// Socket.IO 序列化方式，须与后端 socketio.serializer 一致（构建时通过 VITE_SOCKET_SERIALIZER=msgpack 启用）
+export const SOCKET_SERIALIZER: 'json' | 'msgpack' = import.meta.env.VITE_SOCKET_SERIALIZER === 'msgpack' ? 'msgpack' : 'json';
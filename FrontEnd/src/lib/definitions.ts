@@ -47,15 +47,29 @@ export interface edgeItem {
 	target: string;
 }
 
+export interface MindMapPosition {
+	x: number;
+	y: number;
+}
+
 export interface MindMapItem {
 	nodes: nodeItem[];
 	edges: edgeItem[];
+	// 服务端计算的节点左上角坐标（node_id -> 坐标），缺失时前端自行布局
+	positions?: Record<string, MindMapPosition> | null;
+}
+
+export interface SocketAckResponse {
+	code: number;
+	job_id?: string | null;
+	message?: string | null;
 }
 
 export interface AnalysisMapResponse {
 	problem_id: number;
 	mindmap_id: number;
 	new_mindmap: MindMapItem;
+	positions?: Record<string, MindMapPosition> | null;
 }
 
 export interface AnalysisSuggestionResponse {
@@ -63,6 +77,8 @@ export interface AnalysisSuggestionResponse {
 	mindmap_id: number;
 	suggestion: MindMapItem;
 	suggestion_summary: string;
+	// heuristic: 即时的启发式建议，随后会收到 final（模型给出的建议）覆盖
+	phase?: 'heuristic' | 'final';
 }
 
 export interface ProblemItem {
@@ -71,4 +87,8 @@ export interface ProblemItem {
 	chapter_name: string;
 	difficulty: number; // 1-5 scale
 	problem_content: string;
+}
+
+export interface SimilarProblemItem extends ProblemItem {
+	similarity: number; // 0-1, estimated content similarity
 }
\ No newline at end of file
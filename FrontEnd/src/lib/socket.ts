@@ -1,11 +1,16 @@
 import { io, Socket } from 'socket.io-client';
-import { API_BASE_URL } from './constants';
-import { AnalysisMapResponse, AnalysisSuggestionResponse, MessageResponse, PrivacyAnalysisResponse } from './definitions';
+import msgpackParser from 'socket.io-msgpack-parser';
+import { API_BASE_URL, SOCKET_SERIALIZER } from './constants';
+import { AnalysisMapResponse, AnalysisSuggestionResponse, MessageResponse, PrivacyAnalysisResponse, SocketAckResponse } from './definitions';
+
+const ACK_TIMEOUT = 2000;
 
 // NOTE: 浏览器刷新时，后端需要等一段时间才知道socket断开，所以此时后端会有多个sid对应同一个userid
 const socket: Socket = io(API_BASE_URL, {
     autoConnect: false,  // MUST disable auto connect, otherwise it will connect immediately
     withCredentials: true,
+    // 后端 socketio.serializer 为 msgpack 时收发二进制帧，需使用对应的解析器
+    ...(SOCKET_SERIALIZER === 'msgpack' ? { parser: msgpackParser } : {}),
     // ref: https://stackoverflow.com/a/41953165
     // transports: ['websocket'],
     // upgrade: false,
@@ -18,6 +23,37 @@ type allPrivacyAnalysisCallback = (data: PrivacyAnalysisResponse[]) => void;
 type analysisMapCallback = (data: AnalysisMapResponse) => void;
 type analysisSuggestionCallback = (data: AnalysisSuggestionResponse) => void;
 
+// 后端对超过阈值的思维导图负载使用 zlib 压缩，并以二进制附件发送
+interface CompressedPayload {
+    encoding: 'zlib+json';
+    data: ArrayBuffer;
+}
+
+const isCompressedPayload = (data: any): data is CompressedPayload =>
+    data && data.encoding === 'zlib+json' && data.data !== undefined;
+
+// zlib 格式即 Compression Streams API 中的 'deflate'
+const inflatePayload = async <T>(payload: any): Promise<T> => {
+    if (!isCompressedPayload(payload)) return payload as T;
+    const stream = new Blob([payload.data]).stream().pipeThrough(new DecompressionStream('deflate'));
+    const text = await new Response(stream).text();
+    return JSON.parse(text) as T;
+};
+
+// 记录原始回调与解压包装后的回调，保证 off 时能正确移除
+const inflatingHandlers = new WeakMap<Function, (data: any) => void>();
+
+const wrapInflating = <T>(callback: (data: T) => void) => {
+    let wrapped = inflatingHandlers.get(callback);
+    if (!wrapped) {
+        wrapped = (data: any) => {
+            inflatePayload<T>(data).then(callback).catch((e) => console.error('failed to inflate payload', e));
+        };
+        inflatingHandlers.set(callback, wrapped);
+    }
+    return wrapped;
+};
+
 class SocketManager {
     public get connected() {
         return socket.connected;
@@ -36,6 +72,11 @@ class SocketManager {
         socket.disconnect();
     }
 
+    // 通过 Socket.IO 发送请求并等待 ack（如 updateMindmap / queryAnalysis）
+    public request(event: string, payload: object): Promise<SocketAckResponse> {
+        return socket.timeout(ACK_TIMEOUT).emitWithAck(event, payload);
+    }
+
     public onConnect(callback: ConnectCallback) {
         socket.on("connect", callback);
     }
@@ -69,19 +110,19 @@ class SocketManager {
     }
 
     public onAnalysisMap(callback: analysisMapCallback) {
-        socket.on("sendAnalysisMap", callback);
+        socket.on("sendAnalysisMap", wrapInflating(callback));
     }
 
     public offAnalysisMap(callback: analysisMapCallback) {
-        socket.off("sendAnalysisMap", callback);
+        socket.off("sendAnalysisMap", wrapInflating(callback));
     }
 
     public onAnalysisSuggestion(callback: analysisSuggestionCallback) {
-        socket.on("sendAnalysisSuggestion", callback);
+        socket.on("sendAnalysisSuggestion", wrapInflating(callback));
     }
 
     public offAnalysisSuggestion(callback: analysisSuggestionCallback) {
-        socket.off("sendAnalysisSuggestion", callback);
+        socket.off("sendAnalysisSuggestion", wrapInflating(callback));
     }
 }
 
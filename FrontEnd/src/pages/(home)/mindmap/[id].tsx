@@ -1,4 +1,4 @@
-import React, { useEffect, useState, useCallback } from 'react';
+import React, { useEffect, useState, useCallback, useRef } from 'react';
 import { useHeader } from '@/context/HeaderContext';
 import { AnalysisMapResponse, AnalysisSuggestionResponse, MindMapItem } from '@/lib/definitions';
 import { MOCK_SUGGESTION_DATA } from '@/lib/mock';
@@ -29,10 +29,13 @@ import 'allotment/dist/style.css';
 
 // 引入图形组件
 import SingleMindMapGraph from '@/components/SingleMindMapGraph';
-import { queryAnalysis, refreshMindmap, updateMindmap } from '@/lib/api';
+import { queryAnalysis, refreshMindmap, sendDraftSnapshot, updateMindmap } from '@/lib/api';
 import { socketManager } from '@/lib/socket';
 import { useParams } from 'react-router-dom';
 
+// 停止输入多久后发送草稿
+const DRAFT_DEBOUNCE_MS = 1500;
+
 const MindMapPage = () => {
     const {
         mindmap_id,
@@ -77,7 +80,7 @@ const MindMapPage = () => {
                     setCurrentProblemId(data.problem_id);
                     setCurrentSolution(data.current_solution || "");
                     setCurrentProblemContent(data.problem_content || "");
-                    setCurrentMindmap(data.current_mindmap || { nodes: [], edges: [] });
+                    setCurrentMindmap({ ...(data.current_mindmap || { nodes: [], edges: [] }), positions: data.positions });
                 } else {
                     console.error("刷新数据失败:", res.data);
                 }
@@ -90,6 +93,25 @@ const MindMapPage = () => {
             });
     }, [mindmapIdFromUrl, setMindmapId, setCurrentProblemId, setCurrentSolution, setCurrentProblemContent, setCurrentMindmap]);
 
+    // --- 编辑期间发送草稿，供后端预生成导图 ---
+    // 后端未开启预生成时（ack code 501）本页不再发送
+    const draftDisabled = useRef(false);
+    const lastDraft = useRef('');
+    useEffect(() => {
+        if (!isEditing || draftDisabled.current || !current_problem_id || !mindmap_id) return;
+        // 只在句子或公式结束处发送，后端也会再做同样的判断
+        if (tempSolution === lastDraft.current || !/([。！？；.!?\n]|\$)[ \t]*$/.test(tempSolution)) return;
+        const timer = setTimeout(() => {
+            lastDraft.current = tempSolution;
+            sendDraftSnapshot(current_problem_id, mindmap_id, tempSolution)
+                ?.then(ack => {
+                    if (ack.code === 501) draftDisabled.current = true;
+                })
+                .catch(() => { /* 草稿只是提示，失败无需处理 */ });
+        }, DRAFT_DEBOUNCE_MS);
+        return () => clearTimeout(timer);
+    }, [isEditing, tempSolution, current_problem_id, mindmap_id]);
+
     // --- 处理编辑逻辑 ---
     const handleStartEdit = () => {
         setTempSolution(current_solution || '');
@@ -170,7 +192,7 @@ const MindMapPage = () => {
         console.log("收到新的分析图数据:", data);
         // 检查是否是当前 mindmap 的数据
         if (data.mindmap_id === mindmap_id) {
-            setCurrentMindmap(data.new_mindmap);
+            setCurrentMindmap({ ...data.new_mindmap, positions: data.positions });
             // 如果图谱全量更新了，通常意味着用户接受了建议或进入了新阶段，可以清空旧建议
             setSuggestionData(null);
             setSuggestionSummary(null);
@@ -1 +1,9 @@
 /// <reference types="vite/client" />
+
+interface ImportMetaEnv {
+    readonly VITE_SOCKET_SERIALIZER?: 'json' | 'msgpack';
+}
+
+interface ImportMeta {
+    readonly env: ImportMetaEnv;
+}